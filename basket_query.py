@@ -0,0 +1,138 @@
+import os
+import time
+import argparse
+import functools
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+# ==========================================
+# ETL RUNS
+# ==========================================
+# המחיר האחרון לכל (סניף, ברקוד) נמצא ב-Latest_Prices, שה-ETL מעדכן יחד עם כל טעינה - כך ששאילתות סל
+# לא סורקות את Fact_Prices. הטבלה ו-ETL_Runs נוצרות במיגרציות (sql_scripts/migrate.py, 009, 013)
+def record_run(conn, run_id, chain_id, stats):
+    # כל ריצה שהסתיימה מקבלת שורה - שינוי ב-run האחרון מבטל את המטמון של כל BasketEngine פעיל
+    conn.execute(text("""
+        INSERT INTO "ETL_Runs" (run_id, chain_id, price_files, prices_inserted)
+        VALUES (:run_id, :chain_id, :price_files, :prices_inserted)
+        ON CONFLICT (run_id) DO UPDATE SET finished_at = now(), prices_inserted = EXCLUDED.prices_inserted
+    """), {"run_id": run_id, "chain_id": chain_id, "price_files": stats["price_files"],
+           "prices_inserted": stats["total_prices_inserted"]})
+
+# ==========================================
+# PRICE MATRIX
+# ==========================================
+class PriceMatrix:
+    # מטריצה צפופה stores x barcodes (float32, NaN = המוצר לא נמכר בסניף), ברקודים ממוינים לחיפוש בינארי
+    def __init__(self, latest, stores):
+        store_codes, store_ids = pd.factorize(latest['store_id'], sort=True)
+        barcode_codes, barcodes = pd.factorize(latest['barcode'].astype(str), sort=True)
+        self.store_ids = np.asarray(store_ids, dtype=object)
+        self.barcodes = np.asarray(barcodes, dtype=str)
+        self.prices = np.full((len(self.store_ids), len(self.barcodes)), np.nan, dtype=np.float32)
+        self.prices[store_codes, barcode_codes] = pd.to_numeric(latest['price'], errors='coerce').to_numpy(dtype=np.float32)
+        self.stores = stores.set_index('store_id').reindex(self.store_ids)
+
+    def columns_for(self, barcodes):
+        barcodes = np.asarray(barcodes, dtype=str)
+        pos = np.minimum(np.searchsorted(self.barcodes, barcodes), max(len(self.barcodes) - 1, 0))
+        found = (self.barcodes[pos] == barcodes) if len(self.barcodes) else np.zeros(len(barcodes), dtype=bool)
+        return pos, found
+
+    def basket_costs(self, barcodes, quantities):
+        # עלות הסל בכל הסניפים בפעולה וקטורית אחת: (stores x k) * k
+        pos, found = self.columns_for(barcodes)
+        sub = self.prices[:, pos[found]]
+        qty = np.asarray(quantities, dtype=np.float32)[found]
+        missing = np.isnan(sub).sum(axis=1) + int((~found).sum())
+        total = np.nansum(sub * qty, axis=1, dtype=np.float64)
+        return total, missing
+
+# ==========================================
+# BASKET ENGINE
+# ==========================================
+class BasketEngine:
+    # המטריצה נטענת פעם אחת מ-Latest_Prices; תוצאות נשמרות ב-LRU. גרסת הנתונים היא ה-run האחרון
+    # ב-ETL_Runs (נבדקת לכל היותר פעם ב-version_ttl שניות) - ריצה חדשה מרעננת את המטריצה ומנקה את המטמון.
+    def __init__(self, engine, cache_size=256, version_ttl=30):
+        self.engine = engine
+        self.version_ttl = version_ttl
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._version = None
+        self._version_checked = 0.0
+        self._cached_costs = functools.lru_cache(maxsize=cache_size)(self._compute)
+
+    def _latest_run(self, conn):
+        if not conn.execute(text("SELECT to_regclass('\"ETL_Runs\"') IS NOT NULL")).scalar():
+            return None
+        return conn.execute(text('SELECT run_id FROM "ETL_Runs" ORDER BY finished_at DESC LIMIT 1')).scalar()
+
+    def _load_matrix(self, conn):
+        t0 = time.perf_counter()
+        latest = pd.read_sql(text('SELECT store_id, barcode, price FROM "Latest_Prices"'), conn)
+        stores = pd.read_sql(text('SELECT store_id, store_name, city FROM "Dim_Stores"'), conn)
+        matrix = PriceMatrix(latest, stores)
+        print(f"[INFO] Price matrix: {len(matrix.store_ids)} stores x {len(matrix.barcodes)} barcodes "
+              f"loaded in {time.perf_counter() - t0:.2f}s")
+        return matrix
+
+    def matrix(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._matrix is not None and now - self._version_checked < self.version_ttl:
+                return self._matrix
+            with self.engine.connect() as conn:
+                version = self._latest_run(conn)
+                if self._matrix is None or version != self._version:
+                    self._matrix = self._load_matrix(conn)
+                    self._version = version
+                    self._cached_costs.cache_clear()
+            self._version_checked = now
+            return self._matrix
+
+    def invalidate(self):
+        with self._lock:
+            self._matrix = None
+            self._cached_costs.cache_clear()
+
+    def _compute(self, basket):
+        matrix = self._matrix
+        barcodes = [b for b, _ in basket]
+        total, missing = matrix.basket_costs(barcodes, [q for _, q in basket])
+        result = matrix.stores.assign(total=total.round(2), missing_items=missing).reset_index()
+        return result.sort_values(['missing_items', 'total'], kind='stable').reset_index(drop=True)
+
+    def cheapest_stores(self, basket, top=5, require_all=True):
+        # basket: רשימת ברקודים או {ברקוד: כמות}. require_all - רק סניפים שמוכרים את כל הסל
+        items = basket.items() if isinstance(basket, dict) else ((b, 1) for b in basket)
+        key = tuple(sorted((str(b), float(q)) for b, q in items))
+        self.matrix()
+        result = self._cached_costs(key)
+        if require_all:
+            result = result[result['missing_items'] == 0]
+        return result.head(top).copy()
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Find the cheapest stores for a basket of barcodes")
+    parser.add_argument("barcodes", nargs="+", help="barcode or barcode:quantity")
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--allow-missing", action="store_true", help="also rank stores missing some items")
+    args = parser.parse_args()
+
+    basket = {}
+    for item in args.barcodes:
+        barcode, _, qty = item.partition(':')
+        basket[barcode] = float(qty or 1)
+
+    basket_engine = BasketEngine(create_engine(os.getenv("SUPABASE_DATABASE_URL")))
+    basket_engine.matrix()
+    t0 = time.perf_counter()
+    result = basket_engine.cheapest_stores(basket, args.top, require_all=not args.allow_missing)
+    print(result.to_string(index=False))
+    print(f"[INFO] Basket of {len(basket)} items costed over all stores in {(time.perf_counter() - t0) * 1000:.1f} ms")
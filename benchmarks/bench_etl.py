@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+from synthetic_data import build_site
+from local_site import serve_site
+
+# בנצ'מרק מקצה לקצה: אתר סינתטי מקומי במקום prices.shufersal.co.il, ומסד Postgres מקומי במקום Supabase.
+# כל שלב נמדד בנפרד (שורות/שנייה, MB/שנייה, זיכרון שיא), ולבסוף ריצה מלאה של run_full_etl.
+#
+#   BENCH_DATABASE_URL=postgresql+psycopg2://postgres@localhost/etl python benchmarks/bench_etl.py
+#
+# הטבלאות נוצרות בסכמה נפרדת (BENCH_SCHEMA) שנמחקת ונבנית מחדש בכל הרצה - לא להפנות ל-DB של production.
+# הסכמה נבנית ע"י sql_scripts/migrate.py, כך שנמדדת בדיוק הסכמה של production (מחיצות, אינדקסים).
+# בלי BENCH_DATABASE_URL נמדדים רק השלבים שלא צריכים מסד נתונים (ה-loader מבוסס COPY של Postgres).
+
+N_ITEMS = int(os.environ.get("BENCH_ITEMS", "20000"))
+FILLER_PAGES = int(os.environ.get("BENCH_FILLER_PAGES", "30"))
+DATABASE_URL = os.environ.get("BENCH_DATABASE_URL")
+SCHEMA = os.environ.get("BENCH_SCHEMA", "etl_bench")
+OUTPUT_PATH = os.environ.get("BENCH_OUTPUT")  # JSON עם התוצאות, להשוואה בין גרסאות
+if OUTPUT_PATH: OUTPUT_PATH = os.path.abspath(OUTPUT_PATH)
+
+MIGRATE_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql_scripts", "migrate.py")
+
+def bench_database_url():
+    # כל החיבורים של ה-ETL ייכנסו לסכמת הבנצ'מרק דרך search_path
+    url = make_url(DATABASE_URL)
+    return url.update_query_dict({"options": f"-csearch_path={SCHEMA}"}).render_as_string(hide_password=False)
+
+def reset_schema():
+    admin = create_engine(DATABASE_URL)
+    with admin.begin() as conn:
+        conn.execute(text(f'DROP SCHEMA IF EXISTS "{SCHEMA}" CASCADE'))
+        conn.execute(text(f'CREATE SCHEMA "{SCHEMA}"'))
+    admin.dispose()
+    # כל המיגרציות על הסכמה הריקה, דרך אותו search_path שה-ETL משתמש בו
+    subprocess.run([sys.executable, MIGRATE_SCRIPT], env={**os.environ, "SUPABASE_DATABASE_URL": bench_database_url()},
+                   check=True, stdout=subprocess.DEVNULL)
+
+class StageResults:
+    def __init__(self):
+        self.rows = []
+
+    def run(self, name, fn, rows=None, nbytes=None, memory_fn=None):
+        # rows / nbytes: פונקציות שמקבלות את תוצאת השלב ומחזירות כמה שורות / בתים עובדו.
+        # tracemalloc מאט מאוד קוד Python, לכן הזמן נמדד בהרצה נקייה והזיכרון בהרצה חוזרת
+        # (memory_fn - כשההרצה החוזרת צריכה להיות שונה, למשל טעינה בלי snapshot)
+        t0 = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - t0
+
+        tracemalloc.start()
+        (memory_fn or fn)()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.add(name, seconds, rows(result) if rows else None, nbytes(result) if nbytes else None, peak / 1024 ** 2)
+        return result
+
+    def add(self, name, seconds, rows, nbytes, peak_mb):
+        self.rows.append({"stage": name, "seconds": seconds, "rows": rows,
+                          "mb": nbytes / 1024 ** 2 if nbytes is not None else None, "peak_mb": peak_mb})
+        print(f"[STEP] {name}: {seconds:.2f}s")
+
+    def print_table(self):
+        print(f"\n{'stage':<34}{'seconds':>9}{'rows':>11}{'rows/s':>12}{'MB':>9}{'MB/s':>9}{'peak MB':>10}")
+        for r in self.rows:
+            rows = f"{r['rows']:,}" if r['rows'] is not None else "-"
+            rate = f"{r['rows'] / r['seconds']:,.0f}" if r['rows'] is not None else "-"
+            mb = f"{r['mb']:.1f}" if r['mb'] is not None else "-"
+            mb_rate = f"{r['mb'] / r['seconds']:.1f}" if r['mb'] is not None else "-"
+            print(f"{r['stage']:<34}{r['seconds']:>9.2f}{rows:>11}{rate:>12}{mb:>9}{mb_rate:>9}{r['peak_mb']:>10.1f}")
+
+def main():
+    work_dir = tempfile.mkdtemp(prefix="etl_bench_")
+    site_dir = os.path.join(work_dir, "site")
+    run_dir = os.path.join(work_dir, "run")
+    os.makedirs(run_dir)
+
+    # shufersal_etl קורא את ההגדרות (BASE_URL, מסד נתונים, DATA_DIR יחסי) בזמן ה-import
+    stores = ["001", "042", "116", "205", "300", "002"]
+    t0 = time.perf_counter()
+    build_site(site_dir, stores, N_ITEMS, FILLER_PAGES)
+    print(f"[INFO] Synthetic site: {len(stores)} stores x {N_ITEMS} items in {time.perf_counter() - t0:.1f}s ({site_dir})")
+    server, base_url = serve_site(site_dir)
+    os.environ["SHUFERSAL_BASE_URL"] = base_url
+    os.environ["LISTING_CACHE_TTL_MIN"] = "0"  # כל הרצה של שלב ה-discovery פונה לאתר
+    if DATABASE_URL:
+        reset_schema()
+        os.environ["SUPABASE_DATABASE_URL"] = bench_database_url()
+    else:
+        os.environ["SUPABASE_DATABASE_URL"] = "sqlite://"
+        print("[WARNING] BENCH_DATABASE_URL is not set: load and end-to-end stages will be skipped.")
+    os.chdir(run_dir)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import shufersal_etl as etl
+
+    results = StageResults()
+    try:
+        # discovery בכל שיטה: מעבר על הדפים (הבסיס - סדרתי ומקבילי) מול חיפוש ממוקד בסינון של האתר.
+        # rows = דפי רשימה שנשלפו. כל השיטות חייבות למצוא את אותם קבצים; הריצה המלאה בסוף - בשיטה המוגדרת
+        configured_modes = etl.DISCOVERY_MODE, etl.CRAWL_MODE
+        discovered = {}
+        for discovery_mode, crawl_mode in (("crawl", "sequential"), ("crawl", "concurrent"), ("targeted", etl.CRAWL_MODE)):
+            etl.DISCOVERY_MODE, etl.CRAWL_MODE = discovery_mode, crawl_mode
+            label = crawl_mode if discovery_mode == "crawl" else discovery_mode
+            timings = {}
+            links = results.run(f"discovery ({label}, pages)", lambda: etl.get_download_links(timings, stores),
+                                rows=lambda _: timings["pages"])
+            discovered[label] = sorted(links)
+        etl.DISCOVERY_MODE, etl.CRAWL_MODE = configured_modes
+        if len({tuple(l) for l in discovered.values()}) > 1:
+            print(f"[WARNING] Discovery modes found different files: { {m: len(l) for m, l in discovered.items()} }")
+        price_links = [l for l in links if "PriceFull" in l[0]]
+
+        def download_all():
+            paths = []
+            for fname, url in price_links:
+                path = os.path.join(etl.PRICES_DIR, fname + ".gz")
+                etl.download_file(url, path)
+                paths.append((fname, path))
+            return paths
+        paths = results.run("download", download_all, rows=lambda _: N_ITEMS * len(price_links),
+                            nbytes=lambda p: sum(os.path.getsize(path) for _, path in p))
+        gz_bytes = sum(os.path.getsize(path) for _, path in paths)
+
+        frames = results.run("parse (fast_parse_xml)",
+                             lambda: [(fname, etl.fast_parse_xml(path, 'Item', usecols=etl.PRICE_ITEM_FIELDS)) for fname, path in paths],
+                             rows=lambda f: sum(len(df) for _, df in f), nbytes=lambda _: gz_bytes)
+        parsed = results.run("transform (schema drift)",
+                             lambda: [etl.transform_price_frame(df, fname) for fname, df in frames],
+                             rows=lambda p: sum(len(x["prices"]) for x in p))
+        del frames
+
+        if DATABASE_URL:
+            with etl.engine.begin() as conn:
+                conn.execute(text('INSERT INTO "Dim_Chains" (chain_id, chain_name) VALUES (:c, :n)'),
+                             {"c": etl.CHAIN_ID, "n": etl.CHAIN_NAME})
+                conn.execute(text('INSERT INTO "Dim_Stores" (store_id, chain_id, store_name) VALUES (:s, :c, :s)'),
+                             [{"s": p["store_id"], "c": etl.CHAIN_ID} for p in parsed])
+            load_all = lambda: [etl.load_price_frames(p["products"], p["prices"], p["store_id"], etl.ProductCache(persist=False))
+                                for p in parsed]
+
+            def reload_all():
+                # הטעינה השנייה בלי snapshot, כדי שכל השורות יישלחו שוב (ON CONFLICT משאיר את הנתונים כמו שהם)
+                etl.PRICE_SNAPSHOTS = False
+                try:
+                    return load_all()
+                finally:
+                    etl.PRICE_SNAPSHOTS = True
+            results.run("load (COPY + merge)", load_all, rows=lambda r: sum(shipped for _, shipped, _, _, _, _ in r),
+                        memory_fn=reload_all)
+            del parsed
+
+            # ריצה מלאה על DB ריק ומצב מקומי נקי (מניפסט, snapshots, checkpoints, ארכיון)
+            etl.engine.dispose()
+            reset_schema()
+            shutil.rmtree(etl.DATA_DIR)
+            for path in (etl.STORES_DIR, etl.PRICES_DIR, etl.SNAPSHOT_DIR, etl.CHECKPOINT_DIR):
+                os.makedirs(path, exist_ok=True)
+            etl.send_email_report = lambda subject, body: None
+            t0 = time.perf_counter()
+            etl.run_full_etl()
+            # תהליכי הפענוח רצים בתהליכים נפרדים, לכן כאן השיא הוא ה-RSS המקסימלי (תהליך ראשי / ילדים)
+            peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                          resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+            results.add("end-to-end run_full_etl", time.perf_counter() - t0, N_ITEMS * len(price_links), gz_bytes, peak_kb / 1024)
+        else:
+            print("[SKIP] load / end-to-end: no BENCH_DATABASE_URL")
+    finally:
+        server.shutdown()
+
+    results.print_table()
+    print("\n(peak MB = tracemalloc peak of a repeat run of each stage; for end-to-end it is the max RSS of the main/worker processes)")
+    if OUTPUT_PATH:
+        with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
+            json.dump({"items_per_file": N_ITEMS, "stores": len(stores), "stages": results.rows}, f, indent=1)
+        print(f"[SUCCESS] Results written to {OUTPUT_PATH}")
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
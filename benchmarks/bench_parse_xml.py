@@ -0,0 +1,70 @@
+import os
+import sys
+import gzip
+import time
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+# shufersal_etl יוצר engine בזמן ה-import; לבנצ'מרק הזה לא צריך מסד נתונים אמיתי
+os.environ.setdefault("SUPABASE_DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shufersal_etl import fast_parse_xml, PRICE_ITEM_FIELDS, CHAIN_ID
+from synthetic_data import write_pricefull_gz
+
+N_ITEMS = int(os.environ.get("BENCH_ITEMS", "50000"))
+REPEATS = int(os.environ.get("BENCH_REPEATS", "3"))
+
+def legacy_fast_parse_xml(file_path, item_tag):
+    # הגרסה הקודמת של fast_parse_xml (ElementTree + dict לכל פריט), לצורך השוואה
+    items = []
+    with gzip.open(file_path, 'rb') as f:
+        context = ET.iterparse(f, events=('end',))
+        for event, elem in context:
+            if elem.tag == item_tag or elem.tag.lower() == item_tag.lower() or elem.tag.endswith(item_tag):
+                item_data = {child.tag: child.text for child in elem}
+                items.append(item_data)
+                elem.clear()
+    return pd.DataFrame(items)
+
+def measure(fn, *args, **kwargs):
+    best = None
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        df = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, best, peak
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"PriceFull{CHAIN_ID}-001-bench.gz")
+        write_pricefull_gz(path, "001", N_ITEMS)
+        print(f"[INFO] Synthetic PriceFull: {N_ITEMS} items, {os.path.getsize(path) / 1024 ** 2:.2f} MB compressed")
+
+        results = [
+            ("legacy (ElementTree, dict per row)",) + measure(legacy_fast_parse_xml, path, 'Item'),
+            ("fast_parse_xml (lxml, columnar)",) + measure(fast_parse_xml, path, 'Item'),
+            ("fast_parse_xml + usecols",) + measure(fast_parse_xml, path, 'Item', usecols=PRICE_ITEM_FIELDS),
+        ]
+
+        legacy_df = results[0][1]
+        for name, df, seconds, peak in results[1:]:
+            expected = legacy_df[list(df.columns)]
+            if not expected.equals(df):
+                raise AssertionError(f"{name}: output differs from the legacy parser")
+
+        print(f"\n{'parser':<38}{'best (s)':>10}{'items/s':>12}{'peak MB':>10}")
+        for name, df, seconds, peak in results:
+            print(f"{name:<38}{seconds:>10.3f}{N_ITEMS / seconds:>12,.0f}{peak / 1024 ** 2:>10.1f}")
+        print(f"\n[DONE] Speed-up vs legacy: {results[0][2] / results[1][2]:.2f}x (all columns), "
+              f"{results[0][2] / results[2][2]:.2f}x (usecols)")
+
+if __name__ == "__main__":
+    main()
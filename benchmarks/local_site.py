@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import zlib
+import argparse
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# תחליף מקומי ל-prices.shufersal.co.il: דפי רשימה (?page=N) בטבלה כמו באתר, אותה רשימה מסוננת לפי
+# קטגוריה וסניף (/FileObject/UpdateCategory?catID=C&storeId=S&page=N), וקבצי gz תחת /files/.
+# מגיש תיקייה שנבנתה ע"י synthetic_data.build_site. להרצת ה-ETL מולו: SHUFERSAL_BASE_URL=<url>
+
+PAGE_DELAY = float(os.environ.get("LOCAL_SITE_PAGE_DELAY", "0"))
+
+# catID -> תחילית שם הקובץ (0 = כל הקטגוריות), כמו במסנן של האתר
+CATEGORY_PREFIXES = {1: "Price7", 2: "PriceFull", 3: "Promo7", 4: "PromoFull", 5: "Stores"}
+
+def filter_files(files, cat_id, store_id):
+    prefix = CATEGORY_PREFIXES.get(cat_id, "")
+    selected = []
+    for fname in files:
+        if not fname.startswith(prefix): continue
+        parts = fname.split('-')
+        if store_id and (len(parts) < 2 or not parts[1].isdigit() or int(parts[1]) != store_id): continue
+        selected.append(fname)
+    return selected
+
+def make_handler(site_dir):
+    with open(os.path.join(site_dir, "listing.json"), encoding='utf-8') as f:
+        listing = json.load(f)
+    rows_per_page = listing["rows_per_page"]
+    files = listing["files"]
+    files_dir = os.path.join(site_dir, "files")
+
+    class SiteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.startswith("/files/"):
+                path = os.path.join(files_dir, os.path.basename(url.path))
+                if not os.path.exists(path):
+                    return self._send(404, b"not found", "text/plain")
+                with open(path, 'rb') as f:
+                    body = f.read()
+                headers = [("ETag", f'"{zlib.crc32(body):x}"'),
+                           ("Last-Modified", formatdate(os.path.getmtime(path), usegmt=True))]
+                return self._send(200, body, "application/gzip", headers)
+
+            if PAGE_DELAY: time.sleep(PAGE_DELAY)
+            query = parse_qs(url.query)
+            page = int(query.get("page", ["1"])[0])
+            listed = files
+            if url.path.rstrip('/').endswith("/FileObject/UpdateCategory"):
+                listed = filter_files(files, int(query.get("catID", ["0"])[0]), int(query.get("storeId", ["0"])[0]))
+            chunk = listed[(page - 1) * rows_per_page:page * rows_per_page]
+            rows = "".join(
+                f"<tr><td><a href='/files/{fname}.gz'>לחץ כאן להורדה</a></td><td>{fname}</td></tr>"
+                for fname in chunk
+            )
+            body = f"<html><body><table>{rows}</table></body></html>".encode('utf-8')
+            self._send(200, body, "text/html; charset=utf-8")
+
+    return SiteHandler
+
+def serve_site(site_dir, port=0):
+    # port=0 - פורט פנוי כלשהו. השרת רץ ב-thread רקע; מחזיר (server, base_url)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic price site as a local stand-in for BASE_URL")
+    parser.add_argument("site_dir")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server, base_url = serve_site(args.site_dir, args.port)
+    print(f"[INFO] Serving {args.site_dir} at {base_url} (SHUFERSAL_BASE_URL={base_url})")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,123 @@
+import os
+import gzip
+import json
+import random
+import argparse
+from datetime import datetime, timedelta
+
+CHAIN_ID = "7290027600007"
+
+# ערים בכתיבים שונים (כמו בקבצים האמיתיים) כדי שגם נרמול הערים יעבוד בבנצ'מרק
+CITY_VARIANTS = ['ת"א', 'תל-אביב', 'קרית אתא', 'באר-שבע', ' חיפה ', 'ירושלם', 'רמת-גן', 'פתח-תקווה', 'ראשלצ', 'נתניה']
+
+# שני הכתיבים של שדה היצרן ושל שדה התאריך (Schema Drift) - כל סניף מקבל שילוב אחר
+MANUFACTURER_TAGS = ('ManufacturerName', 'ManufactureName')
+DATE_TAGS = ('PriceUpdateDate', 'PriceUpdateTime')
+
+def schema_variant(store):
+    # סניף 001 -> ManufacturerName + PriceUpdateDate, 002 -> ManufactureName + PriceUpdateTime וכן הלאה
+    n = int(store)
+    return MANUFACTURER_TAGS[n % 2 == 0], DATE_TAGS[(n // 2) % 2]
+
+def gtin13(body):
+    # 12 ספרות + ספרת ביקורת (משקלות 1,3 משמאל) - ברקוד שעובר את בדיקת ה-checksum של price_quality
+    digits = f"{body:012d}"
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return f"{digits}{(10 - total % 10) % 10}"
+
+def base_price(i):
+    # מחיר בסיס קבוע לכל פריט; כל קובץ משנה אותו מעט, כך שאין "קפיצות" חשודות בין קבצים
+    return 1 + (i * 37 % 9900) / 100
+
+def write_stores_gz(path, stores, seed=7, chain_id=CHAIN_ID):
+    rnd = random.Random(seed)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        f.write('<asx:abap xmlns:asx="http://www.sap.com/abapxml" version="1.0"><asx:values>')
+        f.write(f'<CHAINID>{chain_id}</CHAINID><LASTUPDATEDATE>{datetime.now():%Y-%m-%d}</LASTUPDATEDATE><STORES>')
+        for store in stores:
+            f.write(
+                '<STORE>'
+                f'<CHAINID>{chain_id}</CHAINID><SUBCHAINID>1</SUBCHAINID><STOREID>{int(store)}</STOREID>'
+                f'<BIKORETNO>{rnd.randint(0, 9)}</BIKORETNO><STORETYPE>1</STORETYPE><CHAINNAME>שופרסל</CHAINNAME>'
+                f'<STORENAME>סניף {store}</STORENAME><ADDRESS>רחוב {rnd.randint(1, 200)}</ADDRESS>'
+                f'<CITY>{rnd.choice(CITY_VARIANTS)}</CITY><ZIPCODE>{rnd.randint(1000000, 9999999)}</ZIPCODE>'
+                '</STORE>'
+            )
+        f.write('</STORES></asx:values></asx:abap>')
+
+def write_pricefull_gz(path, store, n_items, seed=7, manufacturer_tag='ManufacturerName',
+                       date_tag='PriceUpdateDate', price_date="2026-10", chain_id=CHAIN_ID):
+    rnd = random.Random(seed)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<root>')
+        f.write(f'<ChainId>{chain_id}</ChainId><SubChainId>001</SubChainId><StoreId>{store}</StoreId><BikoretNo>9</BikoretNo>')
+        f.write(f'<Items Count="{n_items}">')
+        for i in range(n_items):
+            f.write(
+                '<Item>'
+                f'<{date_tag}>{price_date}-{rnd.randint(1, 17):02d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}</{date_tag}>'
+                f'<ItemCode>{gtin13(729000000000 + i)}</ItemCode><ItemType>1</ItemType>'
+                f'<ItemName>מוצר בדיקה {i}</ItemName><{manufacturer_tag}>יצרן {i % 400}</{manufacturer_tag}>'
+                '<ManufactureCountry>IL</ManufactureCountry><ManufacturerItemDescription>תיאור</ManufacturerItemDescription>'
+                f'<UnitQty>גרם</UnitQty><Quantity>{rnd.randint(1, 1000)}.00</Quantity><bIsWeighted>0</bIsWeighted>'
+                '<UnitOfMeasure>100 גרם</UnitOfMeasure>'
+                f'<QtyInPackage>0</QtyInPackage><ItemPrice>{base_price(i) * rnd.uniform(0.8, 1.25):.2f}</ItemPrice>'
+                f'<UnitOfMeasurePrice>{rnd.randint(100, 9999) / 100:.2f}</UnitOfMeasurePrice>'
+                '<AllowDiscount>1</AllowDiscount><ItemStatus>1</ItemStatus>'
+                '</Item>'
+            )
+        f.write('</Items></root>')
+
+def build_site(site_dir, stores, n_items, filler_pages=0, rows_per_page=20, file_time=None, delta_files=0, delta_items=500,
+               chain_id=CHAIN_ID):
+    # תיקיית אתר: files/<fname>.gz + listing.json (סדר השורות בדפי הרשימה, החדש ביותר קודם).
+    # filler_pages דפים של קבצים לא רלוונטיים לפני היעדים - כמו באתר האמיתי, שבו היעדים מפוזרים.
+    # delta_files: קבצי Price שעתיים לכל סניף אחרי ה-PriceFull, עם מחירים חדשים ל-delta_items הפריטים הראשונים.
+    # chain_id: אתר של רשת אחרת (לבדיקת multi_chain_etl מול כמה אתרים מקומיים)
+    file_time = file_time or datetime.now()
+    stamp = f"{file_time:%Y%m%d%H%M}"
+    files_dir = os.path.join(site_dir, "files")
+    os.makedirs(files_dir, exist_ok=True)
+
+    listing = [f"Price{chain_id}-999-{stamp[:8]}{i % 10000:04d}" for i in range(filler_pages * rows_per_page)]
+    for hour in range(delta_files, 0, -1):
+        delta_time = file_time + timedelta(hours=hour)
+        for store in stores:
+            fname = f"Price{chain_id}-{store}-{delta_time:%Y%m%d%H%M}"
+            manufacturer_tag, date_tag = schema_variant(store)
+            write_pricefull_gz(os.path.join(files_dir, fname + ".gz"), store, min(delta_items, n_items), seed=int(store) * 100 + hour,
+                               manufacturer_tag=manufacturer_tag, date_tag=date_tag, price_date=f"{delta_time:%Y-%m}",
+                               chain_id=chain_id)
+            listing.append(fname)
+    stores_fname = f"Stores{chain_id}-000-{stamp}"
+    write_stores_gz(os.path.join(files_dir, stores_fname + ".gz"), stores, chain_id=chain_id)
+    listing.append(stores_fname)
+
+    for store in stores:
+        fname = f"PriceFull{chain_id}-{store}-{stamp}"
+        manufacturer_tag, date_tag = schema_variant(store)
+        write_pricefull_gz(os.path.join(files_dir, fname + ".gz"), store, n_items, seed=int(store),
+                           manufacturer_tag=manufacturer_tag, date_tag=date_tag, price_date=f"{file_time:%Y-%m}",
+                           chain_id=chain_id)
+        listing.append(fname)
+
+    with open(os.path.join(site_dir, "listing.json"), 'w', encoding='utf-8') as f:
+        json.dump({"rows_per_page": rows_per_page, "files": listing}, f, indent=1)
+    return listing
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Shufersal price site (Stores + PriceFull gz files)")
+    parser.add_argument("site_dir")
+    parser.add_argument("--stores", default="001,042,116,205,300,002", help="comma separated store numbers")
+    parser.add_argument("--items", type=int, default=20000, help="items per PriceFull file")
+    parser.add_argument("--filler-pages", type=int, default=30)
+    parser.add_argument("--delta-files", type=int, default=0, help="hourly Price (delta) files per store after the PriceFull")
+    parser.add_argument("--delta-items", type=int, default=500)
+    parser.add_argument("--chain-id", default=CHAIN_ID, help="chain id in the file names (a second chain for multi_chain_etl)")
+    args = parser.parse_args()
+
+    listing = build_site(args.site_dir, args.stores.split(','), args.items, args.filler_pages,
+                         delta_files=args.delta_files, delta_items=args.delta_items, chain_id=args.chain_id)
+    size_mb = sum(os.path.getsize(os.path.join(args.site_dir, "files", n)) for n in os.listdir(os.path.join(args.site_dir, "files"))) / 1024 ** 2
+    print(f"[SUCCESS] {len(listing)} listing rows, {size_mb:.1f} MB of gz files in {args.site_dir}")
@@ -0,0 +1,120 @@
+import os
+import re
+import json
+from urllib.parse import urlparse
+
+# ==========================================
+# FIELD ALIASES (Schema Drift)
+# ==========================================
+# שמות השדות בקבצי המחירים לפי תקנות שקיפות המחירים. כל רשת מוסיפה את הכתיבים החריגים שלה (price_aliases)
+PRICE_COLUMN_ALIASES = {
+    'barcode': ('ItemCode',),
+    'item_name': ('ItemName',),
+    'manufacturer': ('ManufacturerName',),
+    'sample_date': ('PriceUpdateDate',),
+    'price': ('ItemPrice',),
+}
+# עמודות קובץ הסניפים (אחרי המרה לאותיות גדולות) -> השמות שה-ETL משתמש בהם
+STORE_COLUMNS = {'STOREID': 'StoreId', 'STORENAME': 'StoreName', 'CITY': 'City'}
+
+# ==========================================
+# CHAIN ADAPTER
+# ==========================================
+class ChainAdapter:
+    # רשת אחת: איפה מוצאים את הקבצים שלה, איך הם נקראים ואיך נקראים השדות בתוכם.
+    # ברירת המחדל מתאימה לאתר עם טבלת קבצים בדפים (?page=N) ולשמות הקבצים לפי התקנות:
+    # Stores{chain}-..., PriceFull{chain}-{store}-{YYYYMMDDhhmm}, Price{chain}-{store}-{YYYYMMDDhhmm}.
+    # הפענוח, הטעינה והמטמונים משותפים לכל הרשתות - רק מה שכאן שונה בין רשת לרשת.
+    supports_category_filter = False
+    stores_item_tag = 'STORE'
+    store_columns = STORE_COLUMNS
+
+    def __init__(self, key, chain_id, chain_name, base_url, watchlist_stores=(), label=None, price_aliases=None,
+                 max_per_host=None, crawl_workers=None, download_hosts=()):
+        self.key = key
+        self.chain_id = chain_id
+        self.chain_name = chain_name
+        self.base_url = base_url
+        self.watchlist_stores = list(watchlist_stores)
+        self.label = label or key.replace('_', ' ').title()
+        # מגבלת בקשות במקביל לכל שרת של הרשת (None = HTTP_MAX_PER_HOST), וכמה דפי רשימה נשלפים במקביל
+        self.max_per_host = max_per_host
+        self.crawl_workers = crawl_workers
+        self.hosts = (urlparse(base_url).netloc,) + tuple(download_hosts)
+
+        aliases = {name: tuple(values) for name, values in PRICE_COLUMN_ALIASES.items()}
+        for name, extra in (price_aliases or {}).items():
+            aliases[name] = aliases.get(name, ()) + tuple(a for a in extra if a not in aliases.get(name, ()))
+        # tuple של זוגות (ולא dict) כדי שישמש מפתח ל-lru_cache של resolve_price_columns
+        self.price_aliases = tuple(aliases.items())
+        self.price_item_fields = frozenset(alias for _, values in self.price_aliases for alias in values)
+
+        self.stores_prefix = f"Stores{chain_id}"
+        self.pricefull_re = re.compile(rf"PriceFull{chain_id}-(\d+)")
+        self.delta_re = re.compile(rf"Price{chain_id}-(\d+)-(\d{{12}})")
+
+    def __repr__(self):
+        return f"ChainAdapter({self.key}, {self.chain_id})"
+
+    def owns(self, fname):
+        return self.chain_id in fname
+
+    def pricefull_target(self, store_num):
+        return f"PriceFull{self.chain_id}-{store_num}"
+
+    def store_id(self, store_num):
+        return f"{self.chain_id}-{str(store_num).zfill(3)}"
+
+    def listing_page_url(self, page_num):
+        return f"{self.base_url}?page={page_num}"
+
+    def category_url(self, category, store_num=0, page_num=1):
+        # category: "stores" / "pricefull" / "price". None - האתר לא תומך בסינון, רק במעבר על הדפים
+        return None
+
+    def absolute_url(self, href):
+        return self.base_url.rstrip('/') + href if href.startswith('/') else href
+
+class ShufersalAdapter(ChainAdapter):
+    supports_category_filter = True
+    # מזהי הקטגוריות במסנן של האתר (FileObject/UpdateCategory?catID=...)
+    CATEGORY_IDS = {"price": 1, "pricefull": 2, "stores": 5}
+
+    def category_url(self, category, store_num=0, page_num=1):
+        # storeId=0 - כל הסניפים. באתר מזהה הסניף הוא מספר בלי אפסים מובילים ("001" -> 1)
+        return (f"{self.base_url.rstrip('/')}/FileObject/UpdateCategory"
+                f"?catID={self.CATEGORY_IDS[category]}&storeId={int(store_num)}&page={page_num}")
+
+# ==========================================
+# REGISTRY
+# ==========================================
+CHAINS = {}
+
+def register_chain(adapter):
+    CHAINS[adapter.key] = adapter
+    return adapter
+
+def get_chain(key):
+    if key not in CHAINS:
+        raise ValueError(f"Unknown chain '{key}' (known: {', '.join(sorted(CHAINS))})")
+    return CHAINS[key]
+
+def load_chains_config(path):
+    # קובץ JSON עם רשימת רשתות נוספות שהאתר שלהן בנוי כמו ברירת המחדל, למשל:
+    # [{"key": "other_chain", "chain_id": "<13-digit chain id>", "chain_name": "...", "base_url": "https://...",
+    #   "watchlist_stores": ["001"], "max_per_host": 4, "price_aliases": {"sample_date": ["PriceUpdateTime"]}}]
+    with open(path, encoding='utf-8') as f:
+        return [register_chain(ChainAdapter(**entry)) for entry in json.load(f)]
+
+register_chain(ShufersalAdapter(
+    "shufersal", "7290027600007", "שופרסל",
+    # ניתן להפנות לאתר מקומי (למשל benchmarks/local_site.py) לצורך בדיקות ובנצ'מרקים
+    os.environ.get("SHUFERSAL_BASE_URL", "http://prices.shufersal.co.il/"),
+    watchlist_stores=["001", "042", "116", "205", "300", "002"],
+    price_aliases={'manufacturer': ('ManufactureName',), 'sample_date': ('PriceUpdateTime',)},
+    download_hosts=("pricesprodpublic.blob.core.windows.net",),
+))
+
+# רשתות נוספות נרשמות בזמן ה-import, כך שהן קיימות גם בתהליכי הפענוח
+if os.environ.get("ETL_CHAINS_CONFIG"):
+    load_chains_config(os.environ["ETL_CHAINS_CONFIG"])
@@ -0,0 +1,165 @@
+import os
+import io
+import json
+import time
+import cProfile
+import pstats
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# כל שלב נרשם כשורת JSON אחת (run_id, stage, seconds, rows, bytes, rows_per_sec, peak_rss_mb)
+METRICS_PATH = os.environ.get("ETL_METRICS_PATH", os.path.join("ETL_Process_Shufersal", "metrics.jsonl"))
+
+# ETL_PROFILE=cprofile / tracemalloc - פרופיילינג של התהליך הראשי (והכותב ל-DB) לאורך כל הריצה
+PROFILE_MODE = os.environ.get("ETL_PROFILE", "")
+PROFILE_DIR = os.environ.get("ETL_PROFILE_DIR", os.path.join("ETL_Process_Shufersal", "profiles"))
+if PROFILE_MODE not in ("", "cprofile", "tracemalloc"):
+    raise ValueError(f"Unknown ETL_PROFILE '{PROFILE_MODE}' (expected cprofile / tracemalloc)")
+
+def peak_rss_mb():
+    # שיא ה-RSS של התהליך הנוכחי עד עכשיו (ב-Linux ru_maxrss הוא ב-KB)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# ==========================================
+# RUN METRICS
+# ==========================================
+class RunMetrics:
+    def __init__(self, path=None, run_id=None):
+        self.path = path
+        self.run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.records = []
+        self._lock = threading.Lock()
+        if path: os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, stage, seconds, rows=None, nbytes=None, peak_rss=None, **extra):
+        # peak_rss: לשלבים שרצו בתהליך אחר (הורדה / פענוח) - השיא של התהליך ההוא
+        entry = {
+            "run_id": self.run_id,
+            "ts": datetime.now().isoformat(timespec='seconds'),
+            "stage": stage,
+            "seconds": round(seconds, 4),
+            "rows": rows,
+            "bytes": nbytes,
+            "rows_per_sec": round(rows / seconds, 1) if rows and seconds > 0 else None,
+            "peak_rss_mb": round(peak_rss if peak_rss is not None else peak_rss_mb(), 1),
+        }
+        entry.update(extra)
+        with self._lock:
+            self.records.append(entry)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+    @contextmanager
+    def stage(self, name, **extra):
+        # with metrics.stage("db.merge") as m: ... m["rows"] = n
+        counters = {"rows": None, "bytes": None}
+        t0 = time.perf_counter()
+        try:
+            yield counters
+        except Exception:
+            counters["error"] = True
+            raise
+        finally:
+            rows = counters.pop("rows")
+            nbytes = counters.pop("bytes")
+            self.record(name, time.perf_counter() - t0, rows, nbytes, **extra, **counters)
+
+    def summary_table(self):
+        # סיכום לפי שלב (לפי סדר ההופעה הראשונה): מספר קריאות, זמן מצטבר, שורות, MB ושיא RSS.
+        # בשלבים שרצים במקביל הזמן המצטבר גדול מזמן הקיר של הריצה.
+        with self._lock:
+            records = list(self.records)
+        stages = {}
+        for r in records:
+            s = stages.setdefault(r["stage"], {"calls": 0, "seconds": 0.0, "rows": 0, "bytes": 0, "peak": 0.0})
+            s["calls"] += 1
+            s["seconds"] += r["seconds"]
+            s["rows"] += r["rows"] or 0
+            s["bytes"] += r["bytes"] or 0
+            s["peak"] = max(s["peak"], r["peak_rss_mb"])
+
+        out = io.StringIO()
+        out.write(f"{'stage':<28}{'calls':>6}{'sec':>9}{'rows':>11}{'rows/s':>11}{'MB':>8}{'RSS MB':>8}\n")
+        for name, s in stages.items():
+            rate = f"{s['rows'] / s['seconds']:,.0f}" if s["rows"] and s["seconds"] > 0 else "-"
+            mb = f"{s['bytes'] / 1024 ** 2:.1f}" if s["bytes"] else "-"
+            rows = f"{s['rows']:,}" if s["rows"] else "-"
+            out.write(f"{name:<28}{s['calls']:>6}{s['seconds']:>9.2f}{rows:>11}{rate:>11}{mb:>8}{s['peak']:>8.0f}\n")
+        return out.getvalue()
+
+# ריצה נוכחית ברמת המודול, כדי שכל פונקציה ב-ETL תוכל לרשום שלב בלי להעביר אובייקט
+_current = RunMetrics()
+
+def start_run(path=METRICS_PATH):
+    global _current
+    _current = RunMetrics(path)
+    return _current
+
+def current():
+    return _current
+
+def stage(name, **extra):
+    return _current.stage(name, **extra)
+
+def record(stage_name, seconds, rows=None, nbytes=None, peak_rss=None, **extra):
+    return _current.record(stage_name, seconds, rows, nbytes, peak_rss, **extra)
+
+# ==========================================
+# PROFILING HOOKS
+# ==========================================
+# cProfile מודד רק את ה-thread שהפעיל אותו, לכן thread הכותב ל-DB נרשם בנפרד ומאוחד בסוף
+_thread_profilers = []
+
+@contextmanager
+def profile_thread():
+    if PROFILE_MODE != "cprofile":
+        yield
+        return
+    profiler = cProfile.Profile()
+    _thread_profilers.append(profiler)
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+@contextmanager
+def profiled(mode=PROFILE_MODE, top=25):
+    # תהליכי הפענוח (ProcessPool) לא נכללים - הם נמדדים דרך רשומות ה-download / parse
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"etl_{_current.run_id}.prof")
+            stats = pstats.Stats(profiler)
+            for thread_profiler in _thread_profilers:
+                stats.add(thread_profiler)
+            _thread_profilers.clear()
+            stats.dump_stats(path)
+            print(f"\n[INFO] cProfile written to {path} (top {top} by cumulative time):")
+            stats.sort_stats("cumulative").print_stats(top)
+    elif mode == "tracemalloc":
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"\n[INFO] tracemalloc peak: {peak / 1024 ** 2:.1f} MB. Top {top} allocation sites:")
+            for stat in snapshot.statistics("lineno")[:top]:
+                print(f"  {stat}")
+    else:
+        yield
@@ -0,0 +1,134 @@
+import os
+import time
+import argparse
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import chain_adapters
+import etl_metrics
+import basket_query
+import price_rollups
+import shufersal_etl as etl
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# כמה רשתות יחד, כל אחת ב-thread משלה: גילוי קבצים, הורדות וכותב DB נפרדים לכל רשת (ומגבלת בקשות
+# לשרתים שלה), ומאגר תהליכי פענוח אחד, מטמון מוצרים אחד ומניפסט אחד לכולן.
+# זמן הריצה הכולל הוא בערך זמן הרשת האיטית ביותר, לא הסכום.
+ETL_CHAINS = os.environ.get("ETL_CHAINS", "shufersal")
+
+def run_chains(chains, all_stores=False, shard=(1, 1), delta=False):
+    print("======================================")
+    print(f"[START] Starting STREAMING ETL for {len(chains)} chains: {', '.join(c.label for c in chains)}")
+    print("======================================")
+
+    start_time = datetime.now()
+    run_t0 = time.perf_counter()
+    metrics = etl_metrics.start_run()
+    # לפני יצירת תהליכי הפענוח (fork), כדי שגם הם יכירו את המגבלות
+    for chain in chains:
+        etl.register_host_limits(chain)
+    with etl.engine.begin() as conn:
+        etl.ensure_partitions(conn)
+
+    # מגבלות השרתים משותפות לתהליך הראשי ולכל תהליכי הפענוח (במצב stream ההורדות רצות בהם)
+    parse_pool = ProcessPoolExecutor(max_workers=etl.PARSE_WORKERS, initializer=etl._init_parse_worker,
+                                     initargs=(None, etl.shared_host_slots(etl.PARSE_WORKERS, etl.INGEST_MODE == "stream")))
+    shared = etl.SharedRun(parse_pool, etl.ProductCache(), etl.FileManifest(), metrics)
+    results, failures = {}, {}
+    try:
+        with ThreadPoolExecutor(max_workers=len(chains)) as pool:
+            futures = {chain: pool.submit(etl.run_full_etl, all_stores, shard, delta, None, chain, shared)
+                       for chain in chains}
+            # כשל של רשת אחת לא עוצר את האחרות - הוא נרשם ומדווח בסוף
+            for chain, future in futures.items():
+                try:
+                    results[chain] = future.result()
+                except Exception:
+                    failures[chain] = traceback.format_exc()
+                    print(f"\n[ERROR] {chain.label} failed:\n{failures[chain]}")
+    finally:
+        parse_pool.shutdown(wait=True, cancel_futures=True)
+        etl.stop_shared_host_slots()
+        shared.product_cache.save()
+
+    # סיכומים יומיים פעם אחת, על האיחוד של כל מה שהרשתות שינו
+    rollup_days = (0, 0)
+    try:
+        with etl.engine.begin() as conn, etl_metrics.stage("db.rollups") as m:
+            rollup_days = price_rollups.refresh_rollups(conn, shared.touched, etl.PRICE_STORAGE)
+            m["rows"] = rollup_days[0]
+    except Exception as e:
+        print(f"[WARNING] Could not update price rollups: {e}")
+
+    totals = {key: sum(stats[key] for stats, _ in results.values())
+              for key in ("price_files", "skipped_files", "deferred_files", "total_prices_scanned",
+                          "total_prices_inserted", "new_products", "quarantined_rows", "out_of_order_rows")}
+    try:
+        with etl.engine.begin() as conn:
+            # הריצה המשותפת נרשמת בסוף, אחרי הרשתות - היא זו שמבטלת את המטמון של basket_query
+            basket_query.record_run(conn, metrics.run_id, None, totals)
+    except Exception as e:
+        print(f"[WARNING] Could not record the run in ETL_Runs: {e}")
+
+    duration = round((datetime.now() - start_time).total_seconds() / 60, 2)
+    etl_metrics.record("run", time.perf_counter() - run_t0, totals["total_prices_scanned"],
+                       chains=len(chains), failed=len(failures))
+
+    chain_lines = "\n".join(f"- {report}" for _, report in results.values())
+    failed_lines = "\n".join(f"- {chain.label}: FAILED 🔴\n{tb}" for chain, tb in failures.items())
+    status = "FAILED 🔴" if failures else "PARTIAL 🟡" if totals["deferred_files"] else "SUCCESS 🟢"
+    report_body = f"""Multi-Chain Data Pipeline - {status}
+
+Chains: {', '.join(c.label for c in chains)}
+Price Storage: {etl.PRICE_STORAGE}
+Run Time: {duration} minutes
+Rollups Refreshed: {rollup_days[0]} store-days, {rollup_days[1]} city-days
+
+🏪 Per Chain:
+{chain_lines}
+{failed_lines}
+
+📈 Stage Metrics (run {metrics.run_id}, sec = summed per stage):
+{metrics.summary_table()}
+📊 Data Metrics:
+- Total Prices Scanned: {totals['total_prices_scanned']}
+- NEW Prices Inserted: {totals['total_prices_inserted']}
+- NEW Products Added: {totals['new_products']}
+- Rows Quarantined: {totals['quarantined_rows']}
+- Out-of-Order Samples Not Loaded: {totals['out_of_order_rows']}
+"""
+    print("\n======================================")
+    print(f"[DONE] {len(results)} of {len(chains)} chains processed in {duration} minutes.")
+    print("======================================")
+    labels = ", ".join(c.label for c in chains)
+    if failures:
+        etl.send_email_report(f"🔴 ETL FAILED: {', '.join(c.label for c in failures)}", report_body)
+        raise Exception(f"{len(failures)} of {len(chains)} chains failed: {', '.join(c.label for c in failures)}")
+    elif totals["deferred_files"]:
+        etl.send_email_report(f"🟡 ETL Partial: {labels}", report_body)
+    elif delta and not etl.DELTA_SUCCESS_EMAIL:
+        print(report_body)
+    else:
+        etl.send_email_report(f"🟢 ETL Success: {labels}", report_body)
+
+def parse_chains(value):
+    # "shufersal,other_chain" -> [ChainAdapter, ...]
+    return [etl.parse_chain(key) for key in value.split(',') if key.strip()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest several chains concurrently (shared parser, loader and caches)")
+    parser.add_argument("--chains", type=parse_chains, default=ETL_CHAINS,
+                        help=f"comma-separated chain keys (registered: {', '.join(sorted(chain_adapters.CHAINS))}; "
+                             f"more via ETL_CHAINS_CONFIG)")
+    parser.add_argument("--all-stores", action="store_true", default=os.environ.get("ETL_ALL_STORES") == "1",
+                        help="ingest every branch of each chain instead of its watchlist")
+    parser.add_argument("--shard", type=etl.parse_shard, default=os.environ.get("ETL_SHARD", "1/1"),
+                        help="K/N - process only the K-th of N store shards (e.g. 2/8)")
+    parser.add_argument("--delta", action="store_true", default=os.environ.get("ETL_DELTA") == "1",
+                        help="ingest only the incremental Price files published since the last processed one")
+    args = parser.parse_args()
+    with etl_metrics.profiled():
+        run_chains(args.chains, all_stores=args.all_stores, shard=args.shard, delta=args.delta)
@@ -0,0 +1,130 @@
+import os
+import re
+import argparse
+from datetime import datetime, date
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# ארכיון Parquet מקומי של כל קובץ מחירים שפוענח: date=YYYY-MM-DD/chain=<chain_id>/store=NNN/<fname>.parquet
+# (מספרי סניפים חוזרים בין רשתות, לכן הרשת היא חלק מהמחיצה)
+ARCHIVE_DIR = os.environ.get("PRICE_ARCHIVE_DIR", os.path.join("ETL_Process_Shufersal", "archive"))
+ARCHIVE_COMPRESSION = os.environ.get("PRICE_ARCHIVE_COMPRESSION", "zstd")
+
+# עמודות מוקלדות (מחרוזות חוזרות נשמרות כמילון) - אין צורך לפענח XML או לפנות ל-DB כדי לסרוק
+ARCHIVE_SCHEMA = pa.schema([
+    ('chain_id', pa.dictionary(pa.int32(), pa.string())),
+    ('barcode', pa.string()),
+    ('item_name', pa.string()),
+    ('manufacturer', pa.dictionary(pa.int32(), pa.string())),
+    ('price', pa.float64()),
+    ('price_update', pa.timestamp('s')),
+    ('file_time', pa.timestamp('s')),
+])
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.date32()), ('chain', pa.string()), ('store', pa.string())]), flavor="hive")
+
+_FILE_TIME_RE = re.compile(r"-(\d{12})$")
+
+# ==========================================
+# WRITER
+# ==========================================
+def file_time_from_fname(fname):
+    # PriceFull7290027600007-001-202610170300 -> 2026-10-17 03:00 (זמן הפקת הקובץ אצל הרשת)
+    match = _FILE_TIME_RE.search(fname)
+    return datetime.strptime(match.group(1), "%Y%m%d%H%M") if match else datetime.now().replace(microsecond=0)
+
+def archive_path(fname, chain_id, store_num, part=None, archive_dir=ARCHIVE_DIR):
+    # part - מספר המנה כשהקובץ מפוענח במנות (PRICE_CHUNK_ITEMS); כל מנה נכתבת לקובץ משלה
+    file_time = file_time_from_fname(fname)
+    name = f"{fname}.parquet" if part is None else f"{fname}.part{part:04d}.parquet"
+    return os.path.join(archive_dir, f"date={file_time:%Y-%m-%d}", f"chain={chain_id}", f"store={store_num}", name)
+
+def write_price_file(df, fname, store_num, chain_id, part=None, archive_dir=ARCHIVE_DIR):
+    # df בעמודות הקנוניות של map_price_frame (barcode / item_name / manufacturer / price / sample_date)
+    path = archive_path(fname, chain_id, store_num, part, archive_dir)
+    frame = pd.DataFrame({
+        'chain_id': chain_id,
+        'barcode': df['barcode'].astype(str),
+        'item_name': df['item_name'].astype(str),
+        'manufacturer': df['manufacturer'].astype(str),
+        # המחיר מגיע כ-float32 - מעגלים לאגורות כדי שלא יישמר 12.899999...
+        'price': df['price'].astype('float64').round(2),
+        'price_update': df['sample_date'].astype('datetime64[s]'),
+        'file_time': file_time_from_fname(fname),
+    })
+    frame['file_time'] = frame['file_time'].astype('datetime64[s]')
+    table = pa.Table.from_pandas(frame, schema=ARCHIVE_SCHEMA, preserve_index=False)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # קובץ זמני מתחיל בנקודה, כך שסריקה שרצה במקביל מתעלמת ממנו
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp_path, compression=ARCHIVE_COMPRESSION)
+    os.replace(tmp_path, path)
+    return path
+
+# ==========================================
+# READER
+# ==========================================
+def _as_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime): return value
+    return pd.Timestamp(value).date()
+
+def open_archive(archive_dir=ARCHIVE_DIR, memory_map=True):
+    # memory_map: הקבצים ממופים לזיכרון במקום להיקרא ל-buffer, כך שסריקות חוזרות זולות
+    filesystem = pafs.LocalFileSystem(use_mmap=memory_map)
+    return ds.dataset(archive_dir, format="parquet", partitioning=PARTITIONING,
+                      schema=ARCHIVE_SCHEMA.append(pa.field('date', pa.date32())).append(pa.field('chain', pa.string()))
+                                           .append(pa.field('store', pa.string())),
+                      filesystem=filesystem)
+
+def build_filter(barcodes=None, stores=None, start_date=None, end_date=None, chains=None):
+    # סינון על עמודות המחיצה (date / chain / store) מדלג על תיקיות שלמות; סינון על barcode נדחף
+    # לסטטיסטיקות של ה-row groups בתוך הקבצים
+    conditions = []
+    if barcodes is not None: conditions.append(pc.field('barcode').isin([str(b) for b in barcodes]))
+    if chains is not None: conditions.append(pc.field('chain').isin([str(c) for c in chains]))
+    if stores is not None: conditions.append(pc.field('store').isin([str(s) for s in stores]))
+    if start_date is not None: conditions.append(pc.field('date') >= _as_date(start_date))
+    if end_date is not None: conditions.append(pc.field('date') <= _as_date(end_date))
+    if not conditions: return None
+    expression = conditions[0]
+    for condition in conditions[1:]:
+        expression = expression & condition
+    return expression
+
+def scan_prices(columns=None, barcodes=None, stores=None, start_date=None, end_date=None,
+                archive_dir=ARCHIVE_DIR, memory_map=True, chains=None):
+    # stores בלי chains מחזיר את הסניף בכל הרשתות שיש להן סניף במספר הזה
+    if not os.path.isdir(archive_dir):
+        return ARCHIVE_SCHEMA.empty_table()
+    dataset = open_archive(archive_dir, memory_map)
+    return dataset.to_table(columns=columns, filter=build_filter(barcodes, stores, start_date, end_date, chains))
+
+def read_prices(columns=None, barcodes=None, stores=None, start_date=None, end_date=None,
+                archive_dir=ARCHIVE_DIR, memory_map=True, chains=None):
+    table = scan_prices(columns, barcodes, stores, start_date, end_date, archive_dir, memory_map, chains)
+    return table.to_pandas()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the local Parquet price archive")
+    parser.add_argument("barcodes", nargs="*", help="barcodes to fetch (default: all)")
+    parser.add_argument("--chain", action="append", dest="chains", help="chain id, e.g. 7290027600007 (repeatable)")
+    parser.add_argument("--store", action="append", dest="stores", help="store number, e.g. 001 (repeatable)")
+    parser.add_argument("--from", dest="start_date", help="first date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end_date", help="last date (YYYY-MM-DD)")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    started = datetime.now()
+    prices = read_prices(columns=['date', 'chain', 'store', 'barcode', 'item_name', 'price', 'price_update'],
+                         barcodes=args.barcodes or None, stores=args.stores,
+                         start_date=args.start_date, end_date=args.end_date, archive_dir=args.archive_dir,
+                         chains=args.chains)
+    print(prices.sort_values(['barcode', 'date', 'chain', 'store']).to_string(index=False))
+    print(f"[INFO] {len(prices)} rows in {(datetime.now() - started).total_seconds():.2f}s")
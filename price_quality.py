@@ -0,0 +1,126 @@
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# שער איכות לפני הטעינה: שורת מחיר שנכשלת באחת הבדיקות לא נכנסת ל-Fact_Prices אלא ל-Quarantine_Prices
+# (דורש את מיגרציות 006, 012). כל הבדיקות הן מסכות וקטוריות על כל הקובץ / המנה - אין לולאה על שורות.
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "1") == "1"
+QUALITY_MIN_PRICE = float(os.environ.get("QUALITY_MIN_PRICE", "0.01"))
+QUALITY_MAX_PRICE = float(os.environ.get("QUALITY_MAX_PRICE", "50000"))
+# קפיצה חשודה: המחיר החדש גדול / קטן פי QUALITY_MAX_JUMP (או יותר) מהמחיר האחרון הידוע בסניף
+# (אותו מחיר שחוזר בקובץ הבא / ביום הבא כבר לא נפסל - ראו match_rejected ב-shufersal_etl.py)
+QUALITY_MAX_JUMP = float(os.environ.get("QUALITY_MAX_JUMP", "10"))
+# ספרת ביקורת GTIN לברקודים באורך 8 / 12 / 13 / 14 (קודים פנימיים באורך אחר נבדקים רק לפורמט)
+QUALITY_GTIN_CHECKSUM = os.environ.get("QUALITY_GTIN_CHECKSUM", "1") == "1"
+QUALITY_MIN_DATE = pd.Timestamp(os.environ.get("QUALITY_MIN_DATE", "2000-01-01"))
+QUALITY_FUTURE_HOURS = float(os.environ.get("QUALITY_FUTURE_HOURS", "24"))
+
+# גבולות העמודות ב-DB: barcode VARCHAR(50), item_name / manufacturer VARCHAR(255)
+MAX_BARCODE_LENGTH = 50
+MAX_TEXT_LENGTH = 255
+GTIN_LENGTHS = (8, 12, 13, 14)
+_GTIN_DIGITS = max(GTIN_LENGTHS)
+
+# ==========================================
+# CHECKS
+# ==========================================
+def _gtin_checksum_ok(values):
+    # משקלות 1,3,1,3... מימין (ספרת הביקורת במשקל 1) - סכום תקין מתחלק ב-10.
+    # לולאה על 14 מיקומי הספרות (לא על שורות); אפסים מובילים לא משנים את הסכום
+    values = values.copy()
+    total = np.zeros(len(values), dtype=np.int64)
+    for position in range(_GTIN_DIGITS):
+        total += (values % 10) * (3 if position % 2 else 1)
+        values //= 10
+    return total % 10 == 0
+
+def barcode_checks(barcodes):
+    # מחזיר (פורמט תקין, ספרת ביקורת תקינה) - שתי מסכות באורך העמודה
+    n = len(barcodes)
+    if pd.api.types.is_integer_dtype(barcodes):
+        # ברקודים שנשמרו כ-int64 כבר עברו בדיקת ספרות בלבד בלי אפס מוביל (_compact_barcodes)
+        values = barcodes.to_numpy()
+        format_ok = values > 0
+        lengths = np.searchsorted(10 ** np.arange(19, dtype=np.int64), values, side='right')
+    else:
+        codes = barcodes.astype(str)
+        lengths = codes.str.len().to_numpy()
+        format_ok = codes.str.fullmatch(rf'\d{{1,{MAX_BARCODE_LENGTH}}}').to_numpy(dtype=bool)
+        values = np.zeros(n, dtype=np.int64)
+        gtin = format_ok & np.isin(lengths, GTIN_LENGTHS)
+        values[gtin] = codes[gtin].astype('int64').to_numpy()
+    if not QUALITY_GTIN_CHECKSUM:
+        return format_ok, np.ones(n, dtype=bool)
+    return format_ok, _gtin_checksum_ok(values) | ~np.isin(lengths, GTIN_LENGTHS)
+
+def price_range_ok(prices):
+    values = prices.to_numpy(dtype='f8', na_value=np.nan)
+    return np.isfinite(values) & (values >= QUALITY_MIN_PRICE) & (values <= QUALITY_MAX_PRICE)
+
+def price_jump_ok(prices, last_prices):
+    # last_prices: המחיר האחרון הידוע לכל שורה (NaN = מוצר חדש בסניף, אין למה להשוות)
+    values = prices.to_numpy(dtype='f8', na_value=np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = values / last_prices
+    comparable = np.isfinite(ratio) & (last_prices > 0)
+    return ~comparable | ((ratio < QUALITY_MAX_JUMP) & (ratio > 1 / QUALITY_MAX_JUMP))
+
+def timestamp_ok(dates, now=None):
+    now = now or datetime.now()
+    values = dates.to_numpy(dtype='M8[s]')
+    latest = np.datetime64(pd.Timestamp(now) + pd.Timedelta(hours=QUALITY_FUTURE_HOURS), 's')
+    return ~np.isnat(values) & (values >= np.datetime64(QUALITY_MIN_DATE, 's')) & (values <= latest)
+
+# ==========================================
+# GATE
+# ==========================================
+def validate_prices(prices, last_prices=None, now=None):
+    # מחזיר (מסכת שורות תקינות, DataFrame של השורות שנפסלו עם reasons / last_price)
+    format_ok, checksum_ok = barcode_checks(prices['barcode'])
+    checks = {
+        "barcode_format": format_ok,
+        "barcode_checksum": checksum_ok,
+        "price_range": price_range_ok(prices['price']),
+        "sample_date": timestamp_ok(prices['sample_date'], now),
+    }
+    if last_prices is not None:
+        checks["price_jump"] = price_jump_ok(prices['price'], last_prices)
+
+    ok = np.logical_and.reduce(list(checks.values()))
+    if ok.all():
+        return ok, None
+
+    bad = ~ok
+    reasons = pd.Series('', index=prices.index[bad], dtype=str)
+    for name, passed in checks.items():
+        failed = ~passed[bad]
+        reasons = reasons.where(~failed, reasons + name + ',')
+    rejected = prices[bad].assign(reasons=reasons.str.rstrip(','),
+                                  last_price=last_prices[bad] if last_prices is not None else np.nan)
+    return ok, rejected
+
+def clip_product_text(products):
+    # שם / יצרן ארוכים מהעמודה היו מפילים את כל הטרנזקציה של הקובץ - נחתכים לאורך המותר
+    for column in ('item_name', 'manufacturer'):
+        values = products[column].astype(str)
+        if (values.str.len() > MAX_TEXT_LENGTH).any():
+            products = products.assign(**{column: values.str.slice(0, MAX_TEXT_LENGTH)})
+    return products
+
+def quarantine_frame(rejected, fname, store_id, chain_id):
+    # שורות ל-Quarantine_Prices: ערכים שלא פוענחו (NaN / NaT / אינסוף) נשמרים כ-NULL, הברקוד כפי שהגיע
+    price = rejected['price'].to_numpy(dtype='f8', na_value=np.nan)
+    return pd.DataFrame({
+        'fname': fname,
+        'store_id': store_id,
+        'chain_id': chain_id,
+        'barcode': rejected['barcode'].astype(str).to_numpy(),
+        'price': np.where(np.isfinite(price) & (np.abs(price) < 1e12), price, np.nan).round(2),
+        'last_price': rejected['last_price'].to_numpy(dtype='f8').round(2),
+        'sample_date': rejected['sample_date'].to_numpy(dtype='M8[s]'),
+        'reasons': rejected['reasons'].to_numpy(),
+    })
@@ -0,0 +1,132 @@
+import os
+import time
+import argparse
+from datetime import date, timedelta
+from sqlalchemy import create_engine, text
+
+# ==========================================
+# ROLLUP TABLES
+# ==========================================
+# סיכומים יומיים קטנים לדשבורדים, במקום Fact_Prices -> Dim_Stores -> Dim_City על כל ההיסטוריה.
+# "מחיר של יום D" = המחיר האחרון הידוע לכל מוצר בסניף בסוף היום (לפי כל מה שנטען עד עכשיו).
+# הטבלאות Agg_Daily_Store_Prices / Agg_Daily_City_Prices נוצרות במיגרציה 008 (sql_scripts/migrate.py)
+
+# כמה ימים אחורה (מהיום האחרון של הסניף בריצה) מחושבים מחדש כשמגיע מחיר עם PriceUpdateDate ישן.
+# ימים מוקדמים יותר נשארים כמו שהם - בנייה מלאה: python price_rollups.py --since ...
+ROLLUP_MAX_BACKFILL_DAYS = int(os.environ.get("ROLLUP_MAX_BACKFILL_DAYS", "7"))
+
+# טווחי המחיר של הסניפים שמחושבים (valid_to = NULL - המחיר הנוכחי), לפי שיטת האחסון (PRICE_STORAGE).
+# ב-samples הטווחים נבנים ב-LEAD על ההיסטוריה של הסניף - סריקה אחת לכל הימים יחד, לא סריקה לכל יום
+PRICE_RANGES_SQL = {
+    "samples": """
+        SELECT f.store_id, f.barcode, f.price, f.sample_date AS valid_from,
+               LEAD(f.sample_date) OVER (PARTITION BY f.store_id, f.barcode ORDER BY f.sample_date) AS valid_to
+        FROM "Fact_Prices" f
+        WHERE f.store_id IN (SELECT store_id FROM {days}) AND f.sample_date < (SELECT MAX(day) + 1 FROM {days})
+          AND f.price IS NOT NULL
+    """,
+    "intervals": """
+        SELECT f.store_id, f.barcode, f.price, f.valid_from, f.valid_to
+        FROM "Fact_Price_Intervals" f
+        WHERE f.store_id IN (SELECT store_id FROM {days}) AND f.valid_from < (SELECT MAX(day) + 1 FROM {days})
+          AND f.price IS NOT NULL
+    """,
+}
+
+# המחירים בתוקף בסוף כל יום (day, store_id) שב-{days}
+EFFECTIVE_PRICES_SQL = """
+    SELECT d.day, d.store_id, e.barcode, e.price
+    FROM {days} d
+    JOIN ({ranges}) e ON e.store_id = d.store_id
+     AND e.valid_from < d.day + 1 AND (e.valid_to IS NULL OR e.valid_to >= d.day + 1)
+"""
+
+# (יום, סניף) שנגעו בהם: גם ימים מאוחרים יותר שכבר יש להם סיכום, כי מחיר חדש מיום D משנה גם אותם.
+# city_store_days - כל הסניפים בכל עיר-יום שנגעו בו (עיר מחושבת מחדש כולה)
+TOUCHED_SQL = """
+CREATE TEMP TABLE touched_store_days ON COMMIT DROP AS
+SELECT DISTINCT u.day, u.store_id FROM unnest(CAST(:days AS date[]), CAST(:stores AS text[])) AS u(day, store_id)
+UNION
+SELECT a.day, a.store_id
+FROM "Agg_Daily_Store_Prices" a
+JOIN (SELECT store_id, MIN(day) AS first_day
+      FROM unnest(CAST(:days AS date[]), CAST(:stores AS text[])) AS u(day, store_id) GROUP BY store_id) m
+  ON a.store_id = m.store_id AND a.day > m.first_day;
+
+CREATE TEMP TABLE touched_city_days ON COMMIT DROP AS
+SELECT DISTINCT t.day, s.city
+FROM touched_store_days t JOIN "Dim_Stores" s ON s.store_id = t.store_id
+WHERE s.city IS NOT NULL;
+
+CREATE TEMP TABLE city_store_days ON COMMIT DROP AS
+SELECT t.day, s.store_id, t.city
+FROM touched_city_days t JOIN "Dim_Stores" s ON s.city = t.city;
+"""
+
+STORE_ROLLUP_SQL = """
+DELETE FROM "Agg_Daily_Store_Prices" a USING touched_store_days t
+WHERE a.day = t.day AND a.store_id = t.store_id;
+
+INSERT INTO "Agg_Daily_Store_Prices" (day, store_id, items, avg_price, min_price, max_price, total_price)
+SELECT e.day, e.store_id, COUNT(*), ROUND(AVG(e.price), 2), MIN(e.price), MAX(e.price), SUM(e.price)
+FROM ({effective}) e
+GROUP BY e.day, e.store_id;
+"""
+
+# עיר מחושבת מחדש כולה (כל הסניפים שבה), אבל רק בימים ובערים שסניף מהם השתנה
+CITY_ROLLUP_SQL = """
+DELETE FROM "Agg_Daily_City_Prices" a USING touched_city_days t
+WHERE a.day = t.day AND a.city = t.city;
+
+INSERT INTO "Agg_Daily_City_Prices" (day, region, city, barcode, stores, avg_price, min_price, max_price)
+SELECT e.day, c.region, s.city, e.barcode, COUNT(*), ROUND(AVG(e.price), 2), MIN(e.price), MAX(e.price)
+FROM ({effective}) e
+JOIN city_store_days s ON s.day = e.day AND s.store_id = e.store_id
+LEFT JOIN "Dim_City" c ON c.city_name = s.city
+GROUP BY e.day, c.region, s.city, e.barcode;
+"""
+
+def effective_prices_sql(days_table, storage):
+    return EFFECTIVE_PRICES_SQL.format(days=days_table, ranges=PRICE_RANGES_SQL[storage].format(days=days_table))
+
+def cap_backfill(touched, max_days):
+    # יום מוקדם מ-max_days לפני היום האחרון של הסניף מוזז לגבול (ממנו ואילך הימים הקיימים מחושבים מחדש)
+    if max_days is None: return set(touched)
+    latest = {}
+    for store_id, day in touched:
+        latest[store_id] = max(day, latest.get(store_id, day))
+    return {(store_id, max(day, latest[store_id] - timedelta(days=max_days))) for store_id, day in touched}
+
+def refresh_rollups(conn, touched, storage="samples", max_backfill_days=ROLLUP_MAX_BACKFILL_DAYS):
+    # touched: קבוצת (store_id, day) - ימי הקבצים שה-ETL עיבד והיום המוקדם שהשורות שלהם שינו. מחזיר (ימי-סניף, ימי-עיר) שחושבו מחדש
+    if not touched: return 0, 0
+    stores, days = zip(*sorted(cap_backfill(touched, max_backfill_days)))
+    conn.execute(text(TOUCHED_SQL), {"days": list(days), "stores": list(stores)})
+    store_days = conn.execute(text("SELECT COUNT(*) FROM touched_store_days")).scalar()
+    city_days = conn.execute(text("SELECT COUNT(*) FROM touched_city_days")).scalar()
+    conn.execute(text(STORE_ROLLUP_SQL.format(effective=effective_prices_sql("touched_store_days", storage))))
+    conn.execute(text(CITY_ROLLUP_SQL.format(effective=effective_prices_sql("city_store_days", storage))))
+    return store_days, city_days
+
+def all_store_days(conn, since, until):
+    # לבנייה מלאה: כל סניף בכל יום בטווח
+    store_ids = conn.execute(text('SELECT store_id FROM "Dim_Stores"')).scalars().all()
+    n_days = (until - since).days + 1
+    return {(store_id, since + timedelta(days=i)) for store_id in store_ids for i in range(n_days)}
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily store / city price rollups for a date range")
+    parser.add_argument("--since", type=date.fromisoformat, required=True, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, default=date.today(), help="last day (default: today)")
+    parser.add_argument("--storage", choices=sorted(EFFECTIVE_PRICES_SQL), default=os.environ.get("PRICE_STORAGE", "samples"))
+    args = parser.parse_args()
+
+    engine = create_engine(os.getenv("SUPABASE_DATABASE_URL"))
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        store_days, city_days = refresh_rollups(conn, all_store_days(conn, args.since, args.until), args.storage,
+                                                max_backfill_days=None)
+    print(f"[SUCCESS] Rollups rebuilt: {store_days} store-days, {city_days} city-days in {time.perf_counter() - t0:.1f}s")
@@ -1,11 +1,37 @@
 import os
+import io
+import re
+import json
+import time
+import random
+import hashlib
+import functools
+import argparse
+import zlib
+import threading
+import queue
+import multiprocessing
+import multiprocessing.managers
+import collections
+import contextlib
+from urllib.parse import urlparse
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
 import gzip
-import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 from sqlalchemy import create_engine, text
-from datetime import datetime
+import price_archive
+import price_quality
+import chain_adapters
+import etl_metrics
+import basket_query
+import price_rollups
+from datetime import datetime, date
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -20,17 +46,247 @@ if not db_url:
 
 engine = create_engine(db_url)
 
-CHAIN_ID = "7290027600007"
-CHAIN_NAME = "שופרסל"
-BASE_URL = "http://prices.shufersal.co.il/"
+# הרשת של ריצה רגילה. כל מה שייחודי לרשת (אתר, שמות קבצים, כתיבי שדות) נמצא ב-chain_adapters.py;
+# כמה רשתות יחד - multi_chain_etl.py
+DEFAULT_CHAIN = chain_adapters.get_chain("shufersal")
+CHAIN_ID = DEFAULT_CHAIN.chain_id
+CHAIN_NAME = DEFAULT_CHAIN.chain_name
+BASE_URL = DEFAULT_CHAIN.base_url
 
-WATCHLIST_STORES = ["001", "042", "116", "205", "300", "002"]
+WATCHLIST_STORES = DEFAULT_CHAIN.watchlist_stores
 
 DATA_DIR = "ETL_Process_Shufersal"
 STORES_DIR = os.path.join(DATA_DIR, "stores")
 PRICES_DIR = os.path.join(DATA_DIR, "prices")
 os.makedirs(STORES_DIR, exist_ok=True)
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "checkpoints")
 os.makedirs(PRICES_DIR, exist_ok=True)
+os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+
+# ריצה שנעצרה (timeout / kill) ממשיכה מאותה נקודה: תור העבודות נשמר ב-checkpoint, גם אם הריצה הבאה
+# מתחילה ביום אחר. קישורי ההורדה חתומים לזמן מוגבל, לכן אחרי CHECKPOINT_MAX_AGE_MIN מחפשים אותם מחדש
+# (העבודות שהסתיימו נשארות מסומנות); checkpoint ישן מ-CHECKPOINT_RETENTION_HOURS נזרק כולו.
+CHECKPOINT_MAX_AGE_MIN = int(os.environ.get("CHECKPOINT_MAX_AGE_MIN", "60"))
+CHECKPOINT_RETENTION_HOURS = float(os.environ.get("CHECKPOINT_RETENTION_HOURS", "48"))
+# תקציב זמן לריצה (0 = ללא הגבלה): כשהוא נגמר לא מתחילים קבצים חדשים, והשאר נדחה לריצה הבאה
+ETL_TIME_BUDGET_MIN = float(os.environ.get("ETL_TIME_BUDGET_MIN", "0"))
+
+# מניפסט של קבצים שכבר עובדו - קובץ שכבר נטען לא יורד ולא מפוענח שוב
+MANIFEST_PATH = os.path.join(DATA_DIR, "manifest.json")
+MANIFEST_RETENTION_DAYS = int(os.environ.get("MANIFEST_RETENTION_DAYS", "45"))
+SKIP_PROCESSED_FILES = os.environ.get("SKIP_PROCESSED_FILES", "1") == "1"
+
+# מטמון ברקודים שכבר קיימים ב-Dim_Products (נטען פעם אחת לריצה, ואופציונלית נשמר בין ריצות)
+PRODUCT_CACHE_PATH = os.path.join(DATA_DIR, "known_barcodes.txt")
+PERSIST_PRODUCT_CACHE = os.environ.get("PERSIST_PRODUCT_CACHE", "0") == "1"
+
+# שליחת מחירים חדשים/שהשתנו בלבד, לפי snapshot מקומי של המחיר האחרון בכל סניף
+PRICE_SNAPSHOTS = os.environ.get("PRICE_SNAPSHOTS", "1") == "1"
+
+# אופן שמירת המחירים: samples = שורה לכל דגימה ב-Fact_Prices,
+# intervals = טווח תוקף לכל מחיר ב-Fact_Price_Intervals (לפני המעבר: sql_scripts/migrate.py --convert-intervals)
+PRICE_STORAGE = os.environ.get("PRICE_STORAGE", "samples")
+# כל קובץ מחירים שפוענח נשמר גם כ-Parquet מקומי (ראו price_archive.py) לניתוחים בלי ה-DB
+PRICE_ARCHIVE = os.environ.get("PRICE_ARCHIVE", "1") == "1"
+if PRICE_STORAGE not in ("samples", "intervals"):
+    raise ValueError(f"Unknown PRICE_STORAGE '{PRICE_STORAGE}' (expected samples / intervals)")
+
+# ==========================================
+# CRAWLER CONFIGURATION
+# ==========================================
+# "concurrent" - מאגר חיבורים ועובדים במקביל, "sequential" - דף אחרי דף (להשוואה)
+CRAWL_MODE = os.environ.get("CRAWL_MODE", "concurrent")
+CRAWL_WORKERS = int(os.environ.get("CRAWL_WORKERS", "8"))
+MAX_LISTING_PAGES = int(os.environ.get("MAX_LISTING_PAGES", "250"))
+# מצב delta (--delta): קבצי Price החלקיים שפורסמו מאז הקובץ האחרון שעובד. הסריקה עוצרת כשלכל סניף
+# נמצא PriceFull או קובץ delta שכבר עובד, או כשהקבצים ברשימה ישנים מ-DELTA_LOOKBACK_HOURS
+DELTA_LOOKBACK_HOURS = float(os.environ.get("DELTA_LOOKBACK_HOURS", "24"))
+DELTA_SUCCESS_EMAIL = os.environ.get("DELTA_SUCCESS_EMAIL", "0") == "1"
+# "targeted" - שאילתה אחת לכל סניף דרך מסנני האתר (קטגוריה + סניף) במקום מעבר על דפי הרשימה, ברשת שהאתר שלה תומך בזה;
+# "crawl" - מעבר על הדפים בלבד. סניף שהחיפוש הממוקד לא החזיר עבורו תשובה נמצא בכל זאת במעבר על הדפים
+DISCOVERY_MODE = os.environ.get("DISCOVERY_MODE", "targeted")
+TARGETED_MAX_PAGES = int(os.environ.get("TARGETED_MAX_PAGES", "3"))
+# תשובות החיפוש הממוקד נשמרות לכמה דקות (0 = בלי מטמון), כך שריצה חוזרת או shard נוסף לא שואלים שוב
+LISTING_CACHE_PATH = os.path.join(DATA_DIR, "listing_cache.json")
+LISTING_CACHE_TTL_MIN = float(os.environ.get("LISTING_CACHE_TTL_MIN", "10"))
+if DISCOVERY_MODE not in ("targeted", "crawl"):
+    raise ValueError(f"Unknown DISCOVERY_MODE '{DISCOVERY_MODE}' (expected targeted / crawl)")
+
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "he-IL,he;q=0.9,en-US;q=0.8,en;q=0.7",
+    "Connection": "keep-alive"
+}
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    # Session אחד לכל הריצה כדי שחיבורי keep-alive ימוחזרו בין הבקשות
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(CRAWL_WORKERS, HTTP_MAX_PER_HOST, 10))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HTTP_HEADERS)
+            _http_session = session
+    return _http_session
+
+# ==========================================
+# HTTP RETRIES & PER-HOST LIMITS
+# ==========================================
+# שגיאות זמניות (ניתוק, timeout, 429/5xx, זרם gzip קטוע) מקבלות ניסיון חוזר עם backoff אקספוננציאלי
+# ו-jitter מלא, כך שתקלה רגעית עולה כמה שניות ולא ריצה שלמה
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "4"))
+HTTP_BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", "1.0"))
+HTTP_BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", "30"))
+# מקסימום בקשות במקביל לכל שרת, בכל התהליכים יחד (דפי הרשימה וקבצי ה-gz יושבים על שרתים שונים)
+HTTP_MAX_PER_HOST = int(os.environ.get("HTTP_MAX_PER_HOST", "8"))
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+class TransientHTTPError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# במצב stream הגוף נקרא ישירות מ-resp.raw, ושם ניתוק באמצע מגיע כשגיאה של urllib3 ולא של requests
+RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, TransientHTTPError,
+                    urllib3.exceptions.ProtocolError, urllib3.exceptions.ReadTimeoutError,
+                    EOFError, zlib.error, gzip.BadGzipFile)
+
+def check_response(resp):
+    if resp.status_code in RETRYABLE_STATUS:
+        retry_after = resp.headers.get("Retry-After")
+        raise TransientHTTPError(f"HTTP {resp.status_code}",
+                                 float(retry_after) if retry_after and retry_after.isdigit() else None)
+    resp.raise_for_status()
+
+def with_retries(fn, what):
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            return fn()
+        except RETRYABLE_ERRORS as e:
+            if attempt == HTTP_RETRIES: raise
+            delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+            if getattr(e, "retry_after", None): delay = max(delay, e.retry_after)
+            print(f"  [WARNING] {what}: {e.__class__.__name__} ({e}), retry {attempt + 1}/{HTTP_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+# מגבלה לשרתים של רשת מסוימת (ChainAdapter.max_per_host) במקום HTTP_MAX_PER_HOST.
+# נרשמת לפני יצירת תהליכי הפענוח, כך שגם הם (fork) מקבלים אותה
+_host_limits = {}
+
+def register_host_limits(chain):
+    if chain.max_per_host:
+        for host in chain.hosts: _host_limits[host] = chain.max_per_host
+
+class _HostSlots:
+    # חי בתהליך ה-Manager: סמפור אחד לכל שרת, משותף לתהליך הראשי ולכל תהליכי הפענוח.
+    # acquire חוסם רק את ה-thread של ה-Manager שמשרת את החיבור של אותו thread בצד הקורא
+    def __init__(self):
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host, limit):
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(limit)
+            return self._slots[host]
+
+    def acquire(self, host, limit):
+        self._slot(host, limit).acquire()
+
+    def release(self, host):
+        self._slots[host].release()
+
+class HostSlotsManager(multiprocessing.managers.BaseManager): pass
+HostSlotsManager.register('HostSlots', _HostSlots)
+
+_host_slots_manager = None
+_shared_host_slots = None
+
+def shared_host_slots(workers, streaming=True):
+    # במצב stream כל הורדה רצה בתהליך פענוח משלה, כך שסמפור לכל תהליך לא מגביל כלום. תהליך Manager אחד
+    # מחזיק את הסמפורים; ה-proxy עובר לתהליכי הפענוח ב-initargs. נפתח רק כשבאמת יש כמה תהליכים שמורידים -
+    # אחרת (תהליך אחד / הורדות ב-threads של התהליך הראשי) מספיק הסמפור המקומי. נסגר ב-stop_shared_host_slots
+    global _host_slots_manager, _shared_host_slots
+    if workers <= 1 or not streaming: return None
+    with _host_slots_lock:
+        if _shared_host_slots is None:
+            _host_slots_manager = HostSlotsManager()
+            _host_slots_manager.start()
+            _shared_host_slots = _host_slots_manager.HostSlots()
+    return _shared_host_slots
+
+def stop_shared_host_slots():
+    # באותו finally שסוגר את מאגר התהליכים שקיבל את ה-proxy
+    global _host_slots_manager, _shared_host_slots
+    with _host_slots_lock:
+        if _host_slots_manager is not None:
+            _host_slots_manager.shutdown()
+        _host_slots_manager = _shared_host_slots = None
+
+@contextlib.contextmanager
+def host_slot(url):
+    host = urlparse(url).netloc
+    limit = _host_limits.get(host, HTTP_MAX_PER_HOST)
+    if _shared_host_slots is not None:
+        _shared_host_slots.acquire(host, limit)
+        try:
+            yield
+        finally:
+            _shared_host_slots.release(host)
+        return
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(limit)
+    with slot:
+        yield
+
+class GzipVerifier:
+    # מפענח את ה-gzip תוך כדי ההורדה (התוכן עצמו נזרק) כדי לוודא שהקובץ שלם:
+    # zlib בודק CRC ואורך בסוף כל member, וקובץ קטוע פשוט לא מגיע ל-eof.
+    # אפסים אחרי member (ריפוד של שרתים / proxies) מדולגים, כמו ב-gzip.GzipFile
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def feed(self, data):
+        while data:
+            if self._decompressor.eof:
+                data = data.lstrip(b"\0")
+                if not data: return
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self._decompressor.decompress(data)
+            data = self._decompressor.unused_data if self._decompressor.eof else b""
+
+    def complete(self):
+        return self._decompressor.eof
+
+# ==========================================
+# PIPELINE CONFIGURATION
+# ==========================================
+# הורדות ב-threads, פענוח XML בתהליכים נפרדים (CPU, עוקף את ה-GIL), וכותב DB יחיד
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "4"))
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+LOAD_QUEUE_SIZE = int(os.environ.get("LOAD_QUEUE_SIZE", "2"))
+# פענוח וטעינה במנות של N פריטים (0 = קובץ שלם בבת אחת): הזיכרון לכל קובץ נשאר קבוע
+# גם בסניפים ענקיים - כל מנה עוברת נרמול וטעינה בנפרד, והתור בין המפענחים לכותב חסום
+PRICE_CHUNK_ITEMS = int(os.environ.get("PRICE_CHUNK_ITEMS", "0"))
+
+# "stream" - ה-gzip נפתח וה-XML מפוענח תוך כדי ההורדה, "file" - הורדה לדיסק ואז פענוח
+INGEST_MODE = os.environ.get("INGEST_MODE", "stream")
+# במצב stream: האם לשמור עותק של הקובץ הגולמי ב-ETL_Process_Shufersal (tee)
+KEEP_RAW_FILES = os.environ.get("KEEP_RAW_FILES", "1") == "1"
+DOWNLOAD_CHUNK_SIZE = 1 << 16
 
 # ==========================================
 # EMAIL CONFIGURATION
@@ -102,241 +358,1759 @@ REGION_MAPPING = {
     'עפולה': 'צפון', 'ערד': 'דרום', 'פרדס חנה': 'צפון', 'פרדסיה': 'שרון', 
     'פתח תקווה': 'מרכז', 'צור יגאל': 'שרון', 'צור משה': 'שרון', 'צורן': 'שרון', 
     'צפת': 'צפון', 'קדימה': 'שרון', 'קצרין': 'צפון', 'קריית אונו': 'מרכז', 
-    'קריית אתא': 'צפון', 'קריית ביאליק': 'צפון', 'קריית גת': 'דרום', 
-    'קריית חיים': 'צפון', 'קריית טבעון': 'צפון', 'קריית מוצקין': 'צפון', 
-    'קריית ספר': 'יהודה ושומרון', 'קריית שמונה': 'צפון', 'ראש העין': 'מרכז', 
+    'קריית ארבע': 'יהודה ושומרון', 'קריית אתא': 'צפון', 'קריית ביאליק': 'צפון', 'קריית גת': 'דרום', 
+    'קריית חיים': 'צפון', 'קריית טבעון': 'צפון', 'קריית ים': 'צפון', 'קריית יערים': 'ירושלים והסביבה', 
+    'קריית מוצקין': 'צפון', 'קריית מלאכי': 'דרום', 'קריית ספר': 'יהודה ושומרון', 'קריית עקרון': 'מרכז', 
+    'קריית שמונה': 'צפון', 'ראש העין': 'מרכז', 
     'ראש פינה': 'צפון', 'ראשון לציון': 'מרכז', 'רהט': 'דרום', 'רחובות': 'מרכז', 
     'רכסים': 'צפון', 'רמלה': 'מרכז', 'רמת גן': 'מרכז', 'רמת השרון': 'מרכז', 
     'רעננה': 'שרון', 'שדרות': 'דרום', 'שוהם': 'מרכז', 'שילת': 'מרכז', 
     'שפרעם': 'צפון', 'תל אביב': 'מרכז', 'תל מונד': 'שרון'
 }
 
+# ==========================================
+# CITY NORMALIZATION ENGINE
+# ==========================================
+# כתיבים שלא מופיעים ב-CITY_MAPPING (מקפים, "קרית/קריית", רווחים כפולים) מותאמים לעיר
+# קנונית: קודם לפי מפתח מנוקה, ואם אין - לפי התאמה מקורבת מילה-מול-מילה. התוצאה נשמרת במטמון מוגבל.
+# התאמה מקורבת: אותו מספר מילים, וכל מילה שונה בעריכה אחת לכל היותר (מילה קצרה - רק זהה).
+# יחס דמיון על כל המחרוזת איחד ערים שונות עם קידומת משותפת ("קריית ים" -> "קריית חיים"),
+# לכן ערים קרובות בכתיב צריכות להופיע במפורש ב-REGION_MAPPING / CITY_MAPPING.
+CITY_FUZZY_MIN_TOKEN = 4
+CITY_CACHE_SIZE = 4096
+
+_CITY_PUNCT_RE = re.compile(r'[-\u2013\u05be_".,()\u05f3\u05f4]+')  # מקפים (כולל מקף עברי), מרכאות וגרשיים
+_CITY_SPACES_RE = re.compile(r'\s+')
+_KIRYAT_RE = re.compile(r'^קרית(?=\s|$)')
+
+def _city_key(city_name):
+    key = _CITY_SPACES_RE.sub(' ', _CITY_PUNCT_RE.sub(' ', city_name)).strip()
+    return _KIRYAT_RE.sub('קריית', key)
+
+def _build_city_index():
+    index = {}
+    for alias, city in CITY_MAPPING.items():
+        index[_city_key(alias)] = city
+    for city in set(REGION_MAPPING) | set(CITY_MAPPING.values()):
+        index[_city_key(city)] = city
+    # גם בלי רווחים, כדי לתפוס "תלאביב" / "פתחתקוה"
+    for key, city in list(index.items()):
+        index.setdefault(key.replace(' ', ''), city)
+    return index
+
+_CITY_BY_KEY = _build_city_index()
+_CITY_KEYS_BY_TOKENS = collections.defaultdict(list)
+for _key in _CITY_BY_KEY:
+    _CITY_KEYS_BY_TOKENS[len(_key.split(' '))].append(_key)
+
+def _within_one_edit(a, b):
+    # מרחק Levenshtein של 0 או 1 (החלפה, הוספה או מחיקה של אות אחת)
+    if abs(len(a) - len(b)) > 1: return False
+    if len(a) > len(b): a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]: i += 1
+    if len(a) == len(b): return a[i + 1:] == b[i + 1:]
+    return a[i:] == b[i + 1:]
+
+def _fuzzy_city_key(key):
+    # מפתח קנוני יחיד שמתאים מילה-מול-מילה; שתי התאמות או יותר - לא מנחשים
+    tokens = key.split(' ')
+    matches = {_CITY_BY_KEY[candidate] for candidate in _CITY_KEYS_BY_TOKENS[len(tokens)]
+               if all(t == c or (min(len(t), len(c)) >= CITY_FUZZY_MIN_TOKEN and _within_one_edit(t, c))
+                      for t, c in zip(tokens, candidate.split(' ')))}
+    return matches.pop() if len(matches) == 1 else None
+
+@functools.lru_cache(maxsize=CITY_CACHE_SIZE)
 def normalize_city_name(city_name):
     if not isinstance(city_name, str) or city_name.strip() == '': 
         return 'לא ידוע'
     city_name = city_name.strip()
     if city_name in CITY_MAPPING: return CITY_MAPPING[city_name]
-    if city_name.startswith('קרית '): return city_name.replace('קרית ', 'קריית ')
-    return city_name
+
+    key = _city_key(city_name)
+    if key in _CITY_BY_KEY: return _CITY_BY_KEY[key]
+    if key.replace(' ', '') in _CITY_BY_KEY: return _CITY_BY_KEY[key.replace(' ', '')]
+    close = _fuzzy_city_key(key)
+    if close: return close
+
+    # עיר שלא מוכרת - נשארת כמו שהיא, רק עם רווחים מנורמלים ו"קריית"
+    return _KIRYAT_RE.sub('קריית', _CITY_SPACES_RE.sub(' ', city_name))
+
+def normalize_city_column(cities):
+    # עבודה לפי ערכים ייחודיים: כל עמודה מקודדת לקודים, כל עיר מנורמלת פעם אחת
+    # והתוצאה משודרת חזרה לפי הקודים. ערך חסר (קוד -1) נופל על 'לא ידוע' שבסוף המערך.
+    codes, uniques = pd.factorize(cities)
+    normalized = np.array([normalize_city_name(c) for c in uniques] + ['לא ידוע'], dtype=object)
+    return pd.Series(normalized[codes], index=cities.index)
 
 # ==========================================
 # ETL LOGIC
 # ==========================================
-def get_download_links():
-    print("[INFO] Connecting to Shufersal website to fetch links...")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
-        "Accept-Language": "he-IL,he;q=0.9,en-US;q=0.8,en;q=0.7",
-        "Connection": "keep-alive"
-    }
-    
+def extract_listing_rows(html):
+    # מחזיר (מילים, קישור) לכל שורה בטבלה שיש בה קישור - lxml במקום BeautifulSoup
+    if not html or not html.strip():
+        return []
+    rows = []
+    doc = lxml.html.fromstring(html)
+    for tr in doc.iter('tr'):
+        hrefs = tr.xpath('.//a/@href')
+        if hrefs:
+            rows.append((' '.join(tr.itertext()).split(), hrefs[0]))
+    return rows
+
+_FNAME_TIME_RE = re.compile(r"-(\d{12})$")
+
+def store_num_from_fname(fname):
+    return fname.split('-')[1].split('_')[0] if '-' in fname else "001"
+
+def match_listing_rows(rows, found_targets, stores=WATCHLIST_STORES, chain=DEFAULT_CHAIN):
+    # stores=None - כל סניפי הרשת (הקובץ העדכני ביותר של כל סניף)
     links = []
-    found_targets = set()
-    targets_needed = 1 + len(WATCHLIST_STORES)
-    
-    for page_num in range(1, 251):
+    for words, href in rows:
+        for word in words:
+            if chain.chain_id in word:
+                is_target = False
+                if chain.stores_prefix in word and "Stores" not in found_targets:
+                    is_target = True
+                    found_targets.add("Stores")
+                match = chain.pricefull_re.search(word)
+                if match and (stores is None or match.group(1) in stores):
+                    target = chain.pricefull_target(match.group(1))
+                    if target not in found_targets:
+                        is_target = True
+                        found_targets.add(target)
+
+                if is_target:
+                    links.append((word, chain.absolute_url(href)))
+                    print(f"  [+] Found: {word}")
+                break
+    return links
+
+def fname_time(fname):
+    # PriceFull7290027600007-001-202610170300 -> 2026-10-17 03:00 (None אם אין חותמת זמן תקינה בשם)
+    match = _FNAME_TIME_RE.search(fname)
+    if not match: return None
+    try:
+        return datetime.strptime(match.group(1), "%Y%m%d%H%M")
+    except ValueError:
+        return None
+
+def match_delta_rows(rows, state, stores=WATCHLIST_STORES, is_processed=lambda fname: False, chain=DEFAULT_CHAIN):
+    # הרשימה מהחדש לישן: כל קובץ Price של סניף נאסף עד שמגיעים ל-PriceFull שלו (שכבר כולל את מה שלפניו)
+    # או לקובץ delta שכבר עובד בריצה קודמת. state: stores_done, cutoff, past_cutoff, seen
+    links = []
+    for words, href in rows:
+        for word in words:
+            if chain.chain_id not in word: continue
+            state["seen"] += 1
+            url = chain.absolute_url(href)
+            if chain.stores_prefix in word and not state["stores_found"]:
+                state["stores_found"] = True
+                links.append((word, url))
+                print(f"  [+] Found: {word}")
+                break
+            match = chain.pricefull_re.search(word)
+            if match:
+                state["stores_done"].add(match.group(1))
+                break
+            match = chain.delta_re.search(word)
+            if not match or (stores is not None and match.group(1) not in stores): break
+            file_time = fname_time(word)
+            if file_time and file_time < state["cutoff"]:
+                state["past_cutoff"] = True
+                break
+            if match.group(1) in state["stores_done"]: break
+            if is_processed(word):
+                state["stores_done"].add(match.group(1))
+                break
+            links.append((word, url))
+            print(f"  [+] Found delta: {word}")
+            break
+    return links
+
+def _get_listing_page(url):
+    with host_slot(url):
+        response = get_http_session().get(url, timeout=45)
+    check_response(response)
+    return response
+
+def fetch_listing_url(url, what):
+    t0 = time.perf_counter()
+    response = with_retries(lambda: _get_listing_page(url), what)
+    t1 = time.perf_counter()
+    rows = extract_listing_rows(response.text)
+    return rows, t1 - t0, time.perf_counter() - t1, len(response.content)
+
+def fetch_listing_page(page_num, chain=DEFAULT_CHAIN):
+    return fetch_listing_url(chain.listing_page_url(page_num), f"{chain.label} listing page {page_num}")
+
+def _crawl_sequential(match_rows, is_done, timings, chain=DEFAULT_CHAIN):
+    links = []
+    for page_num in range(1, MAX_LISTING_PAGES + 1):
         try:
-            response = requests.get(f"{BASE_URL}?page={page_num}", headers=headers, timeout=45)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            for tr in soup.find_all('tr'):
-                a_tag = tr.find('a', href=True)
-                if a_tag:
-                    row_text = tr.get_text(separator=' ', strip=True)
-                    if CHAIN_ID in row_text:
-                        for word in row_text.split():
-                            if CHAIN_ID in word:
-                                is_target = False
-                                if f"Stores{CHAIN_ID}" in word and "Stores" not in found_targets:
-                                    is_target = True
-                                    found_targets.add("Stores")
-                                for store in WATCHLIST_STORES:
-                                    target = f"PriceFull{CHAIN_ID}-{store}"
-                                    if target in word and target not in found_targets:
-                                        is_target = True
-                                        found_targets.add(target)
-                                        break
-                                
-                                if is_target:
-                                    url = a_tag['href']
-                                    if url.startswith('/'): url = BASE_URL.rstrip('/') + url
-                                    links.append((word, url))
-                                    print(f"  [+] Found: {word}")
-                                break
-            
-            if len(found_targets) >= targets_needed: break
-            
+            rows, fetch_s, parse_s, nbytes = fetch_listing_page(page_num, chain)
         except requests.exceptions.Timeout:
-            print(f"[ERROR] Shufersal server timeout on page {page_num}!")
+            print(f"[ERROR] {chain.label} server timeout on page {page_num} (after {HTTP_RETRIES} retries)!")
             break
         except Exception as e:
             print(f"[ERROR] Failed on page {page_num}: {e}")
             break
-            
-    if len(links) == 0:
+
+        timings["pages"] += 1
+        timings["fetch_seconds"] += fetch_s
+        timings["parse_seconds"] += parse_s
+        timings["bytes"] += nbytes
+        if not rows: break  # סוף הרשימה
+        links.extend(match_rows(rows))
+        if is_done(): break
+    return links
+
+def _crawl_concurrent(match_rows, is_done, timings, chain=DEFAULT_CHAIN):
+    # הדפים נשלפים במקביל אבל מעובדים לפי הסדר, כך שתמיד נבחר הקובץ העדכני ביותר
+    # (כמו בסריקה הרציפה). ברגע שכל היעדים נמצאו - הדפים שעוד בתור מבוטלים.
+    links = []
+    workers = chain.crawl_workers or CRAWL_WORKERS
+    in_flight = workers * 2
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = {}
+    next_page = 1
+    try:
+        for page_num in range(1, MAX_LISTING_PAGES + 1):
+            while next_page <= MAX_LISTING_PAGES and len(pending) < in_flight:
+                pending[next_page] = pool.submit(fetch_listing_page, next_page, chain)
+                next_page += 1
+
+            try:
+                rows, fetch_s, parse_s, nbytes = pending.pop(page_num).result()
+            except requests.exceptions.Timeout:
+                print(f"[ERROR] {chain.label} server timeout on page {page_num} (after {HTTP_RETRIES} retries)!")
+                break
+            except Exception as e:
+                print(f"[ERROR] Failed on page {page_num}: {e}")
+                break
+
+            timings["pages"] += 1
+            timings["fetch_seconds"] += fetch_s
+            timings["parse_seconds"] += parse_s
+            timings["bytes"] += nbytes
+            if not rows: break  # סוף הרשימה
+            links.extend(match_rows(rows))
+            if is_done(): break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return links
+
+def _new_delta_state():
+    return {"stores_done": set(), "cutoff": datetime.now() - pd.Timedelta(hours=DELTA_LOOKBACK_HOURS),
+            "past_cutoff": False, "stores_found": False, "seen": 0}
+
+def _crawl(timings, stores, delta, is_processed, chain=DEFAULT_CHAIN):
+    # מעבר על דפי הרשימה מהחדש לישן. מחזיר (קישורים, האם הגיעו שורות מהאתר)
+    if delta:
+        state = _new_delta_state()
+        match_rows = lambda rows: match_delta_rows(rows, state, stores, is_processed, chain)
+        is_done = lambda: state["past_cutoff"] or (stores is not None and state["stores_done"] >= set(stores))
+    else:
+        found_targets = set()
+        # בלי רשימת סניפים אין "סוף" ידוע - סורקים עד סוף הרשימה (או MAX_LISTING_PAGES)
+        targets_needed = 1 + len(stores) if stores is not None else float('inf')
+        match_rows = lambda rows: match_listing_rows(rows, found_targets, stores, chain)
+        is_done = lambda: len(found_targets) >= targets_needed
+
+    if CRAWL_MODE == "sequential":
+        links = _crawl_sequential(match_rows, is_done, timings, chain)
+    else:
+        links = _crawl_concurrent(match_rows, is_done, timings, chain)
+    return links, bool(delta and state["seen"])
+
+# ==========================================
+# TARGETED DISCOVERY (SERVER-SIDE FILTERS)
+# ==========================================
+class ListingCache:
+    # url -> שורות הרשימה שהתקבלו, עם זמן השליפה. נשמר כ-JSON ב-DATA_DIR וממוזג עם מה שתהליך אחר
+    # (או רשת אחרת באותה ריצה) כתב בינתיים
+    _save_lock = threading.Lock()
+
+    def __init__(self, path=LISTING_CACHE_PATH, ttl_min=LISTING_CACHE_TTL_MIN):
+        self.path = path
+        self.ttl = ttl_min * 60
+        self._lock = threading.Lock()
+        self.entries = self._load() if self.ttl > 0 else {}
+        self.hits = 0
+
+    def _load(self):
+        if not os.path.exists(self.path): return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {url: e for url, e in entries.items() if now - e["fetched_at"] < self.ttl}
+
+    def get(self, url):
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry is None or time.time() - entry["fetched_at"] >= self.ttl: return None
+            self.hits += 1
+            return entry["rows"]
+
+    def put(self, url, rows):
+        if self.ttl <= 0: return
+        with self._lock:
+            self.entries[url] = {"fetched_at": time.time(), "rows": rows}
+
+    def save(self):
+        if self.ttl <= 0: return
+        with ListingCache._save_lock, self._lock:
+            entries = self._load()
+            entries.update(self.entries)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+def _lookup_category(category, store_num, match_rows, is_satisfied, cache, chain=DEFAULT_CHAIN):
+    # דפי הקטגוריה המסוננת מהחדש לישן, עד שהיעד נמצא. מחזיר (קישורים, [(fetch, parse, bytes)], found):
+    # found=True רק כשהיעד נמצא בפועל. סוף הרשימה (דף ריק) או TARGETED_MAX_PAGES בלי היעד - סימן שהמסנן
+    # לא עבד (או שהקובץ לא ברשימה המסוננת), והסניף עובר למעבר על הדפים
+    links, pages = [], []
+    for page_num in range(1, TARGETED_MAX_PAGES + 1):
+        url = chain.category_url(category, store_num, page_num)
+        rows = cache.get(url)
+        if rows is None:
+            rows, fetch_s, parse_s, nbytes = fetch_listing_url(url, f"{chain.label} {category} store {store_num} page {page_num}")
+            cache.put(url, rows)
+            pages.append((fetch_s, parse_s, nbytes))
+        if not rows: break
+        links.extend(match_rows(rows))
+        if is_satisfied(): return links, pages, True
+    return links, pages, False
+
+def _lookup_pricefull(store, cache, chain=DEFAULT_CHAIN):
+    found = set()
+    return _lookup_category("pricefull", store, lambda rows: match_listing_rows(rows, found, [store], chain),
+                            lambda: chain.pricefull_target(store) in found, cache, chain)
+
+def _lookup_stores_file(cache, delta=False, is_processed=lambda fname: False, chain=DEFAULT_CHAIN):
+    if delta:
+        state = _new_delta_state()
+        return _lookup_category("stores", 0, lambda rows: match_delta_rows(rows, state, [], is_processed, chain),
+                                lambda: state["stores_found"], cache, chain)
+    found = set()
+    return _lookup_category("stores", 0, lambda rows: match_listing_rows(rows, found, [], chain),
+                            lambda: "Stores" in found, cache, chain)
+
+def _lookup_deltas(store, is_processed, cache, chain=DEFAULT_CHAIN):
+    # בקטגוריית Price אין את ה-PriceFull, לכן קודם נשלף ה-PriceFull האחרון של הסניף - ו-delta ישן ממנו
+    # נחשב כמו חציית ה-cutoff (כבר כלול בו), בדיוק כמו במעבר על הדפים
+    full_times = []
+    def match_full(rows):
+        full_times.extend(fname_time(word) for words, _ in rows for word in words if chain.pricefull_re.search(word))
+        return []
+    _, pages, _ = _lookup_category("pricefull", store, match_full, lambda: True, cache, chain)
+    state = _new_delta_state()
+    full_times = [t for t in full_times if t]
+    if full_times: state["cutoff"] = max(state["cutoff"], max(full_times))
+    links, delta_pages, found = _lookup_category(
+        "price", store, lambda rows: match_delta_rows(rows, state, [store], is_processed, chain),
+        lambda: state["past_cutoff"] or store in state["stores_done"], cache, chain)
+    return links, pages + delta_pages, found
+
+def _discover_targeted(timings, stores, delta, is_processed, chain=DEFAULT_CHAIN):
+    # O(סניפים) בקשות במקום O(דפים). מחזיר (קישורים, סניפים שלא נמצאו, האם "Stores" לא נמצא)
+    cache = ListingCache()
+    links, missing = [], []
+    pool = ThreadPoolExecutor(max_workers=chain.crawl_workers or CRAWL_WORKERS)
+    try:
+        futures = [("Stores", pool.submit(_lookup_stores_file, cache, delta, is_processed, chain))]
+        for store in stores:
+            if delta:
+                futures.append((store, pool.submit(_lookup_deltas, store, is_processed, cache, chain)))
+            else:
+                futures.append((store, pool.submit(_lookup_pricefull, store, cache, chain)))
+        for name, future in futures:
+            try:
+                query_links, pages, found = future.result()
+            except Exception as e:
+                print(f"[WARNING] Targeted lookup for {name} failed: {e}")
+                missing.append(name)
+                continue
+            links.extend(query_links)
+            for fetch_s, parse_s, nbytes in pages:
+                timings["pages"] += 1
+                timings["fetch_seconds"] += fetch_s
+                timings["parse_seconds"] += parse_s
+                timings["bytes"] += nbytes
+            if not found: missing.append(name)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    timings["cached_pages"] = cache.hits
+    cache.save()
+    return links, [name for name in missing if name != "Stores"], "Stores" in missing
+
+def get_download_links(timings=None, stores=WATCHLIST_STORES, delta=False, is_processed=lambda fname: False,
+                       chain=DEFAULT_CHAIN):
+    # בלי רשימת סניפים (--all-stores) אין למי לשאול ישירות - רק מעבר על הדפים
+    targeted = DISCOVERY_MODE == "targeted" and chain.supports_category_filter and stores is not None
+    mode = "targeted" if targeted else CRAWL_MODE
+    print(f"[INFO] Connecting to {chain.label} website to fetch {'delta ' if delta else ''}links ({mode} mode)...")
+    if timings is None: timings = {}
+    timings.update({"mode": mode, "pages": 0, "fetch_seconds": 0.0, "parse_seconds": 0.0, "bytes": 0, "cached_pages": 0})
+
+    t0 = time.perf_counter()
+    if targeted:
+        links, missing, stores_missing = _discover_targeted(timings, stores, delta, is_processed, chain)
+        seen = bool(links) or len(missing) < len(stores)
+        if missing or stores_missing:
+            print(f"[WARNING] Targeted lookup incomplete (stores: {', '.join(missing) or '-'}, "
+                  f"Stores file: {'missing' if stores_missing else 'ok'}). Falling back to the page walk...")
+            timings["mode"] = f"targeted+{CRAWL_MODE}"
+            crawl_links, crawl_seen = _crawl(timings, missing, delta, is_processed, chain)
+            known = {fname for fname, _ in links}
+            links.extend(l for l in crawl_links if l[0] not in known)
+            seen = seen or crawl_seen
+    else:
+        links, seen = _crawl(timings, stores, delta, is_processed, chain)
+    timings["seconds"] = time.perf_counter() - t0
+    etl_metrics.record("discovery", timings["seconds"], timings["pages"], timings["bytes"], mode=timings["mode"], chain=chain.key,
+                       fetch_seconds=round(timings["fetch_seconds"], 4), parse_seconds=round(timings["parse_seconds"], 4),
+                       cached_pages=timings["cached_pages"])
+
+    cached = f" (+{timings['cached_pages']} cached)" if timings["cached_pages"] else ""
+    print(f"[INFO] {chain.label} discovery: {len(links)} files from {timings['pages']} pages{cached} in {timings['seconds']:.1f}s")
+    # במצב delta ריצה בלי קבצים חדשים היא תקינה, כל עוד הרשימה עצמה הגיעה
+    if len(links) == 0 and not (delta and seen):
         raise Exception("Critical: Found 0 files! The scraper was blocked or the site is down.")
         
     return links
 
-def fast_parse_xml(file_path, item_tag):
-    items = []
-    with gzip.open(file_path, 'rb') as f:
-        context = ET.iterparse(f, events=('end',))
-        for event, elem in context:
-            if elem.tag == item_tag or elem.tag.lower() == item_tag.lower() or elem.tag.endswith(item_tag):
-                item_data = {child.tag: child.text for child in elem}
-                items.append(item_data)
-                elem.clear()
-    return pd.DataFrame(items)
-
-def run_full_etl():
+# ==========================================
+# OFFLINE REPLAY (LOCAL FILE ARCHIVE)
+# ==========================================
+def replay_links(since=None, until=None, stores=WATCHLIST_STORES, chain=DEFAULT_CHAIN):
+    # כל קבצי ה-gz שכבר ירדו (KEEP_RAW_FILES) בטווח התאריכים, מהישן לחדש: (fname, נתיב מקומי).
+    # אין גישה לרשת - זהו תחליף ל-get_download_links בריצת --replay
+    links = []
+    for directory in (STORES_DIR, PRICES_DIR):
+        if not os.path.isdir(directory): continue
+        for name in os.listdir(directory):
+            if not name.endswith(".gz"): continue  # כולל .part של הורדה שלא הסתיימה
+            fname = name[:-3]
+            file_time = fname_time(fname)
+            if file_time is None or not chain.owns(fname): continue
+            if since and file_time.date() < since: continue
+            if until and file_time.date() > until: continue
+            if "Stores" not in fname and stores is not None and store_num_from_fname(fname) not in stores: continue
+            links.append((file_time, fname, os.path.join(directory, name)))
+    links.sort()
+    print(f"[INFO] Replay: {len(links)} archived files between {since or 'the beginning'} and {until or 'today'}")
+    if not links:
+        raise Exception(f"Critical: no archived files to replay in {STORES_DIR} / {PRICES_DIR}.")
+    return [(fname, path) for _, fname, path in links]
+
+# ==========================================
+# PRICE SCHEMA (Schema Drift Handler)
+# ==========================================
+# עמודה קנונית -> הכתיבים שלה בקבצי הרשת, לפי סדר עדיפות (לכל רשת ב-chain_adapters, כאן של ברירת המחדל)
+PRICE_COLUMN_ALIASES = dict(DEFAULT_CHAIN.price_aliases)
+# השדות מתוך <Item> שה-ETL באמת משתמש בהם (כולל כל הכתיבים של אותו שדה)
+PRICE_ITEM_FIELDS = DEFAULT_CHAIN.price_item_fields
+UNKNOWN_VALUE = 'לא ידוע'
+_INT_BARCODE_RE = r'[1-9]\d{0,17}'
+
+@functools.lru_cache(maxsize=64)
+def resolve_price_columns(columns, aliases=DEFAULT_CHAIN.price_aliases):
+    # tuple של עמודות הקובץ -> {עמודה קנונית: עמודת מקור או None}. מחושב פעם אחת לכל צורת קובץ ורשת
+    return {name: next((alias for alias in names if alias in columns), None) for name, names in aliases}
+
+def _compact_barcodes(codes):
+    # int64 רק כשההמרה הפיכה (ספרות בלבד, בלי אפס מוביל, עד 18 ספרות) - אחרת הברקודים נשארים מחרוזות
+    codes = codes.astype(str)
+    if len(codes) and codes.str.fullmatch(_INT_BARCODE_RE).all():
+        return codes.astype('int64')
+    return codes
+
+def _parse_timestamps(values):
+    try:
+        parsed = pd.to_datetime(values, format='ISO8601')
+    except ValueError:
+        # פורמט לא צפוי - pandas מזהה לבד (איטי יותר); ערך שלא מתפענח הופך ל-NaT ונפסל בשער האיכות
+        parsed = pd.to_datetime(values, format='mixed', errors='coerce')
+    return parsed.astype('datetime64[s]')
+
+def _constant_column(value, n_rows):
+    # עמודה קבועה (רשת / סניף) כ-category: בית אחד לשורה במקום מחרוזת לשורה
+    return pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int8), [value])
+
+def map_price_frame(df, chain=DEFAULT_CHAIN):
+    # מעבר יחיד: כל עמודה קנונית נבנית ישר מעמודת המקור שלה, כבר בטיפוס הקומפקטי
+    source = resolve_price_columns(tuple(df.columns), chain.price_aliases)
+    column = lambda name: df[source[name]] if source[name] else None
+    names, manufacturers, dates, prices = (column(n) for n in ('item_name', 'manufacturer', 'sample_date', 'price'))
+    return pd.DataFrame({
+        'barcode': _compact_barcodes(df[source['barcode']]),
+        'item_name': names if names is not None else pd.Series(UNKNOWN_VALUE, index=df.index, dtype=str),
+        'manufacturer': (manufacturers if manufacturers is not None
+                         else pd.Series(UNKNOWN_VALUE, index=df.index, dtype=str)).astype('category'),
+        'sample_date': _parse_timestamps(dates) if dates is not None
+                       else pd.Series(pd.Timestamp(datetime.now()).floor('s'), index=df.index, dtype='datetime64[s]'),
+        'price': pd.to_numeric(prices, errors='coerce').astype('float32') if prices is not None
+                 else pd.Series(np.nan, index=df.index, dtype='float32'),
+    })
+
+def _item_tag_filter(item_tag):
+    # הסינון נעשה בתוך lxml: '{*}' תופס את התגית בכל namespace (או בלי), בכל צורת אותיות שנפוצה
+    return sorted({f"{{*}}{t}" for t in (item_tag, item_tag.lower(), item_tag.upper(), item_tag.capitalize())})
+
+def _columns_to_frame(columns, n_rows):
+    data = {}
+    for tag, (rows, values) in columns.items():
+        if len(rows) == n_rows:
+            data[tag] = values
+        else:
+            # עמודה שחסרה בחלק מהפריטים - ממלאים None במקומות החסרים
+            padded = np.full(n_rows, None, dtype=object)
+            padded[rows] = values
+            data[tag] = padded
+    return pd.DataFrame(data)
+
+def iter_parse_xml(source, item_tag, usecols=None, chunk_items=None):
+    # source הוא נתיב לקובץ gz או אובייקט קובץ פתוח (למשל זרם gzip מתוך תשובת HTTP).
+    # כל עמודה נאספת לרשימה משלה (אינדקסי שורות + ערכים) - אין dict לכל <Item>.
+    # מחזיר DataFrame לכל chunk_items פריטים; בלי chunk_items - DataFrame אחד לכל הקובץ.
+    columns = {}
+    n_rows = 0
+    yielded = False
+    f = gzip.open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    with f:
+        for _, elem in etree.iterparse(f, events=('end',), tag=_item_tag_filter(item_tag)):
+            for child in elem:
+                tag = child.tag
+                if tag.__class__ is not str: continue  # הערות / processing instructions
+                if usecols is not None and tag not in usecols: continue
+                col = columns.get(tag)
+                if col is None:
+                    col = columns[tag] = ([], [])
+                col[0].append(n_rows)
+                col[1].append(child.text)
+            n_rows += 1
+            # משחררים את האלמנט וגם את האחים שכבר עובדו, כדי שהעץ לא יגדל לאורך הקובץ
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+            if chunk_items and n_rows >= chunk_items:
+                yield _columns_to_frame(columns, n_rows)
+                yielded = True
+                columns = {}
+                n_rows = 0
+
+    if n_rows or not yielded:
+        yield _columns_to_frame(columns, n_rows)
+
+def fast_parse_xml(source, item_tag, usecols=None):
+    return next(iter_parse_xml(source, item_tag, usecols))
+
+class _TeeReader:
+    # עוטף את הזרם הגולמי של התשובה: כל מנה שנקראת נכתבת גם לקובץ (אם ביקשו) ונכנסת ל-hash
+    def __init__(self, raw, tee_file=None):
+        self.raw = raw
+        self.tee_file = tee_file
+        self.bytes_read = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.raw.read(size if size and size > 0 else DOWNLOAD_CHUNK_SIZE)
+        if data:
+            self.bytes_read += len(data)
+            self.sha256.update(data)
+            if self.tee_file: self.tee_file.write(data)
+        return data
+
+def _response_source_info(resp):
+    # מה שהשרת מספר על הקובץ עוד לפני שקראנו ממנו בייט אחד
+    size = resp.headers.get("Content-Length")
+    return {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"),
+            "size": int(size) if size and size.isdigit() else None, "sha256": None, "skipped": None}
+
+def stream_parse_xml(url, item_tag, tee_path=None, usecols=None, known_headers=frozenset(),
+                     chunk_items=None, on_chunk=None, on_attempt=None):
+    # אין resp.content בזיכרון ואין קריאה חוזרת מהדיסק: ה-XML מפוענח בזמן שהוא יורד.
+    # מחזיר (df, source); אם הכותרות מזהות קובץ שכבר עובד - df הוא None והגוף לא נקרא בכלל.
+    # עם on_chunk: כל מנה של chunk_items פריטים נמסרת ל-on_chunk בזמן ההורדה, ו-df הוא None.
+    # ניתוק באמצע מפענח את הקובץ מההתחלה; on_attempt(source) נקרא בתחילת כל ניסיון, כדי שהצד
+    # שמקבל את המנות ידלג על מנות שכבר קיבל (ראו _ChunkSender)
+    return with_retries(lambda: _stream_parse_attempt(url, item_tag, tee_path, usecols, known_headers, chunk_items,
+                                                      on_chunk, on_attempt),
+                        f"Stream {os.path.basename(urlparse(url).path)}")
+
+def _stream_parse_attempt(url, item_tag, tee_path, usecols, known_headers, chunk_items, on_chunk, on_attempt=None):
+    part_path = tee_path + ".part" if tee_path else None
+    with host_slot(url), get_http_session().get(url, stream=True, timeout=120) as resp:
+        check_response(resp)
+        source = _response_source_info(resp)
+        if source["etag"] and (source["etag"], source["size"]) in known_headers:
+            source["skipped"] = "headers"
+            return None, source
+        if on_attempt: on_attempt(source)
+
+        resp.raw.decode_content = True
+        tee_file = open(part_path, 'wb') if part_path else None
+        try:
+            reader = _TeeReader(resp.raw, tee_file)
+            frames = iter_parse_xml(gzip.GzipFile(fileobj=reader, mode='rb'), item_tag, usecols, chunk_items)
+            if on_chunk is None:
+                df = next(frames)
+            else:
+                df = None
+                for chunk in frames: on_chunk(chunk)
+        except Exception:
+            if tee_file:
+                tee_file.close()
+                os.remove(part_path)
+            raise
+        if tee_file:
+            tee_file.close()
+            os.replace(part_path, tee_path)
+    source.update({"size": reader.bytes_read, "sha256": reader.sha256.hexdigest()})
+    return df, source
+
+# ==========================================
+# PROCESSED FILES MANIFEST
+# ==========================================
+class FileManifest:
+    # שם קובץ -> גודל, ETag/Last-Modified ו-sha256 של התוכן הדחוס.
+    # קובץ מדולג אם שמו כבר עובד (לפני ההורדה), אם הכותרות שלו זהות לקובץ שעובד
+    # (לפני קריאת הגוף), או אם התוכן שלו זהה לקובץ שעובד (אחרי ההורדה).
+    def __init__(self, path=MANIFEST_PATH, skip_processed=SKIP_PROCESSED_FILES):
+        self.path = path
+        self.skip_processed = skip_processed
+        self._lock = threading.Lock()
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+
+    def is_processed(self, fname):
+        with self._lock:
+            return self.skip_processed and fname in self.files
+
+    def header_keys(self):
+        if not self.skip_processed: return frozenset()
+        with self._lock:
+            return frozenset((e["etag"], e["size"]) for e in self.files.values() if e.get("etag"))
+
+    def find_duplicate(self, source):
+        # מחזיר את שם הקובץ שכבר עובד עם אותו תוכן (לפי hash, ואם אין - לפי הכותרות)
+        if not self.skip_processed: return None
+        with self._lock:
+            for fname, entry in self.files.items():
+                if source.get("sha256") and entry.get("sha256") == source["sha256"]:
+                    return fname
+                if source.get("skipped") == "headers" and entry.get("etag") == source["etag"] and entry.get("size") == source["size"]:
+                    return fname
+        return None
+
+    def mark_processed(self, fname, source, duplicate_of=None):
+        entry = {k: source.get(k) for k in ("size", "etag", "last_modified", "sha256")}
+        entry["processed_at"] = datetime.now().isoformat(timespec='seconds')
+        if duplicate_of: entry["duplicate_of"] = duplicate_of
+        with self._lock:
+            self.files[fname] = entry
+            self._save()
+
+    def _save(self):
+        cutoff = (datetime.now() - pd.Timedelta(days=MANIFEST_RETENTION_DAYS)).isoformat(timespec='seconds')
+        self.files = {k: v for k, v in self.files.items() if v["processed_at"] >= cutoff}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+def skip_if_duplicate(manifest, fname, source, stats):
+    original = manifest.find_duplicate(source)
+    if original is None: return False
+    print(f"  [SKIP] {fname}: identical to already processed {original}")
+    manifest.mark_processed(fname, source, duplicate_of=original)
+    stats["skipped_files"] += 1
+    return True
+
+# ==========================================
+# PRICE FILE PIPELINE
+# ==========================================
+def download_file(url, local_path, known_headers=frozenset()):
+    t0 = time.perf_counter()
+    source = with_retries(lambda: _download_attempt(url, local_path, known_headers),
+                          f"Download {os.path.basename(local_path)}")
+    source.update({"local_path": local_path, "seconds": time.perf_counter() - t0, "peak_rss_mb": etl_metrics.peak_rss_mb()})
+    return source
+
+def _download_attempt(url, local_path, known_headers):
+    # ההורדה נכתבת ל-.part; ניסיון חוזר (או ריצה הבאה) ממשיך ממנו עם Range במקום להתחיל מאפס.
+    # ה-ETag של החלק שמור לצדו ונשלח ב-If-Range, כך ששרת שהקובץ אצלו השתנה מחזיר את כולו (200).
+    part_path = local_path + ".part"
+    etag_path = part_path + ".etag"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if os.path.exists(etag_path):
+            with open(etag_path, encoding='utf-8') as f:
+                headers["If-Range"] = f.read()
+
+    with host_slot(url), get_http_session().get(url, stream=True, timeout=120, headers=headers) as resp:
+        if resp.status_code == 416:
+            # החלק השמור לא מתאים לקובץ שבשרת - מתחילים מחדש
+            os.remove(part_path)
+            raise TransientHTTPError("HTTP 416 on resume, restarting download")
+        check_response(resp)
+        source = _response_source_info(resp)
+        if not offset and source["etag"] and (source["etag"], source["size"]) in known_headers:
+            source["skipped"] = "headers"
+            return source
+
+        resumed = resp.status_code == 206
+        if source["etag"]:
+            with open(etag_path, 'w', encoding='utf-8') as f:
+                f.write(source["etag"])
+        sha256 = hashlib.sha256()
+        verifier = GzipVerifier()
+        size = 0
+        try:
+            if resumed:
+                # מה שכבר ירד נכנס ל-hash ולבדיקת השלמות לפני ההמשך
+                print(f"  [INFO] Resuming {os.path.basename(local_path)} from byte {offset}")
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                        sha256.update(chunk)
+                        verifier.feed(chunk)
+                        size += len(chunk)
+            with open(part_path, 'ab' if resumed else 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    verifier.feed(chunk)
+                    size += len(chunk)
+        except zlib.error:
+            # תוכן פגום - אין טעם להמשיך ממנו
+            os.remove(part_path)
+            raise
+
+    if not verifier.complete():
+        # הזרם נגמר באמצע ה-gzip בלי שגיאת רשת - הניסיון הבא ימשיך מאותה נקודה
+        raise EOFError(f"gzip stream ended after {size} bytes")
+    os.replace(part_path, local_path)
+    if os.path.exists(etag_path): os.remove(etag_path)
+    source.update({"size": size, "sha256": sha256.hexdigest()})
+    return source
+
+# parse_price_file / stream_price_file רצים בתוך תהליך של ה-ProcessPool,
+# לכן מחזירים רק נתונים שאפשר לשלוח בחזרה (pickle). ה-adapter של הרשת עובר ב-pickle (הוא קטן ובלי מצב)
+def parse_price_file(local_path, fname, source=None, chain=DEFAULT_CHAIN):
+    t0 = time.perf_counter()
+    if _chunk_queue is not None:
+        sender = _ChunkSender(fname, chain)
+        for chunk in iter_parse_xml(local_path, 'Item', chain.price_item_fields, PRICE_CHUNK_ITEMS):
+            sender.send(chunk)
+        return sender.finish(source, os.path.getsize(local_path), time.perf_counter() - t0)
+    df = fast_parse_xml(local_path, 'Item', usecols=chain.price_item_fields)
+    parsed = transform_price_frame(df, fname, time.perf_counter() - t0, chain=chain)
+    parsed["bytes"] = os.path.getsize(local_path)
+    return parsed
+
+def stream_price_file(url, fname, tee_path=None, known_headers=frozenset(), chain=DEFAULT_CHAIN):
+    t0 = time.perf_counter()
+    if _chunk_queue is not None:
+        sender = _ChunkSender(fname, chain)
+        _, source = stream_parse_xml(url, 'Item', tee_path, usecols=chain.price_item_fields, known_headers=known_headers,
+                                     chunk_items=PRICE_CHUNK_ITEMS, on_chunk=sender.send, on_attempt=sender.start_attempt)
+        return sender.finish(source, source["size"], time.perf_counter() - t0)
+    df, source = stream_parse_xml(url, 'Item', tee_path, usecols=chain.price_item_fields, known_headers=known_headers)
+    if df is None:
+        return {"fname": fname, "source": source, "seconds": time.perf_counter() - t0}
+    parsed = transform_price_frame(df, fname, time.perf_counter() - t0, chain=chain)
+    parsed.update({"source": source, "bytes": source["size"]})
+    return parsed
+
+class _ChunkSender:
+    # במצב chunks: כל מנה מנורמלת ונשלחת ישר לכותב דרך התור המשותף (ולא דרך תוצאת ה-future),
+    # ובסוף נשלח סמן "last" עם פרטי המקור. התור חסום, כך שמפענח שמקדים את הכותב ממתין.
+    # ניסיון הורדה חוזר מפענח את הקובץ מההתחלה: המנות שכבר נשלחו (ונכתבו לארכיון) מדולגות,
+    # כך שהכותב והארכיון מקבלים כל מנה פעם אחת בדיוק
+    def __init__(self, fname, chain=DEFAULT_CHAIN):
+        self.fname = fname
+        self.chain = chain
+        self.store_num = store_num_from_fname(fname)
+        self.rows = 0
+        self.chunks = 0
+        self.seen = 0
+        self.source_key = None
+        self.transform_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def start_attempt(self, source):
+        self.seen = 0
+        source_key = (source["etag"], source["size"])
+        if self.chunks and source_key != self.source_key:
+            # הקובץ בשרת השתנה בין הניסיונות - המנות הישנות לא תואמות, והארכיון נכתב מחדש מהמנה הראשונה
+            print(f"  [WARNING] {self.fname} changed between download attempts, re-sending all chunks")
+            if PRICE_ARCHIVE:
+                for part in range(self.chunks):
+                    path = price_archive.archive_path(self.fname, self.chain.chain_id, self.store_num, part)
+                    if os.path.exists(path): os.remove(path)
+            self.rows = 0
+            self.chunks = 0
+        self.source_key = source_key
+
+    def send(self, df):
+        self.seen += 1
+        if self.seen <= self.chunks: return  # נשלחה כבר בניסיון קודם
+        parsed = transform_price_frame(df, self.fname, part=self.chunks, chain=self.chain)
+        parsed["last"] = False
+        self.transform_seconds += parsed["transform_seconds"]
+        self.rows += len(parsed["prices"])
+        self.chunks += 1
+        t0 = time.perf_counter()
+        _chunk_queue.put(parsed)
+        self.wait_seconds += time.perf_counter() - t0
+
+    def finish(self, source, nbytes, seconds):
+        if self.chunks:
+            _chunk_queue.put({"fname": self.fname, "store_num": self.store_num, "source": source, "last": True})
+        # זמן הפענוח לא כולל את הנרמול ואת ההמתנה לכותב
+        parse_seconds = seconds - self.transform_seconds - self.wait_seconds
+        return {"fname": self.fname, "source": source, "chunks": self.chunks, "rows": self.rows, "bytes": nbytes,
+                "seconds": seconds, "parse_seconds": parse_seconds, "transform_seconds": self.transform_seconds,
+                "queue_wait_seconds": self.wait_seconds, "peak_rss_mb": etl_metrics.peak_rss_mb()}
+
+def transform_price_frame(df, fname, parse_seconds=0.0, part=None, chain=DEFAULT_CHAIN):
+    t0 = time.perf_counter()
+    frame = map_price_frame(df, chain)
+    del df
+
+    store_num = store_num_from_fname(fname)
+    store_id = chain.store_id(store_num)
+    products = frame[['barcode', 'item_name', 'manufacturer']].drop_duplicates(subset=['barcode'])
+    products = products.assign(category=_constant_column('כללי', len(products)))
+    prices = frame[['barcode', 'sample_date', 'price']].assign(
+        chain_id=_constant_column(chain.chain_id, len(frame)), store_id=_constant_column(store_id, len(frame)))
+
+    if PRICE_ARCHIVE:
+        price_archive.write_price_file(frame, fname, store_num, chain.chain_id, part)
+
+    transform_seconds = time.perf_counter() - t0
+    return {"fname": fname, "store_num": store_num, "store_id": store_id, "chain_id": chain.chain_id,
+            "products": products, "prices": prices,
+            "seconds": parse_seconds + transform_seconds,
+            "parse_seconds": parse_seconds, "transform_seconds": transform_seconds,
+            "peak_rss_mb": etl_metrics.peak_rss_mb()}
+
+# ==========================================
+# BULK LOADER (COPY -> TEMP TABLE -> MERGE)
+# ==========================================
+# עמודות מוקלדות לטבלאות הזמניות - הערכים נכנסים כבר כ-NUMERIC / TIMESTAMP
+STORES_TEMP_COLUMNS = [('store_id', 'TEXT'), ('chain_id', 'TEXT'), ('store_name', 'TEXT'), ('city', 'TEXT')]
+PRODUCTS_TEMP_COLUMNS = [('barcode', 'TEXT'), ('item_name', 'TEXT'), ('category', 'TEXT'), ('manufacturer', 'TEXT')]
+PRICES_TEMP_COLUMNS = [('store_id', 'TEXT'), ('barcode', 'TEXT'), ('price', 'NUMERIC'), ('sample_date', 'TIMESTAMP'), ('chain_id', 'TEXT')]
+QUARANTINE_TEMP_COLUMNS = [('fname', 'TEXT'), ('store_id', 'TEXT'), ('chain_id', 'TEXT'), ('barcode', 'TEXT'), ('price', 'NUMERIC'),
+                           ('last_price', 'NUMERIC'), ('sample_date', 'TIMESTAMP'), ('reasons', 'TEXT')]
+# ה-ON CONFLICT חוזר על ביטויי המפתח של ux_quarantine_prices_key (מיגרציה 012)
+QUARANTINE_MERGE_SQL = """
+    INSERT INTO "Quarantine_Prices" (fname, store_id, chain_id, barcode, price, last_price, sample_date, reasons)
+    SELECT fname, store_id, chain_id, barcode, price, last_price, sample_date, reasons FROM temp_quarantine
+    ON CONFLICT (COALESCE(store_id, ''), COALESCE(barcode, ''), COALESCE(price, 'NaN'), COALESCE(sample_date, '-infinity'))
+    DO NOTHING;
+"""
+
+PRICES_MERGE_SQL = {
+    "samples": """
+        INSERT INTO "Fact_Prices" (store_id, barcode, price, sample_date, chain_id)
+        SELECT store_id, barcode, price, sample_date, chain_id FROM temp_prices
+        ON CONFLICT (store_id, barcode, sample_date) DO NOTHING;
+    """,
+    # מחיר שלא השתנה לא נוגע בטבלה - הטווח הפתוח (valid_to IS NULL) פשוט ממשיך.
+    # מחיר שהשתנה סוגר את הטווח הפתוח בתאריך הדגימה החדשה ופותח טווח חדש.
+    "intervals": """
+        UPDATE "Fact_Price_Intervals" f SET valid_to = t.sample_date
+        FROM temp_prices t
+        WHERE f.store_id = t.store_id AND f.barcode = t.barcode AND f.valid_to IS NULL
+          AND f.price <> ROUND(t.price, 2) AND t.sample_date > f.valid_from;
+
+        INSERT INTO "Fact_Price_Intervals" (store_id, barcode, chain_id, price, valid_from)
+        SELECT t.store_id, t.barcode, t.chain_id, ROUND(t.price, 2), t.sample_date FROM temp_prices t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM "Fact_Price_Intervals" f
+            WHERE f.store_id = t.store_id AND f.barcode = t.barcode AND f.valid_to IS NULL
+        )
+        ON CONFLICT (store_id, barcode, valid_from) DO NOTHING;
+    """,
+}
+
+# המחיר האחרון לכל (סניף, ברקוד) לשאילתות סל (basket_query.py): רק השורות שנטענו עכשיו, ודגימה ישנה
+# (delta שעובד אחרי PriceFull חדש יותר) לא דורסת חדשה - כמו DISTINCT ON לפי sample_date
+LATEST_PRICES_MERGE_SQL = """
+    INSERT INTO "Latest_Prices" AS l (store_id, barcode, price, sample_date)
+    SELECT DISTINCT ON (store_id, barcode) store_id, barcode, ROUND(price, 2), sample_date FROM temp_prices
+    ORDER BY store_id, barcode, sample_date DESC NULLS LAST
+    ON CONFLICT (store_id, barcode) DO UPDATE SET price = EXCLUDED.price, sample_date = EXCLUDED.sample_date
+    WHERE EXCLUDED.sample_date > l.sample_date;
+"""
+
+# דגימה ישנה מתחילת הטווח הפתוח (למשל delta שעובד אחרי PriceFull חדש יותר) לא נכנסת לטווחים -
+# אחרי ה-merge הטווח הפתוח עדיין מתחיל אחריה. נספרת ומדווחת, כדי שהשורות שלא נכנסו לא ייעלמו בשקט
+OUT_OF_ORDER_SQL = """
+    SELECT COUNT(*) FROM temp_prices t
+    JOIN "Fact_Price_Intervals" f ON f.store_id = t.store_id AND f.barcode = t.barcode AND f.valid_to IS NULL
+    WHERE t.sample_date < f.valid_from;
+"""
+
+def bulk_merge(conn, df, temp_table, temp_columns, merge_sql):
+    # COPY FROM STDIN לטבלה זמנית של הסשן (נמחקת לבד ב-COMMIT), ואז פקודת merge אחת.
+    # חייב לרוץ בתוך טרנזקציה פתוחה (engine.begin) כדי שהטבלה תחיה עד ה-merge.
+    names = [name for name, _ in temp_columns]
+    column_defs = ", ".join(f"{name} {sql_type}" for name, sql_type in temp_columns)
+    conn.execute(text(f"CREATE TEMP TABLE {temp_table} ({column_defs}) ON COMMIT DROP"))
+
+    with etl_metrics.stage(f"db.copy:{temp_table}") as m:
+        buf = io.StringIO()
+        df.to_csv(buf, columns=names, index=False, header=False)
+        m["rows"], m["bytes"] = len(df), buf.tell()
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {temp_table} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buf)
+        finally:
+            cursor.close()
+
+    with etl_metrics.stage(f"db.merge:{temp_table}") as m:
+        rowcount = conn.execute(text(merge_sql)).rowcount
+        m["rows"] = rowcount
+    return rowcount
+
+# ==========================================
+# LAST-KNOWN PRICE SNAPSHOTS
+# ==========================================
+# קובץ npy אחד לכל סניף, ממוין לפי ברקוד - נטען עם mmap בלי לקרוא את כולו לזיכרון
+SNAPSHOT_DTYPE = np.dtype([('barcode', 'S24'), ('price', 'f8'), ('updated', 'M8[s]')])
+SNAPSHOT_BARCODE_BYTES = SNAPSHOT_DTYPE['barcode'].itemsize
+
+def _snapshot_path(store_id):
+    return os.path.join(SNAPSHOT_DIR, f"{store_id}.npy")
+
+def _to_snapshot(barcodes, prices, updated):
+    snapshot = np.empty(len(barcodes), dtype=SNAPSHOT_DTYPE)
+    snapshot['barcode'] = pd.Series(barcodes, dtype=object).astype(str).str.encode('utf-8').to_numpy()
+    snapshot['price'] = pd.to_numeric(pd.Series(prices), errors='coerce').to_numpy(dtype='f8')
+    snapshot['updated'] = pd.to_datetime(pd.Series(updated)).to_numpy(dtype='M8[s]')
+    return snapshot
+
+def _latest_per_barcode(snapshot):
+    # ממיין לפי (ברקוד, תאריך) ומשאיר את הרשומה האחרונה לכל ברקוד (במקרה תיקו - האחרונה שנוספה)
+    order = np.lexsort((snapshot['updated'], snapshot['barcode']))
+    snapshot = snapshot[order]
+    is_last = np.ones(len(snapshot), dtype=bool)
+    is_last[:-1] = snapshot['barcode'][1:] != snapshot['barcode'][:-1]
+    return snapshot[is_last]
+
+def _save_npy(path, array):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def save_price_snapshot(store_id, snapshot):
+    _save_npy(_snapshot_path(store_id), np.ascontiguousarray(snapshot, dtype=SNAPSHOT_DTYPE))
+
+def load_price_snapshot(conn, store_id):
+    path = _snapshot_path(store_id)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+
+    # אין snapshot מקומי (למשל runner חדש) - בונים אותו מהמחיר האחרון של כל ברקוד ב-DB
+    print(f"  [INFO] No local price snapshot for {store_id}, rebuilding from the database...")
+    with etl_metrics.stage("db.snapshot_rebuild") as m:
+        latest = _query_latest_prices(conn, store_id)
+        m["rows"] = len(latest)
+    snapshot = _latest_per_barcode(_to_snapshot(latest['barcode'], latest['price'], latest['sample_date']))
+    save_price_snapshot(store_id, snapshot)
+    return snapshot
+
+def _query_latest_prices(conn, store_id):
+    if PRICE_STORAGE == "intervals":
+        latest = pd.read_sql(text("""
+            SELECT barcode, price, valid_from AS sample_date
+            FROM "Fact_Price_Intervals" WHERE store_id = :store_id AND valid_to IS NULL
+        """), conn, params={"store_id": store_id})
+    else:
+        latest = pd.read_sql(text("""
+            SELECT f.barcode, f.price, f.sample_date
+            FROM "Fact_Prices" f
+            JOIN (
+                SELECT barcode, MAX(sample_date) AS sample_date
+                FROM "Fact_Prices" WHERE store_id = :store_id GROUP BY barcode
+            ) latest ON f.barcode = latest.barcode AND f.sample_date = latest.sample_date
+            WHERE f.store_id = :store_id
+        """), conn, params={"store_id": store_id})
+    return latest
+
+def _snapshot_keys(prices):
+    if pd.api.types.is_integer_dtype(prices['barcode']):
+        # ברקודים מספריים: המרה ישירה ממערך int64 למחרוזות בתים (עד 18 ספרות - תמיד נכנס לשדה)
+        keys = prices['barcode'].to_numpy().astype(f'S{SNAPSHOT_BARCODE_BYTES}')
+        too_long = np.zeros(len(keys), dtype=bool)
+    else:
+        barcodes = prices['barcode'].astype(str).str.encode('utf-8')
+        keys = barcodes.to_numpy(dtype=f'S{SNAPSHOT_BARCODE_BYTES}')
+        # ברקוד ארוך מהשדה ב-snapshot נחתך בהשוואה, לכן תמיד נשלח
+        too_long = barcodes.str.len().to_numpy() > SNAPSHOT_BARCODE_BYTES
+    return keys, too_long
+
+def _snapshot_positions(keys, snapshot):
+    # המיקום של כל ברקוד ב-snapshot הממוין, ומסכה של ברקודים שבאמת נמצאו שם
+    pos = np.minimum(np.searchsorted(snapshot['barcode'], keys), len(snapshot) - 1)
+    return pos, snapshot['barcode'][pos] == keys
+
+def last_known_prices(prices, snapshot):
+    # המחיר האחרון הידוע לכל שורה (NaN לברקוד שאין לו מחיר קודם בסניף) - לבדיקת קפיצות המחיר
+    if len(snapshot) == 0:
+        return np.full(len(prices), np.nan)
+    keys, too_long = _snapshot_keys(prices)
+    pos, known = _snapshot_positions(keys, snapshot)
+    return np.where(known & ~too_long, snapshot['price'][pos], np.nan)
+
+def diff_against_snapshot(prices, snapshot):
+    # מסכה וקטורית: True לשורה שהברקוד שלה חדש, או שהמחיר / PriceUpdateDate שלה השתנו
+    if len(snapshot) == 0:
+        return np.ones(len(prices), dtype=bool)
+    keys, too_long = _snapshot_keys(prices)
+    new_price = pd.to_numeric(prices['price'], errors='coerce').to_numpy(dtype='f8')
+    new_date = prices['sample_date'].to_numpy(dtype='M8[s]')
+    pos, known = _snapshot_positions(keys, snapshot)
+    same_price = np.round(new_price * 100) == np.round(snapshot['price'][pos] * 100)
+    same_date = new_date == snapshot['updated'][pos]
+    return ~(known & same_price & same_date) | too_long
+
+def update_price_snapshot(store_id, snapshot, shipped):
+    if len(shipped) == 0 and os.path.exists(_snapshot_path(store_id)):
+        return
+    delta = _to_snapshot(shipped['barcode'], shipped['price'], shipped['sample_date'])
+    save_price_snapshot(store_id, _latest_per_barcode(np.concatenate([np.asarray(snapshot), delta])))
+
+# השורה האחרונה שנפסלה בשער האיכות לכל ברקוד בסניף (קובץ rejected.npy ליד ה-snapshot).
+# שורה שנפסלה בבדיקה קבועה (ברקוד / טווח / תאריך) לא נבדקת ולא נכנסת להסגר שוב כשהיא חוזרת כמו שהיא,
+# וקפיצת מחיר שנפסלה (jump) מאושרת כשאותו מחיר מופיע שוב - בקובץ הבא או ביום הבא
+REJECTED_DTYPE = np.dtype(SNAPSHOT_DTYPE.descr + [('jump', '?')])
+
+def _rejected_path(store_id):
+    return os.path.join(SNAPSHOT_DIR, f"{store_id}.rejected.npy")
+
+def load_rejected_snapshot(store_id):
+    path = _rejected_path(store_id)
+    if os.path.exists(path):
+        return np.load(path)
+    return np.empty(0, dtype=REJECTED_DTYPE)
+
+def match_rejected(prices, rejected_snapshot):
+    # שתי מסכות: כבר בהסגר (אותו ברקוד, מחיר ותאריך שנפסלו בבדיקה קבועה),
+    # וקפיצה מאושרת (אותו ברקוד ומחיר שנפסלו בגלל קפיצה, בכל תאריך)
+    if len(rejected_snapshot) == 0:
+        return np.zeros(len(prices), dtype=bool), np.zeros(len(prices), dtype=bool)
+    keys, too_long = _snapshot_keys(prices)
+    pos, known = _snapshot_positions(keys, rejected_snapshot)
+    new_price = pd.to_numeric(prices['price'], errors='coerce').to_numpy(dtype='f8')
+    same_price = known & ~too_long & (np.round(new_price * 100) == np.round(rejected_snapshot['price'][pos] * 100))
+    same_date = prices['sample_date'].to_numpy(dtype='M8[s]') == rejected_snapshot['updated'][pos]
+    jump = rejected_snapshot['jump'][pos]
+    return same_price & same_date & ~jump, same_price & jump
+
+def update_rejected_snapshot(store_id, rejected_snapshot, rejected, shipped):
+    # ברקוד שמחיר שלו נטען יוצא מהרשימה; השורות שנפסלו עכשיו נכנסות (האחרונה לכל ברקוד)
+    keep = np.ones(len(rejected_snapshot), dtype=bool)
+    if len(shipped) and len(rejected_snapshot):
+        keep = ~np.isin(rejected_snapshot['barcode'], _snapshot_keys(shipped)[0])
+    if keep.all() and rejected is None:
+        return
+    merged = rejected_snapshot[keep]
+    if rejected is not None:
+        delta = np.empty(len(rejected), dtype=REJECTED_DTYPE)
+        fields = _to_snapshot(rejected['barcode'], rejected['price'], rejected['sample_date'])
+        for name in SNAPSHOT_DTYPE.names:
+            delta[name] = fields[name]
+        delta['jump'] = (rejected['reasons'] == 'price_jump').to_numpy()
+        merged = _latest_per_barcode(np.concatenate([merged, delta]))
+    _save_npy(_rejected_path(store_id), np.ascontiguousarray(merged, dtype=REJECTED_DTYPE))
+
+# ==========================================
+# PRODUCT DIMENSION CACHE
+# ==========================================
+class ProductCache:
+    # ברקודים שכבר קיימים ב-Dim_Products. משותף לכל קבצי המחירים בריצה, כך שרק מוצרים
+    # חדשים באמת נשלחים ל-temp_products. ברקוד נכנס למטמון רק אחרי COMMIT מוצלח.
+    def __init__(self, path=PRODUCT_CACHE_PATH, persist=PERSIST_PRODUCT_CACHE):
+        self.path = path
+        self.persist = persist
+        self._known = None
+        self._lock = threading.Lock()
+
+    def _load(self, conn):
+        if self.persist and os.path.exists(self.path):
+            # שימו לב: אם ה-DB נמחק/שוחזר יש למחוק גם את הקובץ, אחרת ה-FK של Fact_Prices ייכשל
+            with open(self.path, encoding='utf-8') as f:
+                self._known = set(f.read().split())
+            print(f"  [INFO] Product cache: {len(self._known)} known barcodes loaded from {self.path}")
+        else:
+            with etl_metrics.stage("db.product_cache_load") as m:
+                self._known = set(conn.execute(text('SELECT barcode FROM "Dim_Products"')).scalars())
+                m["rows"] = len(self._known)
+            print(f"  [INFO] Product cache: {len(self._known)} known barcodes loaded from Dim_Products")
+
+    def filter_new(self, conn, products):
+        with self._lock:
+            if self._known is None: self._load(conn)
+            # ברקודים מספריים (int64) מושווים כמחרוזות, כמו שהם שמורים ב-Dim_Products
+            return products[~products['barcode'].astype(str).isin(self._known)]
+
+    def add(self, barcodes):
+        with self._lock:
+            if self._known is not None: self._known.update(map(str, barcodes))
+
+    def save(self):
+        if not self.persist or self._known is None: return
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(sorted(self._known)))
+            os.replace(tmp_path, self.path)
+
+def load_price_frames(products, prices, store_id, product_cache=None, fname=None, chain_id=CHAIN_ID):
+    snapshot = rejected_snapshot = rejected = None
+    new_products = products.iloc[0:0]
+    quarantined_rows = 0
+    out_of_order_rows = 0
+    with engine.begin() as conn:
+        if PRICE_SNAPSHOTS:
+            snapshot = load_price_snapshot(conn, store_id)
+            # קודם ההשוואה ל-snapshot: שער האיכות בודק רק שורות חדשות / שהשתנו
+            prices = prices[diff_against_snapshot(prices, snapshot)]
+
+        if price_quality.QUALITY_GATE:
+            # שורות פסולות נכנסות ל-Quarantine_Prices באותה טרנזקציה, במקום להפיל את כל הקובץ
+            with etl_metrics.stage("quality_gate") as m:
+                m["rows"] = len(prices)
+                last_prices = None
+                if snapshot is not None:
+                    rejected_snapshot = load_rejected_snapshot(store_id)
+                    already_quarantined, confirmed_jump = match_rejected(prices, rejected_snapshot)
+                    prices = prices[~already_quarantined]
+                    last_prices = last_known_prices(prices, snapshot)
+                    last_prices[confirmed_jump[~already_quarantined]] = np.nan
+                valid, rejected = price_quality.validate_prices(prices, last_prices)
+            if rejected is not None:
+                prices = prices[valid]
+                quarantined_rows = bulk_merge(conn, price_quality.quarantine_frame(rejected, fname, store_id, chain_id),
+                                              'temp_quarantine', QUARANTINE_TEMP_COLUMNS, QUARANTINE_MERGE_SQL)
+            products = price_quality.clip_product_text(products)
+
+        if PRICE_SNAPSHOTS or rejected is not None:
+            # למוצר של מחיר שלא השתנה כבר יש שורה ב-Dim_Products (בגלל ה-FK של Fact_Prices),
+            # ומוצר שכל המחירים שלו נפסלו לא נכנס
+            products = products[products['barcode'].isin(prices['barcode'])]
+
+        inserted_rows = 0
+        if len(prices) > 0:
+            new_products = product_cache.filter_new(conn, products) if product_cache else products
+            if len(new_products) > 0:
+                # סדר קבוע: כמה כותבים (רשתות שרצות במקביל) שמוסיפים את אותם ברקודים לא ינעלו זה את זה ב-deadlock
+                bulk_merge(conn, new_products, 'temp_products', PRODUCTS_TEMP_COLUMNS, """
+                    INSERT INTO "Dim_Products" (barcode, item_name, category, manufacturer)
+                    SELECT barcode, item_name, category, manufacturer FROM temp_products ORDER BY barcode
+                    ON CONFLICT (barcode) DO NOTHING;
+                """)
+            load_prices = prices
+            if PRICE_STORAGE == "intervals":
+                # טווח פתוח אחד לכל ברקוד: אם הברקוד מופיע כמה פעמים בקובץ, נשארת הדגימה האחרונה
+                load_prices = prices.sort_values('sample_date', kind='stable').drop_duplicates('barcode', keep='last')
+            inserted_rows = bulk_merge(conn, load_prices, 'temp_prices', PRICES_TEMP_COLUMNS, PRICES_MERGE_SQL[PRICE_STORAGE])
+            if PRICE_STORAGE == "intervals":
+                out_of_order_rows = conn.execute(text(OUT_OF_ORDER_SQL)).scalar()
+            with etl_metrics.stage("db.merge:latest_prices") as m:
+                m["rows"] = conn.execute(text(LATEST_PRICES_MERGE_SQL)).rowcount
+
+    # ה-snapshot והמטמון מתעדכנים רק אחרי שהטרנזקציה נסגרה בהצלחה
+    if snapshot is not None:
+        update_price_snapshot(store_id, snapshot, prices)
+    if rejected_snapshot is not None:
+        update_rejected_snapshot(store_id, rejected_snapshot, rejected, prices)
+    if product_cache:
+        product_cache.add(new_products['barcode'])
+    # היום המוקדם ביותר שהשורות שהשתנו משנות (PriceUpdateDate יכול להיות ישן מיום הקובץ) - בשביל price_rollups.
+    # בלי snapshot כל שורות הקובץ נשלחות, ואין דרך לדעת אילו מהן השתנו - נשאר רק יום הקובץ
+    first_day = prices['sample_date'].min() if snapshot is not None and len(prices) else None
+    first_day = first_day.date() if pd.notna(first_day) else None
+    return inserted_rows, len(prices), len(new_products), quarantined_rows, out_of_order_rows, first_day
+
+_chunk_queue = None
+
+def _init_parse_worker(chunk_queue=None, host_slots=None):
+    # תהליך-בן לא משתמש במסד הנתונים - רק משחרר את החיבורים שירש מהאב בלי לסגור אותם.
+    # גם חיבורי ה-HTTP של האב לא משותפים: כל תהליך פותח Session משלו.
+    # chunk_queue - התור אל הכותב במצב PRICE_CHUNK_ITEMS (עובר בזמן יצירת התהליך)
+    # host_slots - מגבלות השרתים המשותפות לכל התהליכים (shared_host_slots)
+    global _http_session, _http_session_lock, _host_slots, _host_slots_lock, _shared_host_slots, _chunk_queue
+    engine.dispose(close=False)
+    _http_session = None
+    _http_session_lock = threading.Lock()
+    _host_slots = {}
+    _host_slots_lock = threading.Lock()
+    _shared_host_slots = host_slots
+    _chunk_queue = chunk_queue
+
+# ==========================================
+# JOB QUEUE: SHARDS & CHECKPOINTS
+# ==========================================
+def parse_shard(value):
+    # "2/8" -> (2, 8): הרץ הזה מטפל בחלק השני מתוך שמונה
+    try:
+        index, count = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected K/N (e.g. 2/8)")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', K must be between 1 and N")
+    return index, count
+
+def parse_chain(value):
+    try:
+        return chain_adapters.get_chain(value.strip())
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def store_in_shard(store_num, shard):
+    # חלוקה יציבה: אותו סניף תמיד באותו shard, בלי תלות בסדר שבו הקבצים נמצאו
+    index, count = shard
+    return zlib.crc32(store_num.lstrip('0').encode()) % count == index - 1
+
+class RunCheckpoint:
+    # תור העבודות של הריצה (הקישורים שנמצאו) ואילו עבודות כבר נטענו בהצלחה.
+    # נשמר לדיסק אחרי כל עבודה, ונמחק רק כשהריצה הסתיימה במלואה.
+    # params - פרמטרי הריצה (רשת, היקף, shard, טווח replay); checkpoint של ריצה עם פרמטרים אחרים נזרק
+    def __init__(self, name, params=None):
+        self.path = os.path.join(CHECKPOINT_DIR, f"{name}.json")
+        self.params = params or {}
+        self._lock = threading.Lock()
+        self.links = []
+        self.done = set()
+        self.discovered_at = None
+        self.started_at = None
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("params", {}) != self.params:
+                print(f"[INFO] Ignoring checkpoint {name}: it belongs to a run with different parameters.")
+                return
+            started_at = state.get("started_at") or state.get("discovered_at")
+            if started_at and datetime.now() - datetime.fromisoformat(started_at) > pd.Timedelta(hours=CHECKPOINT_RETENTION_HOURS):
+                print(f"[INFO] Ignoring checkpoint {name}: older than {CHECKPOINT_RETENTION_HOURS:g} hours.")
+                return
+            self.started_at = started_at
+            self.links = [tuple(l) for l in state.get("links", [])]
+            self.done = set(state.get("done", []))
+            self.discovered_at = state.get("discovered_at")
+
+    def fresh_links(self):
+        if not self.links or not self.discovered_at: return None
+        age = datetime.now() - datetime.fromisoformat(self.discovered_at)
+        return self.links if age.total_seconds() < CHECKPOINT_MAX_AGE_MIN * 60 else None
+
+    def set_links(self, links):
+        with self._lock:
+            self.links = [tuple(l) for l in links]
+            self.discovered_at = datetime.now().isoformat(timespec='seconds')
+            self.started_at = self.started_at or self.discovered_at
+            self._save()
+
+    def is_done(self, fname):
+        with self._lock:
+            return fname in self.done
+
+    def mark_done(self, fname):
+        with self._lock:
+            self.done.add(fname)
+            self._save()
+
+    def clear(self):
+        if os.path.exists(self.path): os.remove(self.path)
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"params": self.params, "started_at": self.started_at, "discovered_at": self.discovered_at,
+                       "links": self.links, "done": sorted(self.done)}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+# ==========================================
+# PRICE PIPELINE EXECUTOR
+# ==========================================
+def _price_writer(load_queue, manifest, product_cache, stats, timings, errors, on_done, touched):
+    with etl_metrics.profile_thread():
+        _price_writer_loop(load_queue, manifest, product_cache, stats, timings, errors, on_done, touched)
+
+def _price_writer_loop(load_queue, manifest, product_cache, stats, timings, errors, on_done, touched):
+    # כותב DB יחיד: צורך קבצים מפוענחים (או מנות של קובץ, במצב chunks) מהתור לפי סדר ההגעה.
+    # touched מקבל (סניף, יום) בשביל price_rollups: יום הקובץ לכל קובץ שנטען (גם בלי שינויים, כדי שלכל יום
+    # שעובד יהיה סיכום), ויום ה-sample_date המוקדם של השורות שנשלחו - ממנו הסיכומים הקיימים מחושבים מחדש
+    file_totals = {}
+    while True:
+        parsed = load_queue.get()
+        if parsed is None: return
+        if errors: continue  # אחרי כשל ממשיכים לרוקן את התור כדי שהשלבים הקודמים לא ייתקעו
+        fname = parsed["fname"]
+        totals = file_totals.setdefault(fname, {"scanned": 0, "shipped": 0, "inserted": 0, "new_products": 0, "quarantined": 0,
+                                                "out_of_order": 0})
+        if "prices" in parsed:
+            try:
+                t0 = time.perf_counter()
+                inserted_rows, shipped_rows, new_products, quarantined_rows, out_of_order_rows, first_day = load_price_frames(
+                    parsed["products"], parsed["prices"], parsed["store_id"], product_cache, fname, parsed["chain_id"])
+                load_seconds = time.perf_counter() - t0
+                timings["load_seconds"] += load_seconds
+                etl_metrics.record("load", load_seconds, shipped_rows, fname=fname, inserted=inserted_rows,
+                                   out_of_order=out_of_order_rows)
+            except Exception as e:
+                errors.append(e)
+                continue
+            totals["scanned"] += len(parsed["prices"])
+            totals["shipped"] += shipped_rows
+            totals["inserted"] += inserted_rows
+            totals["new_products"] += new_products
+            totals["quarantined"] += quarantined_rows
+            totals["out_of_order"] += out_of_order_rows
+            touched.add((parsed["store_id"], (fname_time(fname) or datetime.now()).date()))
+            if first_day:
+                touched.add((parsed["store_id"], first_day))
+
+        # קובץ נסגר רק אחרי המנה האחרונה שלו (קובץ שלם הוא מנה אחת שהיא גם האחרונה)
+        if not parsed.get("last", True): continue
+        del file_totals[fname]
+        manifest.mark_processed(fname, parsed["source"])
+        on_done(fname)
+        stats["total_prices_scanned"] += totals["scanned"]
+        stats["total_prices_shipped"] += totals["shipped"]
+        stats["new_products"] += totals["new_products"]
+        stats["total_prices_inserted"] += totals["inserted"]
+        stats["quarantined_rows"] += totals["quarantined"]
+        stats["out_of_order_rows"] += totals["out_of_order"]
+        print(f"  [SUCCESS] Store {parsed['store_num']}: {totals['inserted']} NEW prices inserted out of {totals['scanned']} scanned ({totals['shipped']} changed rows sent).")
+        if totals["quarantined"]:
+            print(f"  [WARNING] Store {parsed['store_num']}: {totals['quarantined']} rows failed validation and were quarantined.")
+        if totals["out_of_order"]:
+            print(f"  [WARNING] Store {parsed['store_num']}: {totals['out_of_order']} samples are older than the current price interval and were not loaded.")
+
+def record_parse_metrics(parsed, parse_stage="parse"):
+    # רשומות של תהליך הפענוח (במצב stream ההורדה והפענוח הם שלב אחד - "download+parse")
+    if "prices" not in parsed and not parsed.get("chunks"): return
+    rows = len(parsed["prices"]) if "prices" in parsed else parsed["rows"]
+    etl_metrics.record(parse_stage, parsed["parse_seconds"], rows, parsed.get("bytes"),
+                       peak_rss=parsed["peak_rss_mb"], fname=parsed["fname"])
+    etl_metrics.record("transform", parsed["transform_seconds"], rows,
+                       peak_rss=parsed["peak_rss_mb"], fname=parsed["fname"])
+
+def local_source_info(local_path):
+    # קובץ מהארכיון המקומי (replay) - אין כותרות HTTP
+    return {"etag": None, "last_modified": None, "size": os.path.getsize(local_path), "sha256": None, "skipped": None}
+
+def run_price_pipeline(price_links, manifest, product_cache, stats, timings, checkpoint=None, deadline=None,
+                       ordered=False, replay=False, touched=None, chain=DEFAULT_CHAIN, parse_pool=None):
+    # ordered: הקבצים נכתבים ל-DB בדיוק לפי סדר price_links (למשל מהישן לחדש), גם כשהפענוח שלהם
+    # מסתיים בסדר אחר - כל קובץ ממתין במאגר עד שכל מה שלפניו נכתב (או דולג).
+    # replay: ה-"url" של כל קובץ הוא נתיב מקומי, בלי הורדה.
+    # parse_pool: מאגר תהליכים משותף לכמה רשתות שרצות במקביל (multi_chain_etl) - לא נסגר כאן
+    timings.update({"download_seconds": 0.0, "parse_seconds": 0.0, "load_seconds": 0.0})
+    t0 = time.perf_counter()
+    streaming = INGEST_MODE == "stream" and not replay
+
+    def on_done(fname):
+        if checkpoint: checkpoint.mark_done(fname)
+
+    # במצב chunks תהליכי הפענוח כותבים ישירות לתור, לכן זה תור בין-תהליכי (עדיין חסום).
+    # מנות עוקפות את סדר הקבצים, לכן בריצה מסודרת כל קובץ נשלח שלם. תור המנות נקבע כשהתהליכים עולים,
+    # לכן מאגר משותף עובד רק עם קבצים שלמים
+    own_pool = parse_pool is None
+    chunked = bool(PRICE_CHUNK_ITEMS) and not ordered and own_pool
+    load_queue = multiprocessing.Queue(maxsize=LOAD_QUEUE_SIZE) if chunked else queue.Queue(maxsize=LOAD_QUEUE_SIZE)
+    errors = []
+    if touched is None: touched = set()
+    writer = threading.Thread(target=_price_writer, daemon=True,
+                              args=(load_queue, manifest, product_cache, stats, timings, errors, on_done, touched))
+    writer.start()
+
+    download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+    if own_pool:
+        parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, initializer=_init_parse_worker,
+                                         initargs=(load_queue if chunked else None, shared_host_slots(PARSE_WORKERS, streaming)))
+    stage_of = {}
+    sources = {}
+    known_headers = manifest.header_keys()
+    # העבודות נכנסות לביצוע בהדרגה, כך שגם מאות קבצים (מצב כל הסניפים) לא מציפים את המאגרים
+    jobs = collections.deque(price_links)
+    max_in_flight = DOWNLOAD_WORKERS + PARSE_WORKERS
+    seq_of = {fname: i for i, (fname, _) in enumerate(price_links)}
+    reorder = {}
+    next_seq = 0
+
+    def emit(fname, parsed):
+        # parsed=None - הקובץ דולג, אבל עדיין תופס את מקומו בסדר
+        nonlocal next_seq
+        if not ordered:
+            if parsed is not None: load_queue.put(parsed)
+            return
+        reorder[seq_of[fname]] = parsed
+        while next_seq in reorder:
+            ready = reorder.pop(next_seq)
+            next_seq += 1
+            # תור חסום: אם הכותב מפגר, הפענוח ממתין במקום לצבור קבצים בזיכרון
+            if ready is not None: load_queue.put(ready)
+
+    def submit_jobs():
+        # קבצים שממתינים במאגר הסדר נספרים כ"בדרך", כך שקובץ איטי אחד לא גורם לצבירה בלי גבול
+        while jobs and len(stage_of) + len(reorder) < max_in_flight:
+            if deadline and time.monotonic() > deadline:
+                print(f"[WARNING] Time budget exhausted: {len(jobs)} price files deferred to the next run.")
+                stats["deferred_files"] += len(jobs)
+                jobs.clear()
+                return
+            fname, url = jobs.popleft()
+            if manifest.is_processed(fname):
+                print(f"  [SKIP] {fname}: already processed")
+                stats["skipped_files"] += 1
+                on_done(fname)
+                emit(fname, None)
+                continue
+            local_path = os.path.join(PRICES_DIR, fname + ".gz")
+            if replay:
+                source = local_source_info(url)
+                if chunked:
+                    stage_of[parse_pool.submit(parse_price_file, url, fname, source, chain)] = ("parse", fname)
+                else:
+                    sources[fname] = source
+                    stage_of[parse_pool.submit(parse_price_file, url, fname, None, chain)] = ("parse", fname)
+            elif streaming:
+                # הורדה ופענוח מתמזגים לשלב אחד שרץ בתהליך הפענוח
+                tee_path = local_path if KEEP_RAW_FILES else None
+                stage_of[parse_pool.submit(stream_price_file, url, fname, tee_path, known_headers, chain)] = ("parse", fname)
+            else:
+                stage_of[download_pool.submit(download_file, url, local_path, known_headers)] = ("download", fname)
+
+    try:
+        submit_jobs()
+        while stage_of and not errors:
+            done, _ = wait(stage_of, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, fname = stage_of.pop(future)
+                if stage == "download":
+                    source = future.result()
+                    timings["download_seconds"] += source["seconds"]
+                    etl_metrics.record("download", source["seconds"], nbytes=source["size"],
+                                       peak_rss=source["peak_rss_mb"], fname=fname)
+                    if skip_if_duplicate(manifest, fname, source, stats):
+                        on_done(fname)
+                        emit(fname, None)
+                        continue
+                    print(f"\n[STEP] Downloaded Prices: {fname} ({source['seconds']:.1f}s)")
+                    if chunked:
+                        # המקור נשלח עם סמן סוף-הקובץ של המפענח
+                        stage_of[parse_pool.submit(parse_price_file, source["local_path"], fname, source, chain)] = ("parse", fname)
+                        continue
+                    sources[fname] = source
+                    stage_of[parse_pool.submit(parse_price_file, source["local_path"], fname, None, chain)] = ("parse", fname)
+                else:
+                    parsed = future.result()
+                    timings["parse_seconds"] += parsed["seconds"]
+                    record_parse_metrics(parsed, "download+parse" if streaming else "parse")
+                    if "chunks" in parsed:
+                        # המנות כבר בדרך לכותב; רק קובץ שדולג לפי הכותרות לא נשלח בכלל
+                        if parsed["chunks"] == 0:
+                            skip_if_duplicate(manifest, fname, parsed["source"], stats)
+                            on_done(fname)
+                        else:
+                            print(f"[STEP] Parsed Prices: {fname} ({parsed['rows']} items in {parsed['chunks']} chunks, {parsed['seconds']:.1f}s)")
+                        continue
+                    if "source" in parsed:
+                        if skip_if_duplicate(manifest, fname, parsed["source"], stats):
+                            on_done(fname)
+                            emit(fname, None)
+                            continue
+                    else:
+                        parsed["source"] = sources.pop(fname)
+                    print(f"[STEP] Parsed Prices: {fname} ({len(parsed['prices'])} items, {parsed['seconds']:.1f}s)")
+                    emit(fname, parsed)
+            submit_jobs()
+    finally:
+        for future in stage_of: future.cancel()
+        download_pool.shutdown(wait=True, cancel_futures=True)
+        if own_pool:
+            parse_pool.shutdown(wait=True, cancel_futures=True)
+            stop_shared_host_slots()
+        load_queue.put(None)
+        writer.join()
+        timings["seconds"] = time.perf_counter() - t0
+
+    if errors: raise errors[0]
+
+# ==========================================
+# SHARED RUN (multi_chain_etl)
+# ==========================================
+class SharedRun:
+    # מה שכמה רשתות שרצות במקביל באותו תהליך חולקות: מאגר תהליכי הפענוח, מטמון המוצרים, המניפסט והמדדים.
+    # הסיכומים היומיים, רישום הריצה והדוח במייל נעשים פעם אחת בסוף, על האיחוד של כל הרשתות.
+    def __init__(self, parse_pool, product_cache, manifest, metrics):
+        self.parse_pool = parse_pool
+        self.product_cache = product_cache
+        self.manifest = manifest
+        self.metrics = metrics
+        self.touched = set()
+        self._lock = threading.Lock()
+
+    def add_touched(self, touched):
+        with self._lock:
+            self.touched.update(touched)
+
+def ensure_partitions(conn):
+    # Fact_Prices מחולקת לחודשים (sql_scripts/migrate.py) - מחיצות לחודש הנוכחי ולחודשיים הבאים.
+    # עד ההמרה הידנית (migrate.py --partition-fact-prices) היא טבלה רגילה, ואין מחיצות ליצור
+    if conn.execute(text("""
+        SELECT to_regproc('ensure_fact_prices_partitions') IS NOT NULL
+           AND (SELECT relkind FROM pg_class WHERE oid = to_regclass('"Fact_Prices"')) = 'p'
+    """)).scalar():
+        conn.execute(text("SELECT ensure_fact_prices_partitions(CAST(now() AS date))"))
+
+def run_full_etl(all_stores=False, shard=(1, 1), delta=False, replay=None, chain=DEFAULT_CHAIN, shared=None):
+    # replay: (since, until) - עיבוד מחדש של הקבצים המקומיים בטווח התאריכים, בלי רשת (None בכל צד = בלי גבול)
+    # shared: ריצה אחת מתוך כמה רשתות במקביל (SharedRun) - מחזירה (stats, דוח) במקום לשלוח מייל
     print("======================================")
-    print("[START] Starting STREAMING ETL for Shufersal...")
+    print(f"[START] Starting STREAMING ETL for {chain.label}...")
     print("======================================")
     
     start_time = datetime.now()
-    stats = {"stores_files": 0, "price_files": 0, "total_prices_scanned": 0, "total_prices_inserted": 0}
+    run_t0 = time.perf_counter()
+    metrics = shared.metrics if shared else etl_metrics.start_run()
+    deadline = time.monotonic() + ETL_TIME_BUDGET_MIN * 60 if ETL_TIME_BUDGET_MIN else None
+    stats = {"stores_files": 0, "price_files": 0, "skipped_files": 0, "deferred_files": 0, "total_prices_scanned": 0, "total_prices_shipped": 0, "total_prices_inserted": 0, "new_products": 0, "quarantined_rows": 0, "out_of_order_rows": 0}
 
-    with engine.begin() as conn:
-        conn.execute(text(f"""
+    mode = "replay" if replay else "delta" if delta else None
+    scope = (f"{mode}-" if mode else "") + ("all-stores" if all_stores else "watchlist")
+    scope_label = f"{f'{mode}, ' if mode else ''}{'all stores' if all_stores else 'watchlist'}, shard {shard[0]}/{shard[1]}"
+    print(f"[INFO] Scope: {scope_label}")
+
+    with engine.begin() as conn, etl_metrics.stage("db.insert:Dim_Chains", chain=chain.key):
+        conn.execute(text("""
             INSERT INTO "Dim_Chains" (chain_id, chain_name) 
-            VALUES ('{CHAIN_ID}', '{CHAIN_NAME}') 
+            VALUES (:chain_id, :chain_name) 
             ON CONFLICT (chain_id) DO NOTHING;
-        """))
+        """), {"chain_id": chain.chain_id, "chain_name": chain.chain_name})
+        # בריצה משותפת המחיצות נוצרות פעם אחת לפני שהרשתות מתחילות
+        if not shared: ensure_partitions(conn)
 
-    all_links = get_download_links()
+    # טווח ה-replay הוא חלק מהמפתח: replay של טווח אחר (או ריצה רגילה) לא ממשיך מה-checkpoint שלו
+    replay_range = "_".join(f"{d:%Y%m%d}" if d else "open" for d in replay) if replay else None
+    checkpoint_params = {"chain": chain.key, "scope": scope, "shard": list(shard), "replay": replay_range}
+    # בלי תאריך במפתח: ריצה שנקטעה לפני חצות ממשיכה גם כשהריצה הבאה מתחילה למחרת
+    checkpoint = RunCheckpoint(f"{chain.key}_{scope}{f'-{replay_range}' if replay else ''}_{shard[0]}of{shard[1]}",
+                               checkpoint_params)
+    # ב-replay כל קובץ מעובד מחדש, גם אם כבר מופיע במניפסט
+    if replay:
+        manifest = FileManifest(skip_processed=False)
+    else:
+        manifest = shared.manifest if shared else FileManifest()
+    timings = {}
+    all_links = checkpoint.fresh_links()
+    if checkpoint.done:
+        print(f"[INFO] Resuming from checkpoint: {len(checkpoint.done)} jobs already done"
+              f"{'' if all_links is not None else ' (download links expired, rediscovering)'}.")
+    if all_links is not None:
+        timings.update({"mode": "checkpoint", "pages": 0, "fetch_seconds": 0.0, "parse_seconds": 0.0, "seconds": 0.0})
+    else:
+        stores = None if all_stores else [s for s in chain.watchlist_stores if store_in_shard(s, shard)]
+        if replay:
+            timings.update({"mode": "replay", "pages": 0, "fetch_seconds": 0.0, "parse_seconds": 0.0, "seconds": 0.0})
+            all_links = replay_links(*replay, stores=stores, chain=chain)
+        else:
+            all_links = get_download_links(timings, stores, delta, manifest.is_processed, chain)
+        checkpoint.set_links(all_links)
     
+    # כל shard מעבד את קובץ הסניפים (upsert אידמפוטנטי), כדי שה-FK של Fact_Prices לא יחכה ל-shard אחר
     stores_links = [l for l in all_links if "Stores" in l[0]]
-    price_links = [l for l in all_links if "PriceFull" in l[0]]
+    if replay:
+        # כבר ממוינים לפי זמן הקובץ (PriceFull ו-Price יחד), כמו שהיו נטענים בזמנם
+        price_links = [l for l in all_links if "Stores" not in l[0] and store_in_shard(store_num_from_fname(l[0]), shard)]
+    elif delta:
+        # קבצי delta מוחלים מהישן לחדש, כדי שכל אחד יושווה מול המחיר שקדם לו
+        price_links = sorted((l for l in all_links if chain.delta_re.search(l[0]) and store_in_shard(store_num_from_fname(l[0]), shard)),
+                             key=lambda l: fname_time(l[0]) or datetime.min)
+    else:
+        price_links = [l for l in all_links if "PriceFull" in l[0] and store_in_shard(store_num_from_fname(l[0]), shard)]
     
-    print(f"[INFO] Found {len(stores_links)} store files and {len(price_links)} price files.")
+    print(f"[INFO] Found {len(stores_links)} store files and {len(price_links)} {'delta ' if delta else ''}price files.")
     stats["stores_files"] = len(stores_links)
     stats["price_files"] = len(price_links)
 
     # --- שלב א: קבצי סניפים ---
     for fname, url in stores_links:
         print(f"\n[STEP] Processing Stores: {fname}")
+        if checkpoint.is_done(fname) or manifest.is_processed(fname):
+            print(f"  [SKIP] {fname}: already processed")
+            stats["skipped_files"] += 1
+            continue
         local_path = os.path.join(STORES_DIR, fname + ".gz")
-        resp = requests.get(url)
-        with open(local_path, 'wb') as f: f.write(resp.content)
-        
-        df = fast_parse_xml(local_path, 'STORE')
-        df.columns = [c.upper() for c in df.columns]
-        df = df.rename(columns={'STOREID': 'StoreId', 'STORENAME': 'StoreName', 'CITY': 'City'})
-        df['City'] = df['City'].apply(normalize_city_name)
+        if replay:
+            source = local_source_info(url)
+            with etl_metrics.stage("parse", fname=fname) as m:
+                df = fast_parse_xml(url, chain.stores_item_tag)
+                m["rows"], m["bytes"] = len(df), source["size"]
+        elif INGEST_MODE == "stream":
+            with etl_metrics.stage("download+parse", fname=fname) as m:
+                df, source = stream_parse_xml(url, chain.stores_item_tag, local_path if KEEP_RAW_FILES else None,
+                                              known_headers=manifest.header_keys())
+                m["rows"], m["bytes"] = (len(df) if df is not None else None), source["size"]
+        else:
+            source = download_file(url, local_path, manifest.header_keys())
+            etl_metrics.record("download", source["seconds"], nbytes=source["size"], fname=fname)
+            df = None
+            if not source["skipped"]:
+                with etl_metrics.stage("parse", fname=fname) as m:
+                    df = fast_parse_xml(local_path, chain.stores_item_tag)
+                    m["rows"], m["bytes"] = len(df), source["size"]
+        if skip_if_duplicate(manifest, fname, source, stats):
+            checkpoint.mark_done(fname)
+            continue
+        with etl_metrics.stage("transform", fname=fname) as m:
+            df.columns = [c.upper() for c in df.columns]
+            df = df.rename(columns=chain.store_columns)
+            df['City'] = normalize_city_column(df['City'])
+            m["rows"] = len(df)
         
         with engine.begin() as conn:
-            cities = df[['City']].drop_duplicates().rename(columns={'City': 'city_name'})
-            cities['region'] = cities['city_name'].map(lambda x: REGION_MAPPING.get(x, 'לא מוגדר'))
+            # ממוין - שתי רשתות שמעדכנות את אותן ערים במקביל נועלות אותן באותו סדר
+            cities = df[['City']].drop_duplicates().sort_values('City').rename(columns={'City': 'city_name'})
+            cities['region'] = cities['city_name'].map(REGION_MAPPING).fillna('לא מוגדר')
             
-            for idx, row in cities.iterrows():
-                conn.execute(text('INSERT INTO "Dim_City" (city_name, region) VALUES (:city_name, :region) ON CONFLICT (city_name) DO UPDATE SET region = EXCLUDED.region'), row.to_dict())
+            with etl_metrics.stage("db.upsert:Dim_City") as m:
+                conn.execute(text('INSERT INTO "Dim_City" (city_name, region) VALUES (:city_name, :region) ON CONFLICT (city_name) DO UPDATE SET region = EXCLUDED.region'), cities.to_dict('records'))
+                m["rows"] = len(cities)
             
-            df['store_id'] = CHAIN_ID + "-" + df['StoreId'].astype(str).str.zfill(3)
-            df['chain_id'] = CHAIN_ID
+            df['store_id'] = chain.chain_id + "-" + df['StoreId'].astype(str).str.zfill(3)
+            df['chain_id'] = chain.chain_id
             stores_to_db = df[['store_id', 'chain_id', 'StoreName', 'City']].rename(columns={'StoreName': 'store_name', 'City': 'city'})
             
-            stores_to_db.to_sql('temp_stores', conn, if_exists='replace', index=False)
-            conn.execute(text("""
+            bulk_merge(conn, stores_to_db, 'temp_stores', STORES_TEMP_COLUMNS, """
                 INSERT INTO "Dim_Stores" (store_id, chain_id, store_name, city)
                 SELECT store_id, chain_id, store_name, city FROM temp_stores
                 ON CONFLICT (store_id) DO UPDATE SET store_name = EXCLUDED.store_name, city = EXCLUDED.city;
-            """))
-            conn.execute(text("DROP TABLE temp_stores;"))
+            """)
             
+        manifest.mark_processed(fname, source)
+        checkpoint.mark_done(fname)
         print(f"  [SUCCESS] Dim_Stores and Dim_City updated.")
 
-    # --- שלב ב: קבצי מחירים ---
-    for fname, url in price_links:
-        print(f"\n[STEP] Processing Prices: {fname}")
-        local_path = os.path.join(PRICES_DIR, fname + ".gz")
-        resp = requests.get(url)
-        with open(local_path, 'wb') as f: f.write(resp.content)
-        
-        df = fast_parse_xml(local_path, 'Item')
-        
-        # =====================================================================
-        # תיקון דינאמי של שמות העמודות (Schema Drift Handler)
-        # =====================================================================
-        # 1. טיפול ביצרן: הופך את ManufactureName ל-ManufacturerName
-        if 'ManufacturerName' not in df.columns:
-            if 'ManufactureName' in df.columns:
-                df = df.rename(columns={'ManufactureName': 'ManufacturerName'})
-            else:
-                df['ManufacturerName'] = 'לא ידוע'
+    # --- שלב ב: קבצי מחירים (הורדה -> פענוח -> טעינה במקביל) ---
+    remaining_links = [l for l in price_links if not checkpoint.is_done(l[0])]
+    if len(remaining_links) < len(price_links):
+        print(f"\n[INFO] Checkpoint: skipping {len(price_links) - len(remaining_links)} price files finished by a previous attempt.")
+        stats["skipped_files"] += len(price_links) - len(remaining_links)
+    print(f"\n[INFO] Price pipeline ({INGEST_MODE} ingest): {DOWNLOAD_WORKERS} downloaders, {PARSE_WORKERS} parsers{' (shared)' if shared else ''}, 1 DB writer.")
+    pipeline_timings = {}
+    product_cache = shared.product_cache if shared else ProductCache()
+    touched = set()
+    try:
+        run_price_pipeline(remaining_links, manifest, product_cache, stats, pipeline_timings, checkpoint, deadline,
+                           ordered=bool(delta or replay), replay=bool(replay), touched=touched, chain=chain,
+                           parse_pool=shared.parse_pool if shared else None)
+    finally:
+        if shared:
+            shared.add_touched(touched)
+        else:
+            product_cache.save()
 
-        # 2. טיפול בתאריך: הופך את PriceUpdateTime ל-PriceUpdateDate
-        if 'PriceUpdateDate' not in df.columns:
-            if 'PriceUpdateTime' in df.columns:
-                df = df.rename(columns={'PriceUpdateTime': 'PriceUpdateDate'})
-            else:
-                df['PriceUpdateDate'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                
-        # 3. גיבוי לעמודות חסרות נוספות כדי למנוע קריסה
-        if 'ItemName' not in df.columns: df['ItemName'] = 'לא ידוע'
-        if 'ItemPrice' not in df.columns: df['ItemPrice'] = 0.0
-        # =====================================================================
-
-        products = df[['ItemCode', 'ItemName', 'ManufacturerName']].drop_duplicates(subset=['ItemCode']).copy()
-        products = products.rename(columns={'ItemCode': 'barcode', 'ItemName': 'item_name', 'ManufacturerName': 'manufacturer'})
-        products['category'] = 'כללי'
-        
-        prices = df[['ItemCode', 'PriceUpdateDate', 'ItemPrice']].copy()
-        prices = prices.rename(columns={'ItemCode': 'barcode', 'PriceUpdateDate': 'sample_date', 'ItemPrice': 'price'})
-        prices['chain_id'] = CHAIN_ID
-        store_num = fname.split('-')[1].split('_')[0] if '-' in fname else "001"
-        prices['store_id'] = f"{CHAIN_ID}-{store_num}"
-        prices['sample_date'] = pd.to_datetime(prices['sample_date'])
+    # ריצה שלמה מוחקת את ה-checkpoint; ריצה חלקית משאירה אותו כדי שהבאה תמשיך ממנו
+    if stats["deferred_files"] == 0:
+        checkpoint.clear()
+
+    if shared:
+        # הסיכומים, ה-view והמייל - פעם אחת לכל הרשתות (multi_chain_etl); כאן רק רישום הריצה של הרשת
+        with engine.begin() as conn:
+            basket_query.record_run(conn, f"{metrics.run_id}_{chain.key}", chain.chain_id, stats)
+        duration = round((datetime.now() - start_time).total_seconds() / 60, 2)
+        report = (f"{chain.label}: {stats['price_files']} price files, {stats['skipped_files']} skipped, "
+                  f"{stats['deferred_files']} deferred, {stats['total_prices_inserted']} prices inserted, "
+                  f"{stats['new_products']} new products, {stats['quarantined_rows']} quarantined, "
+                  f"{stats['out_of_order_rows']} out-of-order "
+                  f"(discovery {timings['mode']} {timings['seconds']:.1f}s, pipeline {pipeline_timings['seconds']:.1f}s, "
+                  f"total {duration} min)")
+        print(f"[DONE] {report}")
+        return stats, report
 
-        stats["total_prices_scanned"] += len(prices)
+    # סיכומים יומיים לדשבורדים: רק הסניפים והימים שהשתנו בריצה הזו (ועריהם)
+    rollup_days = (0, 0)
+    try:
+        with engine.begin() as conn, etl_metrics.stage("db.rollups") as m:
+            rollup_days = price_rollups.refresh_rollups(conn, touched, PRICE_STORAGE)
+            m["rows"] = rollup_days[0]
+    except Exception as e:
+        print(f"[WARNING] Could not update price rollups: {e}")
 
-        print(f"  [DB] Injecting to Supabase (filtering duplicates)...")
+    # רישום הריצה - מבטל את המטמון של basket_query (Latest_Prices כבר עודכנה עם כל טעינה)
+    try:
         with engine.begin() as conn:
-            products.to_sql('temp_products', conn, if_exists='replace', index=False)
-            conn.execute(text("""
-                INSERT INTO "Dim_Products" (barcode, item_name, category, manufacturer)
-                SELECT barcode, item_name, category, manufacturer FROM temp_products
-                ON CONFLICT (barcode) DO NOTHING;
-            """))
-            conn.execute(text("DROP TABLE temp_products;"))
-            
-            prices.to_sql('temp_prices', conn, if_exists='replace', index=False)
-            result = conn.execute(text("""
-                INSERT INTO "Fact_Prices" (store_id, barcode, price, sample_date, chain_id)
-                SELECT store_id, barcode, CAST(price AS NUMERIC), CAST(sample_date AS TIMESTAMP), chain_id FROM temp_prices
-                ON CONFLICT (store_id, barcode, sample_date) DO NOTHING;
-            """))
-            conn.execute(text("DROP TABLE temp_prices;"))
-            
-            inserted_rows = result.rowcount
-            stats["total_prices_inserted"] += inserted_rows
-            print(f"  [SUCCESS] Store {store_num}: {inserted_rows} NEW prices inserted out of {len(prices)} scanned.")
+            basket_query.record_run(conn, metrics.run_id, chain.chain_id, stats)
+    except Exception as e:
+        print(f"[WARNING] Could not record the run in ETL_Runs: {e}")
 
     end_time = datetime.now()
     duration = round((end_time - start_time).total_seconds() / 60, 2)
     
     try:
-        with engine.connect() as conn:
+        with engine.connect() as conn, etl_metrics.stage("db.size_query"):
             size_bytes = conn.execute(text("SELECT pg_database_size(current_database());")).scalar()
             db_size_gb = size_bytes / (1024 ** 3)
     except Exception as e:
         print(f"[WARNING] Could not get DB size: {e}")
         db_size_gb = 0.0
     
+    etl_metrics.record("run", time.perf_counter() - run_t0, stats["total_prices_scanned"],
+                       scope=scope_label, deferred_files=stats["deferred_files"])
+
+    partial = stats["deferred_files"] > 0
     print("\n======================================")
-    print(f"[DONE] 🎉 All data processed successfully in {duration} minutes!")
+    if partial:
+        print(f"[DONE] ⏸️ Partial run in {duration} minutes, {stats['deferred_files']} price files deferred to the next run.")
+    else:
+        print(f"[DONE] 🎉 All data processed successfully in {duration} minutes!")
     print("======================================")
     
-    report_body = f"""Shufersal Data Pipeline - SUCCESS 🟢
+    report_body = f"""{chain.label} Data Pipeline - {'PARTIAL 🟡' if partial else 'SUCCESS 🟢'}
 
+Scope: {scope_label}
+Price Storage: {PRICE_STORAGE}
 Run Time: {duration} minutes
 Store Files Processed: {stats['stores_files']}
 Price Files Processed: {stats['price_files']}
+Unchanged Files Skipped: {stats['skipped_files']}
+Deferred To Next Run: {stats['deferred_files']}
+Rollups Refreshed: {rollup_days[0]} store-days, {rollup_days[1]} city-days
 
+⏱️ Timing Breakdown:
+- Discovery ({timings['mode']}): {timings['seconds']:.1f}s over {timings['pages']} pages (fetch {timings['fetch_seconds']:.1f}s, parse {timings['parse_seconds']:.1f}s)
+- Price Pipeline: {pipeline_timings['seconds']:.1f}s wall (download {pipeline_timings['download_seconds']:.1f}s, parse {pipeline_timings['parse_seconds']:.1f}s, load {pipeline_timings['load_seconds']:.1f}s)
+
+📈 Stage Metrics (run {metrics.run_id}, sec = summed per stage):
+{metrics.summary_table()}
 📊 Data Metrics:
 - Total Prices Scanned: {stats['total_prices_scanned']}
+- Changed Prices Sent: {stats['total_prices_shipped']}
 - NEW Prices Inserted: {stats['total_prices_inserted']}
+- NEW Products Added: {stats['new_products']}
+- Rows Quarantined: {stats['quarantined_rows']}
+- Out-of-Order Samples Not Loaded: {stats['out_of_order_rows']}
 
 💾 Database Storage (Supabase):
 - Current Size: {db_size_gb:.3f} GB
@@ -345,14 +2119,40 @@ Price Files Processed: {stats['price_files']}
 
 Your Supermarket DSS is up to date! 🚀
 """
-    send_email_report("🟢 ETL Success: Shufersal", report_body)
+    if partial:
+        send_email_report(f"🟡 ETL Partial: {chain.label} ({scope_label})", report_body)
+    elif delta and not DELTA_SUCCESS_EMAIL:
+        # ריצת delta שעתית - דוח הצלחה רק ללוג, כדי לא להציף את תיבת הדואר (כשל עדיין נשלח במייל)
+        print(report_body)
+    else:
+        send_email_report(f"🟢 ETL Success: {chain.label}", report_body)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Shufersal prices ETL")
+    parser.add_argument("--all-stores", action="store_true", default=os.environ.get("ETL_ALL_STORES") == "1",
+                        help="ingest every Shufersal branch instead of WATCHLIST_STORES")
+    parser.add_argument("--shard", type=parse_shard, default=os.environ.get("ETL_SHARD", "1/1"),
+                        help="K/N - process only the K-th of N store shards (e.g. 2/8)")
+    parser.add_argument("--delta", action="store_true", default=os.environ.get("ETL_DELTA") == "1",
+                        help="ingest only the incremental Price files published since the last processed one")
+    parser.add_argument("--replay", action="store_true", default=os.environ.get("ETL_REPLAY") == "1",
+                        help="re-process the local .gz archive (stores / prices dirs) without network access")
+    parser.add_argument("--since", type=date.fromisoformat, help="replay: first file date (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="replay: last file date (YYYY-MM-DD)")
+    parser.add_argument("--chain", type=parse_chain, default=os.environ.get("ETL_CHAIN", DEFAULT_CHAIN.key),
+                        help=f"chain to ingest (registered: {', '.join(sorted(chain_adapters.CHAINS))}; more via ETL_CHAINS_CONFIG)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
+    args = parse_args()
+    register_host_limits(args.chain)
     try:
-        run_full_etl()
+        with etl_metrics.profiled():
+            run_full_etl(all_stores=args.all_stores, shard=args.shard, delta=args.delta,
+                         replay=(args.since, args.until) if args.replay else None, chain=args.chain)
     except Exception as e:
         error_tb = traceback.format_exc()
         print(f"\n[CRITICAL ERROR] Pipeline failed:\n{error_tb}")
-        error_body = f"Shufersal Data Pipeline - FAILED 🔴\n\nError details:\n{error_tb}"
-        send_email_report("🔴 ETL FAILED: Shufersal", error_body)
+        error_body = f"{args.chain.label} Data Pipeline - FAILED 🔴\n\nError details:\n{error_tb}"
+        send_email_report(f"🔴 ETL FAILED: {args.chain.label}", error_body)
         raise e
\ No newline at end of file
@@ -0,0 +1,562 @@
+import os
+import argparse
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+# טעינת חיבור למסד הנתונים
+load_dotenv()
+db_url = os.getenv("SUPABASE_DATABASE_URL")
+engine = create_engine(db_url)
+
+# מיגרציות ממוספרות: כל אחת רצה פעם אחת, בטרנזקציה משלה, ונרשמת ב-"Schema_Migrations".
+# מחליף את create_schema.py / update_schema.py - על DB קיים השלבים שכבר בוצעו מזוהים ומדולגים.
+# מוסיפים מיגרציה חדשה רק בסוף הרשימה, ולא משנים מיגרציה שכבר רצה ב-production.
+MIGRATIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS "Schema_Migrations" (
+    version INT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT now()
+);
+"""
+# נעילה אחת לכל המיגרציות, כדי ש-shards שרצים במקביל לא יריצו את אותה מיגרציה פעמיים
+LOCK_ID = 72900276
+# נעילה של ensure_fact_prices_partitions (ה-shards קוראים לה יחד בתחילת כל ריצה)
+PARTITIONS_LOCK_ID = 72900277
+
+# ==========================================
+# 1. STAR / SNOWFLAKE SCHEMA
+# ==========================================
+# הטבלאות בשמות עם מרכאות, כמו שה-ETL כותב אליהן. הסדר: קודם הממדים (Dim) ורק אז העובדות (Fact)
+star_schema_sql = """
+CREATE TABLE IF NOT EXISTS "Dim_Chains" (
+    chain_id VARCHAR(50) PRIMARY KEY,
+    chain_name VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS "Dim_City" (
+    city_name VARCHAR(255) PRIMARY KEY,
+    region VARCHAR(255),
+    population INT,
+    socio_economic_index INT
+);
+
+-- עיר ה"טסט", כדי שהמפתח הזר לא יקרוס על סניף בלי עיר מזוהה
+INSERT INTO "Dim_City" (city_name, region) VALUES ('לא ידוע', 'ארצי') ON CONFLICT (city_name) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS "Dim_Stores" (
+    store_id VARCHAR(100) PRIMARY KEY, -- שילוב של קוד רשת וקוד סניף למניעת כפילויות
+    chain_id VARCHAR(50) REFERENCES "Dim_Chains"(chain_id),
+    store_name VARCHAR(255),
+    city VARCHAR(255),
+    region VARCHAR(255)
+);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_store_city') THEN
+        ALTER TABLE "Dim_Stores" ADD CONSTRAINT fk_store_city FOREIGN KEY (city) REFERENCES "Dim_City"(city_name);
+    END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS "Dim_Products" (
+    barcode VARCHAR(50) PRIMARY KEY,
+    item_name VARCHAR(255),
+    category VARCHAR(255),
+    manufacturer VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS "Fact_Prices" (
+    price_id SERIAL PRIMARY KEY,
+    barcode VARCHAR(50) REFERENCES "Dim_Products"(barcode),
+    store_id VARCHAR(100) REFERENCES "Dim_Stores"(store_id),
+    chain_id VARCHAR(50) REFERENCES "Dim_Chains"(chain_id),
+    sample_date TIMESTAMP,
+    price DECIMAL(10, 2)
+);
+"""
+
+def m001_star_schema(conn):
+    conn.execute(text(star_schema_sql))
+
+# ==========================================
+# 2. MERGE KEY
+# ==========================================
+# ה-ETL טוען עם ON CONFLICT (store_id, barcode, sample_date) - בלי אינדקס ייחודי על העמודות האלה ה-merge נכשל
+MERGE_KEY_COLUMNS = ("store_id", "barcode", "sample_date")
+
+def has_unique_index(conn, table, columns):
+    indexes = conn.execute(text("""
+        SELECT array_agg(a.attname::text ORDER BY k.ord)
+        FROM pg_index i
+        CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+        WHERE i.indrelid = to_regclass(:table) AND i.indisunique
+        GROUP BY i.indexrelid
+    """), {"table": f'"{table}"'}).scalars().all()
+    return any(list(cols) == list(columns) for cols in indexes)
+
+def m002_fact_prices_merge_key(conn):
+    if has_unique_index(conn, "Fact_Prices", MERGE_KEY_COLUMNS):
+        print("  מפתח ה-merge כבר קיים.")
+        return
+    # דגימות כפולות (מלפני שהיה מפתח) - נשארת הראשונה שנכנסה
+    removed = conn.execute(text("""
+        DELETE FROM "Fact_Prices" f USING "Fact_Prices" d
+        WHERE f.store_id = d.store_id AND f.barcode = d.barcode AND f.sample_date = d.sample_date
+          AND f.price_id > d.price_id
+    """)).rowcount
+    print(f"  הוסרו {removed} דגימות כפולות.")
+    conn.execute(text("""
+        ALTER TABLE "Fact_Prices" ADD CONSTRAINT ux_fact_prices_merge_key UNIQUE (store_id, barcode, sample_date)
+    """))
+
+# ==========================================
+# 3. MONTHLY PARTITIONS
+# ==========================================
+# Fact_Prices מחולקת לפי חודש של sample_date: ה-merge וסריקות לפי תאריך נוגעים רק במחיצות הרלוונטיות,
+# וניקוי היסטוריה הוא DROP של מחיצה. דגימות ישנות מ-PARTITION_HISTORY_MONTHS (PriceUpdateDate של
+# מוצר שהמחיר שלו לא השתנה שנים) נכנסות למחיצת ברירת המחדל במקום מאות מחיצות קטנות.
+PARTITION_HISTORY_MONTHS = 12
+
+# יוצרת את המחיצות מהחודש של from_month ועד months_ahead חודשים קדימה (ה-ETL קורא לה בתחילת כל ריצה).
+# שורות שכבר נפלו למחיצת ברירת המחדל בטווח של מחיצה חדשה מועברות אליה.
+# הבדיקה והיצירה מתחת לנעילה: בלי זה שני shards במעבר חודש רואים שתיהם שהמחיצה חסרה, והשני נכשל
+# ב-"relation already exists" (מיגרציה 007 מחליפה את הפונקציה ב-DB שבו 003 כבר רצה).
+ensure_partitions_sql = f"""
+CREATE OR REPLACE FUNCTION ensure_fact_prices_partitions(from_month DATE, months_ahead INT DEFAULT 2)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    m DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+    next_m DATE;
+    part TEXT;
+    created INT := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock({PARTITIONS_LOCK_ID});
+    WHILE m <= last_month LOOP
+        next_m := (m + interval '1 month')::date;
+        part := 'Fact_Prices_' || to_char(m, 'YYYY_MM');
+        IF to_regclass(format('%I', part)) IS NULL THEN
+            CREATE TEMP TABLE moved_prices ON COMMIT DROP AS
+                SELECT * FROM "Fact_Prices_default" WHERE sample_date >= m AND sample_date < next_m;
+            DELETE FROM "Fact_Prices_default" WHERE sample_date >= m AND sample_date < next_m;
+            EXECUTE format('CREATE TABLE %I PARTITION OF "Fact_Prices" FOR VALUES FROM (%L) TO (%L)', part, m, next_m);
+            INSERT INTO "Fact_Prices" SELECT * FROM moved_prices;
+            DROP TABLE moved_prices;
+            created := created + 1;
+        END IF;
+        m := next_m;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+"""
+
+def fact_prices_kind(conn):
+    return conn.execute(text("""SELECT relkind FROM pg_class WHERE oid = to_regclass('"Fact_Prices"')""")).scalar()
+
+# ההמרה עצמה: Fact_Prices הקיימת מועתקת כולה לטבלה המחולקת, בטרנזקציה אחת ותחת נעילה
+def partition_fact_prices(conn):
+    # ה-view נשען על הטבלה הישנה; הוא נוצר מחדש במיגרציה 010
+    conn.execute(text('DROP MATERIALIZED VIEW IF EXISTS "MV_Latest_Prices"'))
+    conn.execute(text('ALTER TABLE "Fact_Prices" RENAME TO "Fact_Prices_Legacy"'))
+    conn.execute(text('ALTER INDEX IF EXISTS ux_fact_prices_merge_key RENAME TO ux_fact_prices_legacy_key'))
+
+    # בטבלה מחולקת כל מפתח ייחודי חייב לכלול את sample_date - לכן price_id נשאר מזהה (מהרצף הקיים)
+    # בלי PRIMARY KEY, והמפתח של השורה הוא מפתח ה-merge
+    conn.execute(text("""
+        CREATE TABLE "Fact_Prices" (
+            price_id INT NOT NULL,
+            barcode VARCHAR(50) REFERENCES "Dim_Products"(barcode),
+            store_id VARCHAR(100) REFERENCES "Dim_Stores"(store_id),
+            chain_id VARCHAR(50) REFERENCES "Dim_Chains"(chain_id),
+            sample_date TIMESTAMP,
+            price DECIMAL(10, 2),
+            CONSTRAINT ux_fact_prices_merge_key UNIQUE (store_id, barcode, sample_date)
+        ) PARTITION BY RANGE (sample_date);
+        CREATE TABLE "Fact_Prices_default" PARTITION OF "Fact_Prices" DEFAULT;
+    """))
+    sequence = conn.execute(text("""SELECT pg_get_serial_sequence('"Fact_Prices_Legacy"', 'price_id')""")).scalar()
+    conn.execute(text(f"""ALTER TABLE "Fact_Prices" ALTER COLUMN price_id SET DEFAULT nextval('{sequence}')"""))
+    conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "Fact_Prices".price_id'))
+
+    conn.execute(text(ensure_partitions_sql))
+    first_month = conn.execute(text(f"""
+        SELECT GREATEST(COALESCE(MIN(sample_date), now()), now() - interval '{PARTITION_HISTORY_MONTHS} months')::date
+        FROM "Fact_Prices_Legacy"
+    """)).scalar()
+    created = conn.execute(text("SELECT ensure_fact_prices_partitions(:first_month)"), {"first_month": first_month}).scalar()
+
+    moved = conn.execute(text("""
+        INSERT INTO "Fact_Prices" (price_id, barcode, store_id, chain_id, sample_date, price)
+        SELECT price_id, barcode, store_id, chain_id, sample_date, price FROM "Fact_Prices_Legacy"
+    """)).rowcount
+    conn.execute(text('DROP TABLE "Fact_Prices_Legacy"'))
+    print(f"  {moved} דגימות הועברו ל-{created} מחיצות חודשיות (+ מחיצת ברירת מחדל).")
+
+# כל job ב-CI מריץ את המיגרציות, ולכן כאן ההמרה רצה רק על טבלה ריקה (DB חדש).
+# טבלה עם נתונים עוברת רק בהרצה ידנית: python sql_scripts/migrate.py --partition-fact-prices
+def m003_fact_prices_partitions(conn):
+    if fact_prices_kind(conn) == 'p':
+        print("  Fact_Prices כבר מחולקת למחיצות.")
+        conn.execute(text(ensure_partitions_sql))
+    elif conn.execute(text('SELECT EXISTS (SELECT 1 FROM "Fact_Prices")')).scalar():
+        print("  [SKIP] Fact_Prices מכילה נתונים - ההמרה למחיצות לא רצה אוטומטית.")
+        print("  הריצו ידנית (מחוץ לחלון ה-ETL): python sql_scripts/migrate.py --partition-fact-prices")
+    else:
+        partition_fact_prices(conn)
+
+# ==========================================
+# 4-5. HOT-PATH INDEXES
+# ==========================================
+# BRIN על sample_date: זעיר (כמה עמודים לכל מחיצה) ומספיק לסריקות טווח תאריכים, כי הדגימות נכנסות לפי זמן
+def m004_sample_date_brin(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS brin_fact_prices_sample_date ON "Fact_Prices" USING BRIN (sample_date)'))
+
+# המחיר האחרון של מוצר (בכל הסניפים או בסניף אחד) - קריאה מראש האינדקס, בלי מיון
+def m005_latest_price_lookup(conn):
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_fact_prices_latest ON "Fact_Prices" (barcode, store_id, sample_date DESC)
+    """))
+
+# ==========================================
+# 6. QUARANTINE
+# ==========================================
+# שורות מחיר שנפסלו בשער האיכות (price_quality.py), כפי שהגיעו: בלי FK, כדי שגם ברקוד / מחיר פגום ייכנס.
+# reasons - רשימת הבדיקות שנכשלו, מופרדת בפסיקים (barcode_format, barcode_checksum, price_range, price_jump, sample_date)
+def m006_quarantine_prices(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS "Quarantine_Prices" (
+            quarantine_id BIGSERIAL PRIMARY KEY,
+            quarantined_at TIMESTAMP NOT NULL DEFAULT now(),
+            fname TEXT,
+            store_id VARCHAR(100),
+            chain_id VARCHAR(50),
+            barcode TEXT,
+            price NUMERIC,
+            last_price NUMERIC,
+            sample_date TIMESTAMP,
+            reasons TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_quarantine_prices_store ON "Quarantine_Prices" (store_id, quarantined_at);
+    """))
+
+# ==========================================
+# 7. PARTITION LOCK
+# ==========================================
+def m007_partitions_lock(conn):
+    conn.execute(text(ensure_partitions_sql))
+
+# ==========================================
+# 8. DAILY ROLLUPS
+# ==========================================
+# סיכומים יומיים קטנים לדשבורדים (price_rollups.py). "מחיר של יום D" = המחיר האחרון הידוע לכל מוצר
+# בסניף בסוף היום
+def m008_daily_rollups(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS "Agg_Daily_Store_Prices" (
+            day DATE NOT NULL,
+            store_id VARCHAR(100) NOT NULL,
+            items INT NOT NULL,
+            avg_price DECIMAL(10, 2),
+            min_price DECIMAL(10, 2),
+            max_price DECIMAL(10, 2),
+            total_price DECIMAL(14, 2),
+            PRIMARY KEY (day, store_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS "Agg_Daily_City_Prices" (
+            day DATE NOT NULL,
+            region VARCHAR(255),
+            city VARCHAR(255) NOT NULL,
+            barcode VARCHAR(50) NOT NULL,
+            stores INT NOT NULL,
+            avg_price DECIMAL(10, 2),
+            min_price DECIMAL(10, 2),
+            max_price DECIMAL(10, 2),
+            PRIMARY KEY (day, city, barcode)
+        );
+        CREATE INDEX IF NOT EXISTS ix_agg_city_prices_region ON "Agg_Daily_City_Prices" (day, region);
+    """))
+
+# ==========================================
+# 9. ETL RUNS
+# ==========================================
+# שורה לכל ריצה שהסתיימה - שינוי ב-run האחרון מבטל את המטמון של כל BasketEngine פעיל (basket_query.py)
+def m009_etl_runs(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS "ETL_Runs" (
+            run_id VARCHAR(50) PRIMARY KEY,
+            chain_id VARCHAR(50),
+            finished_at TIMESTAMP NOT NULL DEFAULT now(),
+            price_files INT,
+            prices_inserted INT
+        )
+    """))
+
+# ==========================================
+# 10. LATEST PRICE VIEW
+# ==========================================
+# המחיר האחרון לכל (סניף, ברקוד), לשאילתות סל בלי לסרוק את Fact_Prices. ה-ETL מרענן אותו בסוף כל ריצה
+# (REFRESH CONCURRENTLY - דורש את האינדקס הייחודי). נבנה לפי PRICE_STORAGE; המעבר לטווחי מחיר
+# (--convert-intervals) בונה אותו מחדש מ-Fact_Price_Intervals. מיגרציה 013 מחליפה אותו בטבלה Latest_Prices.
+LATEST_PRICES_SQL = {
+    "samples": """
+        SELECT DISTINCT ON (store_id, barcode) store_id, barcode, price, sample_date
+        FROM "Fact_Prices"
+        ORDER BY store_id, barcode, sample_date DESC
+    """,
+    "intervals": """
+        SELECT store_id, barcode, price, valid_from AS sample_date
+        FROM "Fact_Price_Intervals"
+        WHERE valid_to IS NULL
+    """,
+}
+
+def create_latest_prices_view(conn, storage):
+    conn.execute(text(f'CREATE MATERIALIZED VIEW IF NOT EXISTS "MV_Latest_Prices" AS {LATEST_PRICES_SQL[storage]}'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_latest_prices ON "MV_Latest_Prices" (store_id, barcode)'))
+
+def m010_latest_prices_view(conn):
+    # ב-DB חדש Fact_Price_Intervals עוד לא קיימת (מיגרציה 011) - וגם אין בה מה לקרוא
+    storage = os.environ.get("PRICE_STORAGE", "samples")
+    if not conn.execute(text("""SELECT to_regclass('"Fact_Price_Intervals"') IS NOT NULL""")).scalar():
+        storage = "samples"
+    create_latest_prices_view(conn, storage)
+
+# ==========================================
+# 11. PRICE INTERVALS (PRICE_STORAGE=intervals)
+# ==========================================
+# טבלת טווחי מחיר (SCD2): שורה אחת לכל תקופה שבה המחיר של מוצר בסניף לא השתנה.
+# valid_to = NULL מסמן את המחיר הנוכחי; הוא נסגר ברגע שמגיעה דגימה עם מחיר אחר.
+# הטבלה נוצרת תמיד (ריקה); המרת הדגימות הקיימות אליה - migrate.py --convert-intervals
+def m011_price_intervals(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS "Fact_Price_Intervals" (
+            store_id VARCHAR(100) REFERENCES "Dim_Stores"(store_id),
+            barcode VARCHAR(50) REFERENCES "Dim_Products"(barcode),
+            chain_id VARCHAR(50) REFERENCES "Dim_Chains"(chain_id),
+            price DECIMAL(10, 2),
+            valid_from TIMESTAMP NOT NULL,
+            valid_to TIMESTAMP,
+            PRIMARY KEY (store_id, barcode, valid_from)
+        );
+
+        -- טווח פתוח אחד לכל מוצר בסניף (וגם האינדקס שה-ETL משתמש בו כדי למצוא אותו)
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_price_intervals_open
+            ON "Fact_Price_Intervals" (store_id, barcode) WHERE valid_to IS NULL;
+
+        -- תאימות לשאילתות הקיימות: המחיר הנוכחי, ו"מה היה המחיר בזמן T"
+        CREATE OR REPLACE VIEW "V_Current_Prices" AS
+        SELECT store_id, barcode, chain_id, price, valid_from AS sample_date
+        FROM "Fact_Price_Intervals"
+        WHERE valid_to IS NULL;
+
+        CREATE OR REPLACE FUNCTION prices_at(ts TIMESTAMP)
+        RETURNS TABLE (store_id VARCHAR, barcode VARCHAR, chain_id VARCHAR, price DECIMAL, sample_date TIMESTAMP)
+        LANGUAGE sql STABLE AS $$
+            SELECT f.store_id, f.barcode, f.chain_id, f.price, f.valid_from
+            FROM "Fact_Price_Intervals" f
+            WHERE f.valid_from <= ts AND (f.valid_to IS NULL OR f.valid_to > ts);
+        $$;
+    """))
+
+# ==========================================
+# 12. QUARANTINE KEY
+# ==========================================
+# אותה שורה פסולה (סניף, ברקוד, מחיר, תאריך) נכנסת להסגר פעם אחת - ה-ETL מכניס עם ON CONFLICT DO NOTHING.
+# גם מחיר / תאריך שלא פוענחו (NULL) נחשבים לאותה שורה: המפתח על COALESCE של העמודות (ולא NULLS NOT DISTINCT,
+# שדורש Postgres 15). ה-ON CONFLICT ב-ETL (QUARANTINE_MERGE_SQL) חייב לחזור בדיוק על אותם ביטויים.
+QUARANTINE_KEY_SQL = "COALESCE(store_id, ''), COALESCE(barcode, ''), COALESCE(price, 'NaN'), COALESCE(sample_date, '-infinity')"
+
+def m012_quarantine_key(conn):
+    removed = conn.execute(text("""
+        DELETE FROM "Quarantine_Prices" q USING "Quarantine_Prices" d
+        WHERE q.store_id IS NOT DISTINCT FROM d.store_id AND q.barcode IS NOT DISTINCT FROM d.barcode
+          AND q.price IS NOT DISTINCT FROM d.price AND q.sample_date IS NOT DISTINCT FROM d.sample_date
+          AND q.quarantine_id > d.quarantine_id
+    """)).rowcount
+    print(f"  הוסרו {removed} שורות הסגר כפולות.")
+    conn.execute(text(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_quarantine_prices_key
+            ON "Quarantine_Prices" ({QUARANTINE_KEY_SQL})
+    """))
+
+# ==========================================
+# 13. LATEST PRICES TABLE
+# ==========================================
+# המחיר האחרון לכל (סניף, ברקוד) כטבלה רגילה במקום MV_Latest_Prices: ה-ETL מעדכן בה רק את השורות שנטענו
+# (LATEST_PRICES_MERGE_SQL), במקום REFRESH שסורק את כל Fact_Prices בסוף כל ריצה.
+# התוכן ההתחלתי מועתק מה-view (בלי לסרוק את Fact_Prices), וה-view נמחק
+def m013_latest_prices_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS "Latest_Prices" (
+            store_id VARCHAR(100) NOT NULL,
+            barcode VARCHAR(50) NOT NULL,
+            price DECIMAL(10, 2),
+            sample_date TIMESTAMP,
+            PRIMARY KEY (store_id, barcode)
+        )
+    """))
+    if conn.execute(text("""SELECT to_regclass('"MV_Latest_Prices"') IS NOT NULL""")).scalar():
+        copied = conn.execute(text("""
+            INSERT INTO "Latest_Prices" (store_id, barcode, price, sample_date)
+            SELECT store_id, barcode, price, sample_date FROM "MV_Latest_Prices"
+            WHERE store_id IS NOT NULL AND barcode IS NOT NULL
+            ON CONFLICT (store_id, barcode) DO NOTHING
+        """)).rowcount
+        conn.execute(text('DROP MATERIALIZED VIEW "MV_Latest_Prices"'))
+        print(f"  {copied} מחירים הועתקו מ-MV_Latest_Prices.")
+
+MIGRATIONS = [
+    (1, "star_schema", m001_star_schema),
+    (2, "fact_prices_merge_key", m002_fact_prices_merge_key),
+    (3, "fact_prices_monthly_partitions", m003_fact_prices_partitions),
+    (4, "fact_prices_sample_date_brin", m004_sample_date_brin),
+    (5, "fact_prices_latest_lookup_index", m005_latest_price_lookup),
+    (6, "quarantine_prices", m006_quarantine_prices),
+    (7, "fact_prices_partitions_lock", m007_partitions_lock),
+    (8, "daily_rollups", m008_daily_rollups),
+    (9, "etl_runs", m009_etl_runs),
+    (10, "latest_prices_view", m010_latest_prices_view),
+    (11, "price_intervals", m011_price_intervals),
+    (12, "quarantine_prices_key", m012_quarantine_key),
+    (13, "latest_prices_table", m013_latest_prices_table),
+]
+
+def applied_versions(conn):
+    conn.execute(text(MIGRATIONS_TABLE_SQL))
+    return set(conn.execute(text('SELECT version FROM "Schema_Migrations"')).scalars())
+
+def migrate(target=None):
+    print("מריץ מיגרציות סכימה...")
+    applied_now = []
+    try:
+        for version, name, migration in MIGRATIONS:
+            if target is not None and version > target: break
+            with engine.begin() as conn:
+                conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": LOCK_ID})
+                if version in applied_versions(conn): continue
+                print(f"[STEP] {version:03d} {name}")
+                migration(conn)
+                conn.execute(text('INSERT INTO "Schema_Migrations" (version, name) VALUES (:version, :name)'),
+                             {"version": version, "name": name})
+            applied_now.append(version)
+
+        print("======================================")
+        if applied_now:
+            print(f"🏗️ הוחלו {len(applied_now)} מיגרציות: {', '.join(str(v) for v in applied_now)}")
+        else:
+            print("הסכימה מעודכנת - אין מיגרציות חדשות.")
+        print("======================================")
+
+    except Exception as e:
+        print("שגיאה במהלך המיגרציה (המיגרציה שנכשלה בוטלה במלואה):")
+        print(e)
+        raise
+
+# ==========================================
+# SAMPLES -> INTERVALS CONVERSION
+# ==========================================
+# המרת הדגימות הקיימות: שורה נשמרת רק כשהמחיר שונה מהדגימה הקודמת (gaps & islands),
+# וסוף הטווח הוא תחילת הטווח הבא של אותו מוצר באותו סניף
+convert_intervals_sql = """
+INSERT INTO "Fact_Price_Intervals" (store_id, barcode, chain_id, price, valid_from, valid_to)
+SELECT store_id, barcode, chain_id, price, sample_date,
+       LEAD(sample_date) OVER (PARTITION BY store_id, barcode ORDER BY sample_date)
+FROM (
+    SELECT store_id, barcode, chain_id, price, sample_date,
+           LAG(price) OVER (PARTITION BY store_id, barcode ORDER BY sample_date) AS prev_price
+    FROM "Fact_Prices"
+    WHERE sample_date IS NOT NULL AND price IS NOT NULL
+) samples
+WHERE prev_price IS NULL OR prev_price <> price;
+"""
+
+def table_size_mb(conn, table):
+    # כולל את כל המחיצות (לטבלה מחולקת עצמה אין נתונים; לטבלה רגילה pg_partition_tree ריק)
+    return conn.execute(text(f"""
+        SELECT COALESCE(SUM(pg_total_relation_size(relid)), pg_total_relation_size('\"{table}\"'))
+        FROM pg_partition_tree('\"{table}\"')
+    """)).scalar() / (1024 ** 2)
+
+def convert_price_intervals(drop_samples=False):
+    # פעולת נתונים חד-פעמית לפני המעבר ל-PRICE_STORAGE=intervals (הסכימה עצמה - מיגרציה 011)
+    migrate()
+    print("מתחיל במעבר לשמירת מחירים כטווחי תוקף (Fact_Price_Intervals)...")
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": LOCK_ID})
+        # המרה רק לטבלה ריקה - אחרי שה-ETL כבר כותב אליה, הרצה חוזרת לא תיצור טווחים כפולים
+        if conn.execute(text('SELECT EXISTS (SELECT 1 FROM "Fact_Price_Intervals")')).scalar():
+            print("Fact_Price_Intervals כבר מכילה נתונים - מדלג על המרת Fact_Prices.")
+        else:
+            samples = conn.execute(text('SELECT COUNT(*) FROM "Fact_Prices"')).scalar()
+            intervals = conn.execute(text(convert_intervals_sql)).rowcount
+            print(f"הומרו {samples} דגימות ל-{intervals} טווחי מחיר.")
+
+        # Latest_Prices לא משתנה: המחיר האחרון זהה בשתי צורות השמירה
+
+        if drop_samples:
+            conn.execute(text('TRUNCATE "Fact_Prices"'))
+            print("Fact_Prices רוקנה.")
+
+    with engine.connect() as conn:
+        samples_mb = table_size_mb(conn, "Fact_Prices")
+        intervals_mb = table_size_mb(conn, "Fact_Price_Intervals")
+
+    print("======================================")
+    print("📉 המעבר לטווחי מחיר הושלם!")
+    print(f"Fact_Prices: {samples_mb:.1f} MB | Fact_Price_Intervals: {intervals_mb:.1f} MB")
+    print("הפעילו את ה-ETL עם PRICE_STORAGE=intervals.")
+    if not drop_samples:
+        print("לאחר בדיקת הנתונים אפשר לפנות מקום עם --drop-samples.")
+    print("======================================")
+
+# ==========================================
+# FACT_PRICES -> MONTHLY PARTITIONS (MANUAL)
+# ==========================================
+# שכתוב של כל Fact_Prices (מיגרציה 003 מדלגת עליו כשיש נתונים) - להריץ פעם אחת, כשאף ETL לא רץ
+def run_partition_fact_prices():
+    migrate()
+    print("ממיר את Fact_Prices לטבלה מחולקת לפי חודשים...")
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": LOCK_ID})
+        if fact_prices_kind(conn) == 'p':
+            print("Fact_Prices כבר מחולקת למחיצות - אין מה להמיר.")
+            return
+        partition_fact_prices(conn)
+        # האינדקסים של מיגרציות 004-005 נמחקו יחד עם הטבלה הישנה
+        m004_sample_date_brin(conn)
+        m005_latest_price_lookup(conn)
+
+    print("======================================")
+    print("🗂️ Fact_Prices הומרה למחיצות חודשיות.")
+    print("======================================")
+
+def print_status():
+    with engine.begin() as conn:
+        applied = dict(conn.execute(text('SELECT version, applied_at FROM "Schema_Migrations"')).all()) \
+            if conn.execute(text("""SELECT to_regclass('"Schema_Migrations"') IS NOT NULL""")).scalar() else {}
+    for version, name, _ in MIGRATIONS:
+        state = f"applied {applied[version]:%Y-%m-%d %H:%M}" if version in applied else "pending"
+        print(f"{version:03d} {name:<36} {state}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the versioned schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations and whether they were applied")
+    parser.add_argument("--target", type=int, help="stop after this migration version")
+    parser.add_argument("--convert-intervals", action="store_true",
+                        help="one-off: convert the Fact_Prices samples to Fact_Price_Intervals (before PRICE_STORAGE=intervals)")
+    parser.add_argument("--drop-samples", action="store_true", help="with --convert-intervals: truncate Fact_Prices afterwards")
+    parser.add_argument("--partition-fact-prices", action="store_true",
+                        help="one-off: rewrite an existing Fact_Prices into monthly partitions (migration 003 skips it when the table has data)")
+    args = parser.parse_args()
+    if args.status:
+        print_status()
+    elif args.convert_intervals:
+        convert_price_intervals(drop_samples=args.drop_samples)
+    elif args.partition_fact_prices:
+        run_partition_fact_prices()
+    else:
+        migrate(args.target)
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# המודולים של ה-ETL נטענים מהשורש של הריפו; התיקיות המקומיות שלהם (ETL_Process_Shufersal, הארכיון)
+# נוצרות בתיקייה זמנית ולא בתוך הריפו. לא צריך DB - הבדיקות לא פונות אליו
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+WORK_DIR = tempfile.mkdtemp(prefix="etl_tests_")
+os.chdir(WORK_DIR)
+os.environ.setdefault("SUPABASE_DATABASE_URL", "sqlite://")
+os.environ["PRICE_ARCHIVE_DIR"] = os.path.join(WORK_DIR, "archive")
@@ -0,0 +1,37 @@
+import gzip
+import io
+import zlib
+
+import pytest
+
+from shufersal_etl import GzipVerifier
+
+PAYLOAD = b"<root>" + b"<Item><ItemPrice>9.90</ItemPrice></Item>" * 2000 + b"</root>"
+
+def verify(data, chunk_size=1000):
+    verifier = GzipVerifier()
+    for i in range(0, len(data), chunk_size):
+        verifier.feed(data[i:i + chunk_size])
+    return verifier.complete()
+
+@pytest.mark.parametrize("padding", [1, 7, 4096])
+def test_trailing_zero_padding_is_ignored(padding):
+    data = gzip.compress(PAYLOAD) + b"\0" * padding
+    # gzip.GzipFile קורא את אותו קובץ בלי שגיאה
+    assert gzip.GzipFile(fileobj=io.BytesIO(data)).read() == PAYLOAD
+    assert verify(data)
+
+def test_padding_between_members():
+    data = gzip.compress(PAYLOAD) + b"\0" * 10 + gzip.compress(PAYLOAD)
+    assert gzip.GzipFile(fileobj=io.BytesIO(data)).read() == PAYLOAD * 2
+    assert verify(data)
+
+def test_truncated_member_is_incomplete():
+    data = gzip.compress(PAYLOAD)
+    assert not verify(data[:-20])
+    # member שני קטוע אחרי הריפוד עדיין נתפס
+    assert not verify(data + b"\0" * 4 + data[:len(data) // 2])
+
+def test_garbage_after_member_is_rejected():
+    with pytest.raises(zlib.error):
+        verify(gzip.compress(PAYLOAD) + b"\0\0garbage")
@@ -0,0 +1,71 @@
+import os
+import queue
+import shutil
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import price_archive
+import shufersal_etl as etl
+from synthetic_data import write_pricefull_gz
+
+N_ITEMS = 3000
+CHUNK_ITEMS = 200
+
+def serve_flaky(body, cut_at):
+    # הבקשה הראשונה נקטעת אחרי cut_at בתים (עם Content-Length מלא), השאר מקבלות את כל הקובץ
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.path)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            if len(requests_seen) == 1:
+                self.wfile.write(body[:cut_at])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, requests_seen
+
+def test_disconnect_mid_stream_sends_each_chunk_once(tmp_path, monkeypatch):
+    fname = "PriceFull7290027600007-001-202610170300"
+    path = tmp_path / f"{fname}.gz"
+    write_pricefull_gz(str(path), "001", N_ITEMS)
+    body = path.read_bytes()
+
+    chunks = queue.Queue()
+    monkeypatch.setattr(etl, "_chunk_queue", chunks)
+    monkeypatch.setattr(etl, "PRICE_CHUNK_ITEMS", CHUNK_ITEMS)
+    monkeypatch.setattr(etl, "DOWNLOAD_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(etl, "HTTP_BACKOFF_BASE", 0)
+    shutil.rmtree(price_archive.ARCHIVE_DIR, ignore_errors=True)
+
+    server, requests_seen = serve_flaky(body, cut_at=len(body) // 2)
+    try:
+        result = etl.stream_price_file(f"http://127.0.0.1:{server.server_port}/files/{fname}.gz", fname)
+    finally:
+        server.shutdown()
+
+    sent = []
+    while not chunks.empty():
+        sent.append(chunks.get())
+    price_chunks = [c for c in sent if "prices" in c]
+
+    assert len(requests_seen) == 2  # הניסיון הראשון נקטע באמצע
+    assert len(price_chunks) == N_ITEMS // CHUNK_ITEMS
+    assert sum(len(c["prices"]) for c in price_chunks) == N_ITEMS
+    assert result["rows"] == N_ITEMS and result["chunks"] == N_ITEMS // CHUNK_ITEMS
+    assert sent[-1]["last"] is True
+    assert len(price_archive.read_prices(columns=["barcode"])) == N_ITEMS
@@ -0,0 +1,42 @@
+import shufersal_etl as etl
+
+CHAIN = etl.DEFAULT_CHAIN
+
+def listing_row(fname):
+    return [fname], f"/files/{fname}.gz"
+
+def serve_pages(monkeypatch, pages):
+    # דפי הקטגוריה המסוננת לפי מספר דף; אחרי הדף האחרון האתר מחזיר רשימה ריקה
+    def fetch(url, what):
+        page_num = int(url.rsplit("page=", 1)[1])
+        return pages[page_num - 1] if page_num <= len(pages) else [], 0.0, 0.0, 0
+    monkeypatch.setattr(etl, "fetch_listing_url", fetch)
+    listing_cache = etl.ListingCache
+    monkeypatch.setattr(etl, "ListingCache", lambda: listing_cache(ttl_min=0))
+
+def lookup(store):
+    return etl._lookup_pricefull(store, etl.ListingCache(), CHAIN)
+
+def test_pricefull_found_on_later_page(monkeypatch):
+    other = listing_row(f"PriceFull{CHAIN.chain_id}-001-202610170300")
+    target = listing_row(f"PriceFull{CHAIN.chain_id}-042-202610170300")
+    serve_pages(monkeypatch, [[other], [target]])
+    links, pages, found = lookup("042")
+    assert found
+    assert [fname for fname, _ in links] == [target[0][0]]
+
+def test_listing_end_without_target_is_not_found(monkeypatch):
+    # המסנן לא עבד: הרשימה נגמרה בדף 2 בלי ה-PriceFull של הסניף - חייבים לחזור למעבר על הדפים
+    other = listing_row(f"PriceFull{CHAIN.chain_id}-001-202610170300")
+    serve_pages(monkeypatch, [[other], [other]])
+    links, pages, found = lookup("042")
+    assert not found
+    assert links == []
+
+def test_missing_store_falls_back_to_crawl(monkeypatch):
+    stores_row = listing_row(f"Stores{CHAIN.chain_id}-000-202610170201")
+    serve_pages(monkeypatch, [[stores_row]])
+    links, missing, stores_missing = etl._discover_targeted({"pages": 0, "fetch_seconds": 0.0, "parse_seconds": 0.0,
+                                                            "bytes": 0}, ["042"], False, lambda fname: False, CHAIN)
+    assert missing == ["042"]
+    assert not stores_missing